@@ -0,0 +1,267 @@
+"""
+Metrics of the Payments page, built with a fixed number of queries.
+
+PaymentDashboardService reads the fee columns through FeeSnapshot and the
+revenue and overdue figures through the metrics registry, which aggregates
+the DailyRevenue rollup and the maintained StudentSession columns in SQL.
+Nothing is queried per student or per session, and no rows are loaded per
+day of history, so the cost does not grow with the size of the institute.
+
+The computed metrics are cached under a version counter that the
+Payments/StudentSession/Student write signals bump after commit, so repeat
+visits between writes skip the queries without ever serving stale totals.
+"""
+import time
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .fee_engine import FeeSnapshot
+from .metrics import compute as compute_metrics
+from .models import DailyRevenue, Payments, Sessions, StudentSession
+
+FINANCE_VERSION_KEY = 'admin:finance:version'
+FINANCE_MODIFIED_KEY = 'admin:finance:modified'
+FINANCE_CACHE_TIMEOUT = 60 * 60
+
+
+def finance_version():
+    version = cache.get(FINANCE_VERSION_KEY)
+    if version is None:
+        # Start from the clock, not 1: a counter that was evicted must not come
+        # back at a version whose entries are still cached
+        cache.add(FINANCE_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(FINANCE_VERSION_KEY)
+    return version
+
+
+def finance_last_modified():
+    """When the finance data last changed, as far as the cache knows (for Last-Modified)"""
+    cache.add(FINANCE_MODIFIED_KEY, timezone.now().replace(microsecond=0), timeout=None)
+    return cache.get(FINANCE_MODIFIED_KEY)
+
+
+def bump_finance_version():
+    """Invalidate every cached finance metric"""
+    cache.set(FINANCE_MODIFIED_KEY, timezone.now().replace(microsecond=0), timeout=None)
+    try:
+        cache.incr(FINANCE_VERSION_KEY)
+    except ValueError:
+        finance_version()
+
+
+def cached_finance(name, build, *key_parts):
+    """Return build() from the cache for the current finance version, computing it on a miss"""
+    key = ':'.join(['admin:finance', name, str(finance_version()), *map(str, key_parts)])
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, FINANCE_CACHE_TIMEOUT)
+    return value
+
+
+def session_leaderboard(start_date=None, end_date=None):
+    """
+    Sessions that took payments between start_date and end_date, best first, with
+    their revenue, active headcount, average per student and collection rate
+    (revenue over the net fees of their active enrollments), from one query.
+    """
+    revenue = DailyRevenue.objects.filter(session=OuterRef('pk'))
+    if start_date:
+        revenue = revenue.filter(day__gte=start_date)
+    if end_date:
+        revenue = revenue.filter(day__lte=end_date)
+    revenue = revenue.order_by().values('session').annotate(total=Sum('amount')).values('total')
+
+    active = StudentSession.objects.filter(session=OuterRef('pk'), status='Active').order_by().values('session')
+    headcount = active.annotate(n=Count('id')).values('n')
+    expected = active.annotate(total=Sum(Coalesce('fee', 0) - Coalesce('discount', 0))).values('total')
+
+    rows = (
+        Sessions.objects.annotate(
+            revenue=Subquery(revenue),
+            students=Coalesce(Subquery(headcount), 0),
+            expected=Coalesce(Subquery(expected), 0),
+        )
+        .filter(revenue__isnull=False)
+        .order_by('-revenue', 'id')
+        .values('id', 'session_name', 'revenue', 'students', 'expected')
+    )
+    return [
+        {
+            'id': row['id'],
+            'name': row['session_name'],
+            'revenue': row['revenue'],
+            'students': row['students'],
+            'avg_per_student': row['revenue'] / row['students'] if row['students'] > 0 else 0,
+            'collection_rate': round(row['revenue'] / row['expected'] * 100, 1) if row['expected'] > 0 else 0,
+        }
+        for row in rows
+    ]
+
+
+def collector_analytics(start_date=None, end_date=None):
+    """
+    Collections per staff member between start_date and end_date, grouped by
+    collector id in SQL over the DailyRevenue rollup (two queries, however many
+    years of payments): totals, payment counts, average ticket and a daily series.
+    """
+    rows = DailyRevenue.objects.all()
+    if start_date:
+        rows = rows.filter(day__gte=start_date)
+    if end_date:
+        rows = rows.filter(day__lte=end_date)
+
+    totals = (
+        rows.order_by()
+        .values('collector_id', 'collector__first_name', 'collector__last_name')
+        .annotate(total=Sum('amount'), payments=Sum('payment_count'))
+        .order_by('-total', 'collector_id')
+    )
+    collectors = {
+        row['collector_id']: {
+            'id': row['collector_id'],
+            'name': f"{row['collector__first_name']} {row['collector__last_name']}",
+            'total': row['total'],
+            'payments': row['payments'],
+            'avg_ticket': row['total'] / row['payments'] if row['payments'] else 0,
+            'series': [],
+        }
+        for row in totals
+    }
+
+    daily = (
+        rows.filter(day__isnull=False)
+        .order_by()
+        .values('collector_id', 'day')
+        .annotate(total=Sum('amount'))
+        .order_by('day')
+    )
+    for row in daily:
+        collectors[row['collector_id']]['series'].append({'day': row['day'].isoformat(), 'amount': row['total']})
+
+    return list(collectors.values())
+
+
+# (key, label, first day overdue, last day overdue); None: open-ended
+AGING_BUCKETS = [
+    ('current', 'Current', None, 0),
+    ('days_1_30', '1-30 days', 1, 30),
+    ('days_31_60', '31-60 days', 31, 60),
+    ('days_61_90', '61-90 days', 61, 90),
+    ('days_90_plus', '90+ days', 91, None),
+]
+
+
+def receivables_aging(today=None):
+    """
+    Outstanding balances of active enrollments bucketed by days past their next
+    due date, per session and institute-wide, in one grouped query over the
+    maintained StudentSession.next_due_date/outstanding_amount columns.
+    Balances without a due date count as current.
+    """
+    today = today or date.today()
+    buckets = {}
+    for key, _, first_day, last_day in AGING_BUCKETS:
+        if first_day is None:
+            condition = Q(next_due_date__isnull=True) | Q(next_due_date__gte=today - timedelta(days=last_day))
+        else:
+            condition = Q(next_due_date__lte=today - timedelta(days=first_day))
+            if last_day is not None:
+                condition &= Q(next_due_date__gte=today - timedelta(days=last_day))
+        buckets[key] = Coalesce(Sum('outstanding_amount', filter=condition), 0)
+
+    rows = (
+        StudentSession.objects.filter(status='Active', student__status='Active', outstanding_amount__gt=0)
+        .order_by()
+        .values('session_id', 'session__session_name')
+        .annotate(**buckets, total=Sum('outstanding_amount'), students=Count('student', distinct=True))
+        .order_by('-total', 'session_id')
+    )
+
+    sessions = []
+    totals = {key: 0 for key in buckets}
+    totals['total'] = 0
+    for row in rows:
+        entry = {'id': row['session_id'], 'name': row['session__session_name'], 'students': row['students']}
+        for key in totals:
+            entry[key] = row[key]
+            totals[key] += row[key]
+        sessions.append(entry)
+
+    return {
+        'as_of': today.isoformat(),
+        'buckets': [{'key': key, 'label': label} for key, label, _, _ in AGING_BUCKETS],
+        'sessions': sessions,
+        'totals': totals,
+    }
+
+
+DASHBOARD_METRICS = [
+    'total_revenue', 'payments_count', 'avg_payment', 'daily_revenue', 'week_revenue', 'month_revenue',
+    'year_revenue', 'projected_monthly_revenue', 'overdue_students_count', 'overdue_amount',
+]
+
+
+class PaymentDashboardService:
+    """
+    Everything the Payments page renders, for the active students. The student
+    fee table itself is paged in by views.student_fees_table.
+    """
+
+    def __init__(self, today=None):
+        self.today = today or date.today()
+
+    def build(self):
+        today = self.today
+        fees = FeeSnapshot.build()
+        status_counts = fees.status_counts()
+        total_expected_revenue = fees.total_expected_revenue
+
+        # Revenue widgets aggregate the DailyRevenue rollup (day x session x collector),
+        # one query for all of them, and the overdue figures one more
+        metrics = compute_metrics(DASHBOARD_METRICS, today=today)
+        total_revenue = metrics['total_revenue']
+
+        # Collector figures are paged in by views.collector_analytics_view
+        recent_payments = list(
+            Payments.objects.select_related('studentsession__student', 'studentsession__session', 'user')
+            .order_by('-date', '-id')[:10]
+        )
+
+        active_students_count = len(fees)
+        collection_rate = (total_revenue / total_expected_revenue * 100) if total_expected_revenue > 0 else 0
+        revenue_per_student = total_revenue / active_students_count if active_students_count > 0 else 0
+
+        session_performance = session_leaderboard()
+
+        return {
+            'payments': recent_payments,
+            'total_revenue': total_revenue,
+            'total_pending': fees.total_pending,
+            'total_discount': fees.total_discount,
+            'total_expected_revenue': total_expected_revenue,
+            'total_payments_count': metrics['payments_count'],
+            'recent_payments': recent_payments,
+            'top_sessions': [(row['name'], row['revenue']) for row in session_performance[:5]],
+            'avg_payment': metrics['avg_payment'],
+            'collection_rate': round(collection_rate, 1),
+            'students_paid': status_counts['Paid'],
+            'students_partial': status_counts['Partial'],
+            'students_unpaid': status_counts['Unpaid'],
+            'total_students': len(fees),
+            'overdue_amount': metrics['overdue_amount'],
+            'daily_revenue': metrics['daily_revenue'],
+            'yearly_revenue': metrics['year_revenue'],
+            'monthly_revenue': metrics['month_revenue'],
+            'active_students_count': active_students_count,
+            'revenue_per_student': round(revenue_per_student, 0),
+            'overdue_students_count': metrics['overdue_students_count'],
+            'projected_monthly_revenue': round(metrics['projected_monthly_revenue'], 0),
+            'weekly_revenue': metrics['week_revenue'],
+            'session_performance': session_performance,
+            'today_date': today,
+        }
@@ -0,0 +1,117 @@
+"""
+Institute-wide fee computations over plain column arrays.
+
+FeeSnapshot.build() reads the enrollment columns with values_list() and the
+paid totals with one GROUP BY, then reduces them per student in a single pass
+without instantiating Student/StudentSession/Payments objects. The numbers
+are per student and match Student.total_fee, total_paid, remaining_balance and
+payment_status: the registration fee is charged once, on the earliest
+registered of all the student's enrollments. Per-enrollment balances
+(StudentSession.session_balance, which charges it on the primary active
+enrollment only) are not computed here.
+"""
+from datetime import date
+
+from django.db.models import Sum
+
+from .models import Payments, Student, StudentSession
+
+CHUNK_SIZE = 5000
+
+
+class FeeSnapshot:
+    """Per-student fee columns, aligned by index with student_ids"""
+
+    def __init__(self, student_ids, total_fee, total_paid, active_discount):
+        self.student_ids = student_ids
+        self.total_fee = total_fee
+        self.total_paid = total_paid
+        self.active_discount = active_discount
+        self.remaining_balance = [max(0, fee - paid) for fee, paid in zip(total_fee, total_paid)]
+        self.payment_status = [
+            'Paid' if balance <= 0 else 'Partial' if paid > 0 else 'Unpaid'
+            for balance, paid in zip(self.remaining_balance, total_paid)
+        ]
+
+    @classmethod
+    def build(cls, students=None):
+        """
+        Compute the snapshot for a Student queryset (default: active students).
+        Overdue figures live on StudentSession (see StudentSessionQuerySet.overdue_totals).
+        """
+        if students is None:
+            students = Student.objects.filter(status='Active')
+
+        student_ids = list(students.order_by('pk').values_list('pk', flat=True))
+        index = {student_id: i for i, student_id in enumerate(student_ids)}
+        n = len(student_ids)
+
+        paid_by_enrollment = dict(
+            Payments.objects.filter(studentsession__student__in=students)
+            .order_by()
+            .values('studentsession_id')
+            .annotate(total=Sum('amount'))
+            .values_list('studentsession_id', 'total')
+        )
+
+        base_fee = [0] * n
+        total_paid = [0] * n
+        active_discount = [0] * n
+        # Primary over all enrollments (Student.total_fee): (sort key, registration fee)
+        primary = [None] * n
+
+        columns = (
+            StudentSession.objects.filter(student__in=students)
+            .order_by()
+            .values_list(
+                'id', 'student_id', 'status', 'registration_date', 'fee', 'discount',
+                'registration_fee', 'session__registration_fee',
+            )
+        )
+        for (enrollment_id, student_id, status, reg_date, fee, discount,
+             reg_fee, session_reg_fee) in columns.iterator(chunk_size=CHUNK_SIZE):
+            i = index[student_id]
+            net_fee = (fee or 0) - (discount or 0)
+            paid = paid_by_enrollment.get(enrollment_id) or 0
+            base_fee[i] += net_fee
+            total_paid[i] += paid
+
+            # Same ordering as Student.objects.with_financials(): dated first, then lowest id
+            key = (reg_date is None, reg_date or date.min, enrollment_id)
+            effective_reg_fee = reg_fee if reg_fee is not None else (session_reg_fee or 0)
+            if primary[i] is None or key < primary[i][0]:
+                primary[i] = (key, effective_reg_fee)
+            if status == 'Active':
+                active_discount[i] += discount or 0
+
+        total_fee = [
+            base + (entry[1] if entry else 0) for base, entry in zip(base_fee, primary)
+        ]
+
+        return cls(student_ids, total_fee, total_paid, active_discount)
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    @property
+    def total_expected_revenue(self):
+        return sum(self.total_fee)
+
+    @property
+    def total_pending(self):
+        return sum(self.remaining_balance)
+
+    @property
+    def total_discount(self):
+        """Discounts granted on active enrollments"""
+        return sum(self.active_discount)
+
+    def status_counts(self):
+        """Number of students per payment_status"""
+        counts = {'Paid': 0, 'Partial': 0, 'Unpaid': 0}
+        for status in self.payment_status:
+            counts[status] += 1
+        return counts
+
+    def pending_count(self):
+        return sum(1 for balance in self.remaining_balance if balance > 0)
@@ -1,9 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import date, timedelta
-from dateutil.relativedelta import relativedelta
 from Admin import models as admin_models
-from django.contrib.auth.models import User
+from authentication.models import User
 
 class Command(BaseCommand):
     help = 'Process monthly session renewals for students whose next payment is due within 7 days'
@@ -61,20 +60,20 @@ class Command(BaseCommand):
                             renewed_count += 1
                             self.stdout.write(
                                 self.style.SUCCESS(
-                                    f"✓ Created renewal payment for {student_session.student.student_name}"
+                                    f"✓ Scheduled renewal for {student_session.student.student_name}"
                                 )
                             )
                         else:
                             self.stdout.write(
                                 self.style.ERROR(
-                                    f"✗ Failed to create renewal payment for {student_session.student.student_name}"
+                                    f"✗ Failed to schedule renewal for {student_session.student.student_name}"
                                 )
                             )
                     else:
                         renewed_count += 1
                         self.stdout.write(
                             self.style.SUCCESS(
-                                f"[DRY RUN] Would create renewal payment for {student_session.student.student_name}"
+                                f"[DRY RUN] Would schedule renewal for {student_session.student.student_name}"
                             )
                         )
                     
@@ -90,7 +89,7 @@ class Command(BaseCommand):
         self.stdout.write(
             self.style.SUCCESS(
                 f"\nCompleted! Processed {processed_count} students, "
-                f"created {renewed_count} renewal payments."
+                f"created {renewed_count} renewal installments."
             )
         )
     
@@ -99,31 +98,19 @@ class Command(BaseCommand):
         Check if a monthly session renewal is needed for this student.
         Returns (renewal_needed, next_due_date)
         """
-        # Get the last payment for this student session
-        last_payment = admin_models.Payments.objects.filter(
-            studentsession=student_session
-        ).order_by('-date').first()
-        
-        if not last_payment:
-            # No payments yet, check registration date
-            if student_session.registration_date:
-                # Calculate next monthly due date from registration
-                next_due = student_session.registration_date + relativedelta(months=1)
-                return next_due <= check_until_date, next_due
+        # One month after the last payment or scheduled renewal (or after registration)
+        next_due = admin_models.FeeInstallment.next_renewal_due(student_session)
+        if not next_due:
             return False, None
         
-        # Calculate next monthly due date from last payment
-        next_due = last_payment.date + relativedelta(months=1)
-        
-        # Check if there's already an unpaid payment for this due date
-        existing_unpaid = admin_models.Payments.objects.filter(
+        # Check if there's already a renewal scheduled for this due date
+        existing_unpaid = admin_models.FeeInstallment.objects.filter(
             studentsession=student_session,
-            date=next_due,
-            amount=0
+            due_date=next_due
         ).exists()
         
         if existing_unpaid:
-            # Already has unpaid payment for this date
+            # Already scheduled for this date
             return False, None
         
         # Check if renewal is due within the specified days
@@ -131,14 +118,14 @@ class Command(BaseCommand):
     
     def _create_monthly_renewal_payment(self, student_session, due_date):
         """
-        Create a new unpaid payment record for monthly session renewal.
+        Schedule an unpaid installment for monthly session renewal.
         Excludes registration fee as it's only charged once.
         """
         try:
-            # Get system user for automated processes
-            system_user = User.objects.filter(is_superuser=True).first()
+            # Get system user for automated processes (first admin)
+            system_user = User.objects.filter(usertype=1).order_by('id').first()
             if not system_user:
-                system_user = User.objects.first()
+                system_user = User.objects.order_by('id').first()
             
             if not system_user:
                 self.stdout.write(
@@ -146,12 +133,13 @@ class Command(BaseCommand):
                 )
                 return False
             
-            # Create unpaid payment record (amount=0 means unpaid)
-            payment = admin_models.Payments.objects.create(
+            # Schedule the renewal (unpaid until a payment settles it)
+            admin_models.FeeInstallment.objects.create(
                 studentsession=student_session,
-                user=system_user,
-                amount=0,  # Unpaid
-                date=due_date
+                kind='renewal',
+                created_by=system_user,
+                expected_amount=student_session.session.fee or 0,
+                due_date=due_date
             )
             
             # Update next_monthly_due field
@@ -175,6 +163,6 @@ class Command(BaseCommand):
             
         except Exception as e:
             self.stdout.write(
-                self.style.ERROR(f"Error creating renewal payment: {str(e)}")
+                self.style.ERROR(f"Error scheduling renewal: {str(e)}")
             )
             return False
\ No newline at end of file
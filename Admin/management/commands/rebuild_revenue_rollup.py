@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from Admin.dashboard import bump_finance_version
+from Admin.models import DailyRevenue
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyRevenue rollup (per day, session and collector) from the Payments table'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            buckets = DailyRevenue.rebuild()
+        bump_finance_version()
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {buckets} daily revenue bucket(s).'))
@@ -0,0 +1,59 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from Admin.dashboard import bump_finance_version
+from Admin.models import Student, StudentBalance, StudentSession
+
+REBUILD_CHUNK_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Move StudentSession.overdue_since along with the calendar (and, with --rebuild, recompute next_due_date/outstanding_amount and the StudentBalance ledger)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute the due columns of every enrollment and the ledger row of every student first',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running and refresh every this many seconds (default: refresh once and exit)',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            ids = list(StudentSession.objects.order_by('id').values_list('id', flat=True))
+            changed = 0
+            for start in range(0, len(ids), REBUILD_CHUNK_SIZE):
+                changed += StudentSession.objects.filter(
+                    id__in=ids[start:start + REBUILD_CHUNK_SIZE],
+                ).refresh_due_status()
+            if changed:
+                bump_finance_version()
+            self.stdout.write(f'Recomputed due status of {len(ids)} enrollment(s), {changed} changed.')
+
+            ids = list(Student.objects.order_by('id').values_list('id', flat=True))
+            for start in range(0, len(ids), REBUILD_CHUNK_SIZE):
+                StudentBalance.refresh(Student.objects.filter(id__in=ids[start:start + REBUILD_CHUNK_SIZE]))
+            self.stdout.write(f'Rebuilt the balance ledger of {len(ids)} student(s).')
+
+        while True:
+            self.refresh()
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def refresh(self):
+        # next_due_date does not move with the calendar, overdue_since does
+        started, cleared = StudentSession.objects.refresh_overdue_since(date.today())
+        if started or cleared:
+            bump_finance_version()
+        totals = StudentSession.objects.overdue_totals()
+        self.stdout.write(self.style.SUCCESS(
+            f'{started} enrollment(s) became overdue, {cleared} cleared. '
+            f'{totals["students"]} student(s) overdue by Rs. {totals["amount"]:,}.'
+        ))
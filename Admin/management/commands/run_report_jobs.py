@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from Admin.reports import claim_next_job, purge_finished_jobs, requeue_stale_jobs, run_report_job
+
+# Seconds between two purges of expired jobs while the worker idles
+PURGE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = 'Render queued report jobs (Word exports) into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Work through the jobs queued right now, then exit',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between polls of an empty queue (default: 2)',
+        )
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale job(s).'))
+
+        next_purge = 0
+        while True:
+            if time.monotonic() >= next_purge:
+                purged = purge_finished_jobs()
+                if purged:
+                    self.stdout.write(f'Deleted {purged} expired report job(s).')
+                next_purge = time.monotonic() + PURGE_INTERVAL
+
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            run_report_job(job)
+            if job.status == 'Done':
+                self.stdout.write(self.style.SUCCESS(f'{job}: {job.filename} ({len(job.content):,} bytes)'))
+            else:
+                self.stdout.write(self.style.ERROR(f'{job}: {job.error}'))
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+from Admin.outbox import (
+    OUTBOX_BATCH_SIZE, OUTBOX_MAX_PER_SECOND, OUTBOX_THREADS, SMTPDispatchPool, claim_batch, requeue_stale_claims,
+)
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued OutboxEmail messages over a pool of persistent SMTP connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Deliver the messages that are due right now, then exit',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=OUTBOX_BATCH_SIZE,
+            help=f'Messages claimed per round, split across the threads (default: {OUTBOX_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=OUTBOX_THREADS,
+            help=f'Sending threads, each with its own SMTP connection (default: {OUTBOX_THREADS})',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=OUTBOX_MAX_PER_SECOND,
+            help=f'Maximum recipients per second over all threads, 0 for no limit (default: {OUTBOX_MAX_PER_SECOND})',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds to wait between polls of an empty outbox (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_claims()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale message(s).'))
+
+        with SMTPDispatchPool(size=options['threads'], rate=options['rate']) as pool:
+            while True:
+                batch = claim_batch(options['batch_size'])
+                if not batch:
+                    if options['once']:
+                        return
+                    time.sleep(options['interval'])
+                    continue
+
+                sent, failed = pool.deliver(batch)
+                style = self.style.SUCCESS if not failed else self.style.WARNING
+                self.stdout.write(style(f'Sent {sent} message(s), {failed} failed.'))
@@ -1,12 +1,14 @@
 from django.core.management.base import BaseCommand
 from django.core.mail import send_mail
 from django.conf import settings
+from Admin.memo import memo_scope
 from Admin.models import Student
 from datetime import date
 
 class Command(BaseCommand):
     help = 'Test email configuration and check students with pending fees'
 
+    @memo_scope()
     def handle(self, *args, **options):
         self.stdout.write("Testing email configuration...")
         self.stdout.write(f"EMAIL_HOST: {settings.EMAIL_HOST}")
@@ -16,7 +18,7 @@ class Command(BaseCommand):
         self.stdout.write(f"EMAIL_BACKEND: {settings.EMAIL_BACKEND}")
 
         self.stdout.write("\nChecking students with pending fees...")
-        students = Student.objects.filter(status='Active')
+        students = Student.objects.filter(status='Active').with_financials()
         self.stdout.write(f"Total active students: {students.count()}")
 
         students_with_pending = 0
@@ -33,7 +35,7 @@ class Command(BaseCommand):
                 self.stdout.write("  *** HAS PENDING FEES ***")
             
             # Check sessions
-            sessions = student.student_sessions.all()
+            sessions = student.student_sessions.with_primary_flag().select_related('session')
             self.stdout.write(f"Sessions: {sessions.count()}")
             for session in sessions:
                 self.stdout.write(f"  - {session.session.session_name} ({session.status}): Balance Rs. {session.session_balance:,.0f}")
@@ -0,0 +1,62 @@
+"""
+Request/job scoped memoization of derived Student and StudentSession values.
+
+Inside a memo_scope() (opened per request by MemoScopeMiddleware, or around a
+management command) the fee properties are computed once per object and then
+served from memory. Entries are grouped by student so the Payments/StudentSession
+signals can drop exactly the values a write may have changed. Outside a scope
+the properties behave as before and always hit the database.
+"""
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_scope = ContextVar('admin_memo_scope', default=None)
+
+
+@contextmanager
+def memo_scope():
+    """Memoize derived values until the block exits; nested scopes share the outer cache"""
+    if _scope.get() is not None:
+        yield
+        return
+    token = _scope.set({})
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def memoized(owner_attr):
+    """
+    Memoize a derived value in the active scope. owner_attr names the attribute
+    holding the student id the value depends on ('pk' on Student, 'student_id'
+    on StudentSession).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self):
+            cache = _scope.get()
+            owner = getattr(self, owner_attr)
+            if cache is None or self.pk is None or owner is None:
+                return func(self)
+            entries = cache.setdefault(owner, {})
+            key = (self._meta.label, self.pk, func.__name__)
+            if key not in entries:
+                entries[key] = func(self)
+            return entries[key]
+        return wrapper
+    return decorator
+
+
+def invalidate_student(student_id):
+    """Drop every memoized value of one student (and of its enrollments)"""
+    cache = _scope.get()
+    if cache is not None:
+        cache.pop(student_id, None)
+
+
+def invalidate_all():
+    cache = _scope.get()
+    if cache is not None:
+        cache.clear()
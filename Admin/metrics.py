@@ -0,0 +1,177 @@
+"""
+Declarative KPIs for the revenue metrics.
+
+A Metric names the source queryset it aggregates and the aggregate expression
+that computes it there. compute() groups the requested metrics by source and
+evaluates each group with a single aggregate() call, so a new KPI over an
+existing source adds a column to a query rather than a round-trip. Derived
+metrics are plain functions of other metrics, computed after the queries.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import DailyRevenue, Student, StudentSession
+
+SOURCES = {}
+METRICS = {}
+
+
+class MetricContext:
+    """What a request asks the metrics for: the payments date range and the current day"""
+
+    def __init__(self, start_date=None, end_date=None, today=None):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.today = today
+
+
+class Metric:
+    """
+    An aggregate over a source queryset. expression is an aggregate, or a
+    callable taking the MetricContext for expressions that depend on the request.
+    """
+
+    def __init__(self, name, source, expression, cast=int):
+        self.name = name
+        self.source = source
+        self.expression = expression
+        self.cast = cast
+
+    def resolve(self, context):
+        return self.expression(context) if callable(self.expression) else self.expression
+
+
+class Derived:
+    """
+    A metric computed in Python: compute(context, *values) receives the
+    MetricContext and the values of the metrics it depends on, in order.
+    """
+
+    def __init__(self, name, depends, compute):
+        self.name = name
+        self.depends = depends
+        self.compute = compute
+
+
+def source(name):
+    """Register a callable(context) returning the queryset a group of metrics aggregates"""
+    def decorator(build):
+        SOURCES[name] = build
+        return build
+    return decorator
+
+
+def register(*metrics):
+    for metric in metrics:
+        if isinstance(metric, Metric) and metric.source not in SOURCES:
+            raise ValueError(f'Metric {metric.name} uses an unknown source: {metric.source}')
+        METRICS[metric.name] = metric
+
+
+def _with_dependencies(names):
+    """The requested metrics and everything they derive from, dependencies first"""
+    ordered = []
+
+    def visit(name):
+        if name in ordered:
+            return
+        metric = METRICS[name]
+        if isinstance(metric, Derived):
+            for dependency in metric.depends:
+                visit(dependency)
+        ordered.append(name)
+
+    for name in names:
+        visit(name)
+    return ordered
+
+
+def compute(names, start_date=None, end_date=None, today=None):
+    """Values of the named metrics, from one aggregate query per source they touch"""
+    context = MetricContext(start_date, end_date, today)
+    ordered = _with_dependencies(names)
+
+    by_source = {}
+    for name in ordered:
+        metric = METRICS[name]
+        if isinstance(metric, Metric):
+            by_source.setdefault(metric.source, {})[name] = metric.resolve(context)
+
+    values = {}
+    for source_name, expressions in by_source.items():
+        row = SOURCES[source_name](context).aggregate(**expressions)
+        for name, value in row.items():
+            values[name] = METRICS[name].cast(value)
+
+    for name in ordered:
+        metric = METRICS[name]
+        if isinstance(metric, Derived):
+            values[name] = metric.compute(context, *(values[dependency] for dependency in metric.depends))
+
+    return {name: values[name] for name in names}
+
+
+@source('revenue')
+def revenue_rows(context):
+    """DailyRevenue buckets of the requested date range"""
+    rows = DailyRevenue.objects.all()
+    if context.start_date:
+        rows = rows.filter(day__gte=context.start_date)
+    if context.end_date:
+        rows = rows.filter(day__lte=context.end_date)
+    return rows
+
+
+@source('students')
+def active_students(context):
+    """Active students with their fee columns (Student.objects.with_financials)"""
+    return Student.objects.filter(status='Active').with_financials()
+
+
+@source('overdue')
+def overdue_enrollments(context):
+    """Enrollments of active students past their next due date"""
+    return StudentSession.objects.filter(student__status='Active').overdue(context.today)
+
+
+def _projected_monthly_revenue(context, month_revenue):
+    # The current month's daily average carried over a 30-day month
+    return month_revenue + month_revenue / context.today.day * (30 - context.today.day)
+
+
+register(
+    Metric('total_revenue', 'revenue', Coalesce(Sum('amount'), 0)),
+    Metric('payments_count', 'revenue', Coalesce(Sum('payment_count'), 0)),
+    Metric('daily_revenue', 'revenue', lambda c: Coalesce(Sum('amount', filter=Q(day=c.today)), 0)),
+    Metric('week_revenue', 'revenue', lambda c: Coalesce(
+        Sum('amount', filter=Q(day__gte=c.today - timedelta(days=7))), 0,
+    )),
+    Metric('month_revenue', 'revenue', lambda c: Coalesce(
+        Sum('amount', filter=Q(day__year=c.today.year, day__month=c.today.month)), 0,
+    )),
+    Metric('year_revenue', 'revenue', lambda c: Coalesce(Sum('amount', filter=Q(day__year=c.today.year)), 0)),
+
+    Metric('active_students_count', 'students', Count('pk')),
+    Metric('total_expected_revenue', 'students', Coalesce(Sum('total_fee_db'), 0)),
+    Metric('total_pending', 'students', Coalesce(Sum('remaining_balance_db'), 0)),
+    Metric('students_paid', 'students', Count('pk', filter=Q(remaining_balance_db=0))),
+    Metric('students_partial', 'students', Count(
+        'pk', filter=Q(remaining_balance_db__gt=0, remaining_balance_db__lt=F('total_fee_db')),
+    )),
+    Metric('students_unpaid', 'students', Count('pk', filter=Q(remaining_balance_db=F('total_fee_db')))),
+
+    Metric('overdue_students_count', 'overdue', Count('student', distinct=True)),
+    Metric('overdue_amount', 'overdue', Coalesce(Sum('outstanding_amount'), 0)),
+
+    Derived(
+        'collection_rate', ['total_revenue', 'total_expected_revenue'],
+        lambda c, revenue, expected: round(revenue / expected * 100, 1) if expected > 0 else 0,
+    ),
+    Derived(
+        'avg_payment', ['total_revenue', 'payments_count'],
+        lambda c, revenue, count: revenue / count if count else 0,
+    ),
+    Derived('projected_monthly_revenue', ['month_revenue'], _projected_monthly_revenue),
+)
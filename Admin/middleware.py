@@ -1,5 +1,6 @@
 from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
+from .memo import memo_scope
 from .models import Sessions, Notification
 from django.contrib.auth.models import User
 import logging
@@ -87,4 +88,19 @@ class SessionStatusMiddleware(MiddlewareMixin):
             logger.error(f"Error in SessionStatusMiddleware: {e}")
         
         # Continue with the request processing
-        return None
\ No newline at end of file
+        return None
+
+
+class MemoScopeMiddleware:
+    """
+    Memoize Student/StudentSession fee properties for the lifetime of one request.
+    Payments/StudentSession writes made during the request invalidate the affected
+    student (see Admin.signals).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with memo_scope():
+            return self.get_response(request)
@@ -0,0 +1,57 @@
+# Generated by Django 4.2 on 2026-10-18 14:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+
+
+def backfill_daily_revenue(apps, schema_editor):
+    Payments = apps.get_model('Admin', 'Payments')
+    DailyRevenue = apps.get_model('Admin', 'DailyRevenue')
+    rows = (
+        Payments.objects.order_by()
+        .values('date', 'studentsession__session_id', 'user_id')
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+    DailyRevenue.objects.bulk_create(
+        [
+            DailyRevenue(
+                day=row['date'], session_id=row['studentsession__session_id'],
+                collector_id=row['user_id'], amount=row['total'] or 0, payment_count=row['count'],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('Admin', '0018_alter_notification_category'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(blank=True, null=True)),
+                ('amount', models.IntegerField(default=0)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('collector', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='authentication.user')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='Admin.sessions')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='dailyrevenue',
+            index=models.Index(fields=['day'], name='Admin_daily_day_ec33de_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyrevenue',
+            unique_together={('day', 'session', 'collector')},
+        ),
+        migrations.RunPython(backfill_daily_revenue, migrations.RunPython.noop),
+    ]
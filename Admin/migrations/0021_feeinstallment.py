@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-18 14:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('Admin', '0020_dailyrevenue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeeInstallment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('installment', 'Installment'), ('renewal', 'Monthly Renewal')], default='installment', max_length=15)),
+                ('due_date', models.DateField()),
+                ('expected_amount', models.IntegerField(default=0)),
+                ('status', models.CharField(choices=[('Unpaid', 'Unpaid'), ('Paid', 'Paid')], default='Unpaid', max_length=10)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='scheduled_installments', to='authentication.user')),
+                ('payment', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='installment', to='Admin.payments')),
+                ('studentsession', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='installments', to='Admin.studentsession')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='feeinstallment',
+            index=models.Index(fields=['status', 'due_date'], name='Admin_feein_status_62432a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feeinstallment',
+            index=models.Index(fields=['studentsession', 'status', 'due_date'], name='Admin_feein_student_20bb20_idx'),
+        ),
+    ]
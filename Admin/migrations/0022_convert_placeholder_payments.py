@@ -0,0 +1,125 @@
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def placeholders_to_installments(apps, schema_editor):
+    """
+    Unpaid installments and monthly renewals used to be Payments rows with amount=0.
+    Move each of them into FeeInstallment and drop the placeholder.
+    """
+    Payments = apps.get_model('Admin', 'Payments')
+    FeeInstallment = apps.get_model('Admin', 'FeeInstallment')
+    DailyRevenue = apps.get_model('Admin', 'DailyRevenue')
+
+    # Every other payment was a paid installment: keep them on the schedule, settled
+    # by the payment itself, so installment counts carry over
+    paid = Payments.objects.filter(amount__gt=0).select_related('studentsession__session').order_by('date', 'id')
+    FeeInstallment.objects.bulk_create(
+        [
+            FeeInstallment(
+                studentsession_id=payment.studentsession_id,
+                kind='renewal' if payment.studentsession.session.session_type == 'monthly' else 'installment',
+                due_date=payment.date or payment.studentsession.registration_date or payment.studentsession.due_date,
+                expected_amount=payment.amount,
+                status='Paid',
+                payment_id=payment.id,
+                created_by_id=payment.user_id,
+            )
+            for payment in paid.iterator(chunk_size=1000)
+            if payment.date or payment.studentsession.registration_date or payment.studentsession.due_date
+        ],
+        batch_size=1000,
+    )
+
+    placeholders = Payments.objects.filter(amount=0).select_related('studentsession__session').order_by('date', 'id')
+    by_enrollment = defaultdict(list)
+    for payment in placeholders:
+        by_enrollment[payment.studentsession_id].append(payment)
+    if not by_enrollment:
+        return
+
+    paid_by_enrollment = dict(
+        Payments.objects.filter(studentsession_id__in=by_enrollment, amount__gt=0)
+        .order_by()
+        .values('studentsession_id')
+        .annotate(total=Sum('amount'))
+        .values_list('studentsession_id', 'total')
+    )
+
+    installments = []
+    for enrollment_id, payments in by_enrollment.items():
+        enrollment = payments[0].studentsession
+        session = enrollment.session
+        if session.session_type == 'monthly':
+            # Renewals were announced at the session's monthly fee
+            kind, expected = 'renewal', session.fee or 0
+        else:
+            # The per-installment amount was never stored: spread what is left of
+            # the enrollment fee evenly over its open installments
+            net_fee = (enrollment.fee if enrollment.fee is not None else session.fee or 0) - (enrollment.discount or 0)
+            remaining = max(0, net_fee - (paid_by_enrollment.get(enrollment_id) or 0))
+            kind, expected = 'installment', remaining // len(payments)
+        for payment in payments:
+            installments.append(FeeInstallment(
+                studentsession_id=enrollment_id,
+                kind=kind,
+                due_date=payment.date or payment.studentsession.registration_date or payment.studentsession.due_date,
+                expected_amount=expected,
+                created_by_id=payment.user_id,
+            ))
+
+    # Placeholders without any usable date cannot be scheduled; they carried no money either
+    FeeInstallment.objects.bulk_create([i for i in installments if i.due_date], batch_size=1000)
+    placeholders.delete()
+
+    # The revenue rollup counted the placeholders as payments
+    DailyRevenue.objects.all().delete()
+    rows = (
+        Payments.objects.order_by()
+        .values('date', 'studentsession__session_id', 'user_id')
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+    DailyRevenue.objects.bulk_create(
+        [
+            DailyRevenue(
+                day=row['date'], session_id=row['studentsession__session_id'],
+                collector_id=row['user_id'], amount=row['total'] or 0, payment_count=row['count'],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+def installments_to_placeholders(apps, schema_editor):
+    Payments = apps.get_model('Admin', 'Payments')
+    FeeInstallment = apps.get_model('Admin', 'FeeInstallment')
+    User = apps.get_model('authentication', 'User')
+
+    fallback_user = User.objects.order_by('id').first()
+    Payments.objects.bulk_create(
+        [
+            Payments(
+                studentsession_id=installment.studentsession_id,
+                user_id=installment.created_by_id or fallback_user.id,
+                amount=0,
+                date=installment.due_date,
+            )
+            for installment in FeeInstallment.objects.filter(status='Unpaid')
+        ],
+        batch_size=1000,
+    )
+    FeeInstallment.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Admin', '0021_feeinstallment'),
+    ]
+
+    operations = [
+        migrations.RunPython(placeholders_to_installments, installments_to_placeholders),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2 on 2026-10-18 14:18
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def drop_duplicate_attendance(apps, schema_editor):
+    """Keep only the latest mark per (course, student, date) before it becomes unique"""
+    Attendance = apps.get_model('Admin', 'Attendance')
+    duplicates = (
+        Attendance.objects.order_by()
+        .values('course_id', 'student_id', 'date')
+        .annotate(rows=Count('id'), keep=Max('id'))
+        .filter(rows__gt=1)
+    )
+    for row in duplicates:
+        Attendance.objects.filter(
+            course_id=row['course_id'], student_id=row['student_id'], date=row['date'],
+        ).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Admin', '0022_convert_placeholder_payments'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['course', 'date', 'student'], name='Admin_atten_course__8029f1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['is_read'], name='Admin_notif_is_read_238651_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['date'], name='Admin_notif_date_842a23_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payments',
+            index=models.Index(fields=['studentsession', 'amount', 'date'], name='Admin_payme_student_2be13b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payments',
+            index=models.Index(fields=['date'], name='Admin_payme_date_664a42_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['status'], name='Admin_stude_status_768969_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentsession',
+            index=models.Index(fields=['student', 'status'], name='Admin_stude_student_9d1dc7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentsession',
+            index=models.Index(fields=['session', 'status'], name='Admin_stude_session_ee6cef_idx'),
+        ),
+        migrations.RunPython(drop_duplicate_attendance, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(fields=('course', 'student', 'date'), name='unique_attendance_per_day'),
+        ),
+    ]
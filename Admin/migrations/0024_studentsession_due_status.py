@@ -0,0 +1,95 @@
+# Generated by Django 4.2 on 2026-10-18 14:20
+
+from datetime import date
+
+from django.db import migrations, models
+from django.db.models import Min, Q, Sum
+
+
+def backfill_due_status(apps, schema_editor):
+    """Same computation as StudentSession.objects.refresh_due_status(), over every enrollment"""
+    StudentSession = apps.get_model('Admin', 'StudentSession')
+    Payments = apps.get_model('Admin', 'Payments')
+    FeeInstallment = apps.get_model('Admin', 'FeeInstallment')
+    today = date.today()
+
+    paid = dict(
+        Payments.objects.order_by()
+        .values('studentsession_id')
+        .annotate(total=Sum('amount'))
+        .values_list('studentsession_id', 'total')
+    )
+    unpaid = {
+        row['studentsession_id']: row
+        for row in FeeInstallment.objects.filter(status='Unpaid')
+        .order_by()
+        .values('studentsession_id')
+        .annotate(first_due=Min('due_date'), renewals=Sum('expected_amount', filter=Q(kind='renewal')))
+    }
+    enrollments = list(StudentSession.objects.select_related('session').order_by('id'))
+
+    # The registration fee is charged on the primary of each student's active enrollments:
+    # earliest registration_date, then lowest id
+    primary = {}
+    for enrollment in enrollments:
+        if enrollment.status != 'Active':
+            continue
+        key = (enrollment.registration_date is None, enrollment.registration_date or date.min, enrollment.id)
+        if enrollment.student_id not in primary or key < primary[enrollment.student_id][0]:
+            primary[enrollment.student_id] = (key, enrollment.id)
+
+    for enrollment in enrollments:
+        reg_fee = 0
+        if primary.get(enrollment.student_id, (None, None))[1] == enrollment.id:
+            reg_fee = (
+                enrollment.registration_fee if enrollment.registration_fee is not None
+                else enrollment.session.registration_fee or 0
+            )
+        session_total = (enrollment.fee or 0) + reg_fee - (enrollment.discount or 0)
+        balance = max(0, session_total - (paid.get(enrollment.id) or 0))
+        schedule = unpaid.get(enrollment.id, {})
+        outstanding = max(balance, schedule.get('renewals') or 0)
+        next_due = None
+        if enrollment.status == 'Active' and outstanding > 0:
+            next_due = min(filter(None, [schedule.get('first_due'), enrollment.due_date]), default=None)
+        enrollment.next_due_date = next_due
+        enrollment.overdue_since = next_due if next_due and next_due < today else None
+        enrollment.outstanding_amount = outstanding
+
+    StudentSession.objects.bulk_update(
+        enrollments, ['next_due_date', 'overdue_since', 'outstanding_amount'], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Admin', '0023_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentsession',
+            name='next_due_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='studentsession',
+            name='outstanding_amount',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='studentsession',
+            name='overdue_since',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='studentsession',
+            index=models.Index(fields=['next_due_date'], name='Admin_stude_next_du_ca92fd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentsession',
+            index=models.Index(fields=['overdue_since'], name='Admin_stude_overdue_e3703a_idx'),
+        ),
+        migrations.RunPython(backfill_due_status, migrations.RunPython.noop),
+    ]
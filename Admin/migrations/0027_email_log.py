@@ -0,0 +1,64 @@
+# Generated by Django 4.2 on 2026-10-18 14:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('Admin', '0026_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxemail',
+            name='kind',
+            field=models.CharField(choices=[('fee_reminder', 'Payment Reminder'), ('broadcast', 'Broadcast'), ('general', 'General')], default='general', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='EmailLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('fee_reminder', 'Payment Reminder'), ('broadcast', 'Broadcast'), ('general', 'General')], default='general', max_length=20)),
+                ('subject', models.CharField(max_length=255)),
+                ('recipient', models.EmailField(max_length=254)),
+                ('status', models.CharField(choices=[('Queued', 'Queued'), ('Sent', 'Sent'), ('Failed', 'Failed')], default='Queued', max_length=10)),
+                ('error', models.TextField(blank=True)),
+                ('queued_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('failed_at', models.DateTimeField(blank=True, null=True)),
+                ('outbox', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='logs', to='Admin.outboxemail')),
+                ('sent_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='email_logs', to='authentication.user')),
+                ('student', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='email_logs', to='Admin.student')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EmailDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('kind', models.CharField(choices=[('fee_reminder', 'Payment Reminder'), ('broadcast', 'Broadcast'), ('general', 'General')], max_length=20)),
+                ('queued', models.IntegerField(default=0)),
+                ('sent', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('day', 'kind')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='emaillog',
+            index=models.Index(fields=['queued_at'], name='Admin_email_queued__6ec948_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emaillog',
+            index=models.Index(fields=['status', 'queued_at'], name='Admin_email_status_744d7c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emaillog',
+            index=models.Index(fields=['student', 'queued_at'], name='Admin_email_student_a19e63_idx'),
+        ),
+    ]
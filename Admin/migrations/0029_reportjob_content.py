@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-18 14:55
+
+from django.db import migrations, models
+
+
+def drop_file_jobs(apps, schema_editor):
+    """
+    Finished jobs point at files on the disk of whichever container rendered them.
+    They are only a cache of rendered reports: drop them so they are rendered again.
+    """
+    apps.get_model('Admin', 'ReportJob').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Admin', '0028_email_broadcast'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_file_jobs, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='reportjob',
+            name='file',
+        ),
+        migrations.AddField(
+            model_name='reportjob',
+            name='content',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+    ]
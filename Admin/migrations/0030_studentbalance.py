@@ -0,0 +1,72 @@
+# Generated by Django 4.2 on 2026-10-18 15:04
+
+from datetime import date
+
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def backfill_balances(apps, schema_editor):
+    """Same computation as Student.objects.with_financials(), over every student"""
+    Student = apps.get_model('Admin', 'Student')
+    StudentSession = apps.get_model('Admin', 'StudentSession')
+    Payments = apps.get_model('Admin', 'Payments')
+    StudentBalance = apps.get_model('Admin', 'StudentBalance')
+
+    paid = dict(
+        Payments.objects.order_by()
+        .values('studentsession__student_id')
+        .annotate(total=Sum('amount'))
+        .values_list('studentsession__student_id', 'total')
+    )
+    fees = {}
+    primary = {}
+    for enrollment in StudentSession.objects.select_related('session').order_by('id'):
+        fees[enrollment.student_id] = (
+            fees.get(enrollment.student_id, 0) + (enrollment.fee or 0) - (enrollment.discount or 0)
+        )
+        # The registration fee is charged once, on the earliest registered enrollment
+        key = (enrollment.registration_date is None, enrollment.registration_date or date.min, enrollment.id)
+        if enrollment.student_id not in primary or key < primary[enrollment.student_id][0]:
+            reg_fee = (
+                enrollment.registration_fee if enrollment.registration_fee is not None
+                else enrollment.session.registration_fee or 0
+            )
+            primary[enrollment.student_id] = (key, reg_fee)
+
+    rows = []
+    for student_id in Student.objects.order_by('id').values_list('id', flat=True):
+        total_fee = fees.get(student_id, 0) + primary.get(student_id, (None, 0))[1]
+        total_paid = paid.get(student_id) or 0
+        remaining = max(0, total_fee - total_paid)
+        rows.append(StudentBalance(
+            student_id=student_id,
+            total_fee=total_fee,
+            total_paid=total_paid,
+            remaining_balance=remaining,
+            payment_status='Paid' if remaining <= 0 else 'Partial' if total_paid > 0 else 'Unpaid',
+        ))
+    StudentBalance.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Admin', '0029_reportjob_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentBalance',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ledger', serialize=False, to='Admin.student')),
+                ('total_fee', models.IntegerField(default=0)),
+                ('total_paid', models.IntegerField(default=0)),
+                ('remaining_balance', models.IntegerField(default=0)),
+                ('payment_status', models.CharField(choices=[('Paid', 'Paid'), ('Partial', 'Partial'), ('Unpaid', 'Unpaid')], default='Unpaid', max_length=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,13 @@
 import os
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.utils.text import slugify
 from authentication.models import User
 from django.utils import timezone
+from django.db.models import Case, Count, ExpressionWrapper, F, Min, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from .memo import memoized
 
 def student_profile_photo_path(instance, filename):
     return f"student_profiles/{instance.rollno}/{filename}"
@@ -16,6 +21,54 @@ def student_degree_photo_path(instance, filename):
 def session_photo_path(instance, filename):
     return f"session_photos/{slugify(instance.session_name)}/{filename}"
 
+class StudentQuerySet(models.QuerySet):
+    def with_financials(self):
+        """
+        Annotate the values of Student.total_fee, total_paid, remaining_balance and
+        payment_status computed in the database, so a whole list costs one query.
+        The properties return these annotations when present.
+        """
+        enrollments = StudentSession.objects.filter(student=OuterRef('pk'))
+        base_total = (
+            enrollments.order_by()
+            .values('student')
+            .annotate(total=Sum(Coalesce('fee', 0) - Coalesce('discount', 0)))
+            .values('total')
+        )
+        # Primary session: earliest registration_date, fallback to lowest id
+        primary_reg_fee = (
+            enrollments.order_by(F('registration_date').asc(nulls_last=True), 'id')
+            .annotate(reg_fee=Coalesce('registration_fee', 'session__registration_fee', 0))
+            .values('reg_fee')[:1]
+        )
+        paid_total = (
+            Payments.objects.filter(studentsession__student=OuterRef('pk'))
+            .order_by()
+            .values('studentsession__student')
+            .annotate(total=Sum('amount'))
+            .values('total')
+        )
+        return self.annotate(
+            total_fee_db=ExpressionWrapper(
+                Coalesce(Subquery(base_total), 0) + Coalesce(Subquery(primary_reg_fee), 0),
+                output_field=models.IntegerField(),
+            ),
+            total_paid_db=Coalesce(Subquery(paid_total), 0, output_field=models.IntegerField()),
+        ).annotate(
+            remaining_balance_db=Case(
+                When(total_fee_db__gt=F('total_paid_db'), then=F('total_fee_db') - F('total_paid_db')),
+                default=Value(0),
+                output_field=models.IntegerField(),
+            ),
+        ).annotate(
+            payment_status_db=Case(
+                When(remaining_balance_db__lte=0, then=Value('Paid')),
+                When(total_paid_db__gt=0, then=Value('Partial')),
+                default=Value('Unpaid'),
+                output_field=models.CharField(),
+            ),
+        )
+
 class Student(models.Model):
     STATUS_CHOICES = [
         ('Active', 'Active'),
@@ -45,6 +98,11 @@ class Student(models.Model):
     added_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='added_students')
     created_at = models.DateTimeField(default=timezone.now)
 
+    objects = StudentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['status'])]
+
     def generate_roll_number(self, session):
         """Generate a unique roll number for the student in the given session"""
         # Get the session prefix (first 3 characters of session name)
@@ -82,59 +140,99 @@ class Student(models.Model):
         return roll_number
 
     @property
+    @memoized('pk')
+    def balance(self):
+        """The student's StudentBalance row, built on first read if the write paths have not yet"""
+        ledger = StudentBalance.objects.filter(student_id=self.pk).first()
+        if ledger is None:
+            StudentBalance.refresh(Student.objects.filter(pk=self.pk))
+            ledger = StudentBalance.objects.filter(student_id=self.pk).first()
+        return ledger
+
+    @property
+    @memoized('pk')
     def total_paid(self):
-        """Calculate total amount paid by this student from Payments table"""
-        return sum(
-            payment.amount or 0 
-            for session in self.student_sessions.all() 
-            for payment in session.student_payments.all()
-        )
+        """Total amount paid by this student across all sessions"""
+        if 'total_paid_db' in self.__dict__:
+            return self.total_paid_db
+        return self.balance.total_paid
 
     @property
+    @memoized('pk')
     def total_fee(self):
-        """Calculate total fee for all sessions (registration fee charged once)"""
-        # Consider all sessions, not just active ones, to account for outstanding payments
-        sessions_qs = self.student_sessions.all()
-        
-        # Sum of (fee - discount) across all sessions
-        base_total = sum((s.fee or 0) - (s.discount or 0) for s in sessions_qs)
-        
-        # Determine primary session: earliest registration_date, fallback to lowest id
-        primary_session = (
-            sessions_qs.exclude(registration_date__isnull=True)
-            .order_by('registration_date', 'id')
-            .first()
-            or sessions_qs.order_by('id').first()
-        )
-        
-        one_time_reg_fee = 0
-        if primary_session:
-            one_time_reg_fee = (
-                primary_session.registration_fee
-                if primary_session.registration_fee is not None
-                else (primary_session.session.registration_fee or 0)
-            )
-        
-        return base_total + (one_time_reg_fee or 0)
+        """Total fee for all sessions (registration fee charged once)"""
+        if 'total_fee_db' in self.__dict__:
+            return self.total_fee_db
+        return self.balance.total_fee
 
     @property
+    @memoized('pk')
     def remaining_balance(self):
         """Calculate remaining balance"""
-        return max(0, self.total_fee - self.total_paid)
+        if 'remaining_balance_db' in self.__dict__:
+            return self.remaining_balance_db
+        return self.balance.remaining_balance
 
     @property
+    @memoized('pk')
     def payment_status(self):
         """Get payment status: Paid, Partial, or Unpaid"""
-        if self.remaining_balance <= 0:
-            return 'Paid'
-        elif self.total_paid > 0:
-            return 'Partial'
-        else:
-            return 'Unpaid'
+        if 'payment_status_db' in self.__dict__:
+            return self.payment_status_db
+        return self.balance.payment_status
 
     def __str__(self):
         return f"{self.student_name} ({self.rollno})"
 
+class StudentBalance(models.Model):
+    """
+    Financial position of a student, one row per student so a profile reads it
+    with a primary-key lookup. Kept current by the Payments/StudentSession
+    signals and rebuilt by refresh_due_status --rebuild.
+    """
+    PAYMENT_STATUS_CHOICES = [
+        ('Paid', 'Paid'),
+        ('Partial', 'Partial'),
+        ('Unpaid', 'Unpaid'),
+    ]
+
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True, related_name='ledger')
+    total_fee = models.IntegerField(default=0)
+    total_paid = models.IntegerField(default=0)
+    remaining_balance = models.IntegerField(default=0)
+    payment_status = models.CharField(max_length=10, choices=PAYMENT_STATUS_CHOICES, default='Unpaid')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def refresh(cls, students):
+        """
+        Recompute the rows of the given Student queryset from
+        Student.objects.with_financials(): one SELECT and one upsert however
+        many students. Returns how many rows were written.
+        """
+        rows = [
+            cls(
+                student_id=student['pk'],
+                total_fee=student['total_fee_db'],
+                total_paid=student['total_paid_db'],
+                remaining_balance=student['remaining_balance_db'],
+                payment_status=student['payment_status_db'],
+            )
+            for student in students.with_financials().values(
+                'pk', 'total_fee_db', 'total_paid_db', 'remaining_balance_db', 'payment_status_db',
+            )
+        ]
+        cls.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['student'],
+            update_fields=['total_fee', 'total_paid', 'remaining_balance', 'payment_status', 'updated_at'],
+        )
+        return len(rows)
+
+    def __str__(self):
+        return f"{self.student} - {self.payment_status} ({self.remaining_balance})"
+
 class Sessions(models.Model):
     STATUS_CHOICES = [
         ('Active', 'Active'),
@@ -164,6 +262,112 @@ class Sessions(models.Model):
     def __str__(self):
         return f"{self.session_name} ({self.get_session_type_display()})"
 
+class StudentSessionQuerySet(models.QuerySet):
+    def with_primary_flag(self):
+        """
+        Annotate is_primary_db for the whole batch in the same SELECT, so
+        is_primary_session/session_balance/session_total_fee issue no extra queries.
+        The primary is resolved against all of the student's active enrollments,
+        not only the rows this queryset is filtered to.
+        """
+        primary_id = (
+            StudentSession.objects.filter(student=OuterRef('student'), status='Active')
+            .order_by(F('registration_date').asc(nulls_last=True), 'id')
+            .values('id')[:1]
+        )
+        return self.annotate(
+            is_primary_db=Case(
+                When(id=Subquery(primary_id), then=Value(True)),
+                default=Value(False),
+                output_field=models.BooleanField(),
+            ),
+        )
+
+    def overdue(self, today=None):
+        """Enrollments with money outstanding past their next due date"""
+        return self.filter(next_due_date__lt=today or date.today())
+
+    def overdue_totals(self, today=None):
+        """Number of students behind on payments and the amount they are behind by"""
+        return self.overdue(today).aggregate(
+            students=Count('student', distinct=True),
+            amount=Coalesce(Sum('outstanding_amount'), 0),
+        )
+
+    def refresh_overdue_since(self, today=None):
+        """
+        Move overdue_since along with the calendar: set it on enrollments whose
+        next due date has passed, clear it on the ones that are no longer behind.
+        """
+        today = today or date.today()
+        started = (
+            self.filter(next_due_date__lt=today)
+            .exclude(overdue_since=F('next_due_date'))
+            .update(overdue_since=F('next_due_date'))
+        )
+        cleared = (
+            self.filter(overdue_since__isnull=False)
+            .exclude(next_due_date__lt=today)
+            .update(overdue_since=None)
+        )
+        return started, cleared
+
+    def refresh_due_status(self, today=None):
+        """
+        Recompute next_due_date, overdue_since and outstanding_amount of these
+        enrollments from their fees, Payments and unpaid FeeInstallments.
+        Costs three queries however many enrollments; returns how many changed.
+        """
+        today = today or date.today()
+        paid = (
+            Payments.objects.filter(studentsession=OuterRef('pk'))
+            .order_by()
+            .values('studentsession')
+            .annotate(total=Sum('amount'))
+            .values('total')
+        )
+        enrollments = list(
+            self.select_related('session')
+            .with_primary_flag()
+            .annotate(paid_total=Coalesce(Subquery(paid), 0))
+        )
+        unpaid = {
+            row['studentsession_id']: row
+            for row in FeeInstallment.objects.filter(
+                studentsession__in=[e.pk for e in enrollments], status='Unpaid',
+            )
+            .order_by()
+            .values('studentsession_id')
+            .annotate(first_due=Min('due_date'), renewals=Sum('expected_amount', filter=Q(kind='renewal')))
+        }
+
+        changed = []
+        for enrollment in enrollments:
+            # The registration fee is charged on the primary of the active enrollments only
+            reg_fee = enrollment.effective_registration_fee if enrollment.is_primary_db else 0
+            session_total = (enrollment.fee or 0) + reg_fee - (enrollment.discount or 0)
+            balance = max(0, session_total - enrollment.paid_total)
+            # Monthly renewals are charged on top of the enrollment fee, so they can
+            # exceed the balance; installments of a course only split it
+            schedule = unpaid.get(enrollment.pk, {})
+            outstanding = max(balance, schedule.get('renewals') or 0)
+            next_due = None
+            if enrollment.status == 'Active' and outstanding > 0:
+                next_due = min(filter(None, [schedule.get('first_due'), enrollment.due_date]), default=None)
+            due_status = {
+                'next_due_date': next_due,
+                'overdue_since': next_due if next_due and next_due < today else None,
+                'outstanding_amount': outstanding,
+            }
+            if any(getattr(enrollment, field) != value for field, value in due_status.items()):
+                for field, value in due_status.items():
+                    setattr(enrollment, field, value)
+                changed.append(enrollment)
+
+        # bulk_update keeps StudentSession.save() and its signals out of the refresh
+        StudentSession.objects.bulk_update(changed, ['next_due_date', 'overdue_since', 'outstanding_amount'])
+        return len(changed)
+
 class StudentSession(models.Model):
     STATUS_CHOICES = [
         ('Active', 'Active'),
@@ -182,6 +386,20 @@ class StudentSession(models.Model):
     discount = models.IntegerField(null=True, blank=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Active')
     notes = models.TextField(blank=True, null=True)
+    # Maintained by StudentSession.objects.refresh_due_status() and the refresh_due_status command
+    next_due_date = models.DateField(null=True, blank=True)
+    overdue_since = models.DateField(null=True, blank=True)
+    outstanding_amount = models.IntegerField(default=0)
+
+    objects = StudentSessionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'status']),
+            models.Index(fields=['session', 'status']),
+            models.Index(fields=['next_due_date']),
+            models.Index(fields=['overdue_since']),
+        ]
 
     def clean(self):
         super().clean()
@@ -216,8 +434,18 @@ class StudentSession(models.Model):
         super().save(*args, **kwargs)
 
     @property
+    def effective_registration_fee(self):
+        """Registration fee for this enrollment, falling back to the session's default"""
+        if self.registration_fee is not None:
+            return self.registration_fee
+        return self.session.registration_fee or 0
+
+    @property
+    @memoized('student_id')
     def is_primary_session(self):
         """True if this is the student's primary session (earliest registration), else False"""
+        if 'is_primary_db' in self.__dict__:
+            return self.is_primary_db
         sessions_qs = self.student.student_sessions.filter(status='Active')
         primary = (
             sessions_qs.exclude(registration_date__isnull=True)
@@ -228,33 +456,22 @@ class StudentSession(models.Model):
         return primary and primary.id == self.id
 
     @property
+    @memoized('student_id')
     def session_paid(self):
         """Calculate amount paid for this specific session from Payments table"""
         return sum(payment.amount or 0 for payment in self.student_payments.all())
 
     @property
+    @memoized('student_id')
     def session_balance(self):
         """Calculate remaining balance for this session (registration fee only on primary session)"""
-        reg_fee = 0
-        if self.is_primary_session:
-            reg_fee = (
-                self.registration_fee
-                if self.registration_fee is not None
-                else (self.session.registration_fee or 0)
-            )
-        total_fee = (self.fee or 0) + reg_fee - (self.discount or 0)
-        return max(0, total_fee - self.session_paid)
+        return max(0, self.session_total_fee - self.session_paid)
 
     @property
+    @memoized('student_id')
     def session_total_fee(self):
         """Calculate total fee for this session (registration fee only on primary session)"""
-        reg_fee = 0
-        if self.is_primary_session:
-            reg_fee = (
-                self.registration_fee
-                if self.registration_fee is not None
-                else (self.session.registration_fee or 0)
-            )
+        reg_fee = self.effective_registration_fee if self.is_primary_session else 0
         return (self.fee or 0) + reg_fee - (self.discount or 0)
 
     def __str__(self):
@@ -285,6 +502,152 @@ class Payments(models.Model):
     amount = models.IntegerField(blank=True, null=True)
     date = models.DateField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['studentsession', 'amount', 'date']),
+            models.Index(fields=['date']),
+        ]
+
+class FeeInstallment(models.Model):
+    """
+    One amount scheduled to fall due on an enrollment: an installment of a fee plan
+    or a monthly renewal. Paying it records a Payments row and links it here.
+    """
+    STATUS_CHOICES = [
+        ('Unpaid', 'Unpaid'),
+        ('Paid', 'Paid'),
+    ]
+    KIND_CHOICES = [
+        ('installment', 'Installment'),
+        ('renewal', 'Monthly Renewal'),
+    ]
+
+    studentsession = models.ForeignKey(StudentSession, on_delete=models.CASCADE, related_name='installments')
+    kind = models.CharField(max_length=15, choices=KIND_CHOICES, default='installment')
+    due_date = models.DateField()
+    expected_amount = models.IntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Unpaid')
+    payment = models.OneToOneField(Payments, on_delete=models.SET_NULL, null=True, blank=True, related_name='installment')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='scheduled_installments')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'due_date']),
+            models.Index(fields=['studentsession', 'status', 'due_date']),
+        ]
+
+    @classmethod
+    def next_renewal_due(cls, studentsession):
+        """
+        Due date of the next monthly renewal of an enrollment: one month after its
+        latest payment or scheduled installment, else one month after registration.
+        """
+        last_dates = [
+            Payments.objects.filter(studentsession=studentsession).exclude(date__isnull=True)
+            .order_by('-date').values_list('date', flat=True).first(),
+            cls.objects.filter(studentsession=studentsession)
+            .order_by('-due_date').values_list('due_date', flat=True).first(),
+        ]
+        last_dates = [d for d in last_dates if d]
+        if last_dates:
+            return max(last_dates) + relativedelta(months=1)
+        if studentsession.registration_date:
+            return studentsession.registration_date + relativedelta(months=1)
+        return None
+
+    def mark_paid(self, payment):
+        """Settle this installment with a recorded payment"""
+        self.payment = payment
+        self.status = 'Paid'
+        self.save(update_fields=['payment', 'status'])
+
+    @classmethod
+    def settle(cls, studentsession, payment):
+        """
+        Apply the money paid on an enrollment to its schedule, earliest due first:
+        whatever was paid beyond the installments already settled pays off each
+        unpaid installment it fully covers, so partial payments add up until one
+        is covered. The first installment settled is linked to payment.
+        Returns the installments settled.
+        """
+        paid = Payments.objects.filter(studentsession=studentsession).aggregate(
+            total=Coalesce(Sum('amount'), 0),
+        )['total']
+        schedule = cls.objects.filter(studentsession=studentsession)
+        credit = paid - schedule.aggregate(
+            settled=Coalesce(Sum('expected_amount', filter=Q(status='Paid')), 0),
+        )['settled']
+
+        settled = []
+        for installment in schedule.filter(status='Unpaid').order_by('due_date', 'id'):
+            if installment.expected_amount > credit:
+                break
+            credit -= installment.expected_amount
+            installment.mark_paid(None if settled else payment)
+            settled.append(installment)
+        return settled
+
+    def __str__(self):
+        return f"{self.studentsession} - {self.get_kind_display()} due {self.due_date} ({self.status})"
+
+class DailyRevenue(models.Model):
+    """Payments rolled up per (day, session, collector), kept current by the Payments write paths"""
+    day = models.DateField(null=True, blank=True)
+    session = models.ForeignKey(Sessions, on_delete=models.CASCADE, related_name='daily_revenue')
+    collector = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_revenue')
+    amount = models.IntegerField(default=0)
+    payment_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('day', 'session', 'collector')
+        indexes = [models.Index(fields=['day'])]
+
+    @classmethod
+    def refresh_bucket(cls, day, session_id, collector_id):
+        """Recompute one bucket from Payments, dropping it once no payment falls in it"""
+        totals = Payments.objects.filter(
+            date=day, studentsession__session_id=session_id, user_id=collector_id,
+        ).aggregate(amount=Coalesce(Sum('amount'), 0), payment_count=Count('id'))
+        bucket = cls.objects.filter(day=day, session_id=session_id, collector_id=collector_id)
+        if not totals['payment_count']:
+            bucket.delete()
+            return None
+        if bucket.update(**totals):
+            return bucket.first()
+        try:
+            with transaction.atomic():
+                return cls.objects.create(day=day, session_id=session_id, collector_id=collector_id, **totals)
+        except IntegrityError:
+            # Another worker created the bucket first
+            bucket.update(**totals)
+            return bucket.first()
+
+    @classmethod
+    def rebuild(cls):
+        """Replace the whole rollup with fresh aggregates of the Payments table"""
+        rows = (
+            Payments.objects.order_by()
+            .values('date', 'studentsession__session_id', 'user_id')
+            .annotate(total=Coalesce(Sum('amount'), 0), count=Count('id'))
+        )
+        cls.objects.all().delete()
+        cls.objects.bulk_create(
+            [
+                cls(
+                    day=row['date'], session_id=row['studentsession__session_id'],
+                    collector_id=row['user_id'], amount=row['total'], payment_count=row['count'],
+                )
+                for row in rows
+            ],
+            batch_size=1000,
+        )
+        return cls.objects.count()
+
+    def __str__(self):
+        return f"{self.day} - {self.session} - {self.collector}: {self.amount}"
+
 class Attendance(models.Model):
     STATUS_CHOICES = [
         ('Present', 'Present'),
@@ -296,6 +659,12 @@ class Attendance(models.Model):
     date = models.DateField()
     status = models.CharField(max_length=10, choices=STATUS_CHOICES)
 
+    class Meta:
+        indexes = [models.Index(fields=['course', 'date', 'student'])]
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'student', 'date'], name='unique_attendance_per_day'),
+        ]
+
 class Notification(models.Model):
     CATEGORIES = [
         ('General', 'General'),
@@ -312,6 +681,181 @@ class Notification(models.Model):
     content = models.TextField(max_length=200, blank=True, null=True)
     is_read = models.BooleanField(default=False)  # Add this line
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_read']),
+            models.Index(fields=['date']),
+        ]
+
+class ReportJob(models.Model):
+    """
+    A report file requested from the UI and rendered by the run_report_jobs worker.
+    Jobs with the same kind, parameters and data version share one output file.
+    The file is kept in the row: the worker and the web process share the
+    database, not a filesystem.
+    """
+    STATUS_CHOICES = [
+        ('Queued', 'Queued'),
+        ('Running', 'Running'),
+        ('Done', 'Done'),
+        ('Failed', 'Failed'),
+    ]
+    KIND_CHOICES = [
+        ('revenue_word', 'Revenue Report (Word)'),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+    params_hash = models.CharField(max_length=64)
+    data_version = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Queued')
+    content = models.BinaryField(blank=True, default=b'')
+    filename = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='report_jobs')
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'params_hash', 'data_version']),
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.id} ({self.status})"
+
+class EmailBroadcast(models.Model):
+    """One message to a mailing list, queued as OutboxEmail chunks that each BCC part of the list"""
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    recipient_count = models.IntegerField(default=0)
+    chunk_size = models.PositiveIntegerField()
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='email_broadcasts')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def progress(self):
+        """Recipients queued, sent and failed so far, from the email log"""
+        counts = EmailLog.objects.filter(outbox__broadcast=self).aggregate(
+            queued=Count('id', filter=Q(status='Queued')),
+            sent=Count('id', filter=Q(status='Sent')),
+            failed=Count('id', filter=Q(status='Failed')),
+        )
+        counts['total'] = self.recipient_count
+        counts['done'] = counts['queued'] == 0
+        return counts
+
+    def __str__(self):
+        return f"{self.subject} ({self.recipient_count} recipients)"
+
+class OutboxEmail(models.Model):
+    """An email waiting for the send_outbox worker, with its delivery status and retry schedule"""
+    STATUS_CHOICES = [
+        ('Queued', 'Queued'),
+        ('Sending', 'Sending'),
+        ('Sent', 'Sent'),
+        ('Failed', 'Failed'),
+    ]
+    KIND_CHOICES = [
+        ('fee_reminder', 'Payment Reminder'),
+        ('broadcast', 'Broadcast'),
+        ('general', 'General'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='general')
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    recipients = models.JSONField(default=list)
+    bcc = models.JSONField(default=list, blank=True)
+    broadcast = models.ForeignKey(EmailBroadcast, on_delete=models.CASCADE, null=True, blank=True, related_name='chunks')
+    # Position within the broadcast, from 1; 0 for a standalone message
+    chunk = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='outbox_emails')
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['claimed_by']),
+        ]
+
+    @property
+    def all_recipients(self):
+        return self.recipients + self.bcc
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.all_recipients)} ({self.status})"
+
+class EmailLog(models.Model):
+    """One outgoing email to one recipient, from queueing to delivery or failure"""
+    STATUS_CHOICES = [
+        ('Queued', 'Queued'),
+        ('Sent', 'Sent'),
+        ('Failed', 'Failed'),
+    ]
+
+    outbox = models.ForeignKey(OutboxEmail, on_delete=models.SET_NULL, null=True, blank=True, related_name='logs')
+    kind = models.CharField(max_length=20, choices=OutboxEmail.KIND_CHOICES, default='general')
+    subject = models.CharField(max_length=255)
+    recipient = models.EmailField()
+    student = models.ForeignKey(Student, on_delete=models.SET_NULL, null=True, blank=True, related_name='email_logs')
+    sent_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='email_logs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Queued')
+    error = models.TextField(blank=True)
+    queued_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['queued_at']),
+            models.Index(fields=['status', 'queued_at']),
+            models.Index(fields=['student', 'queued_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} -> {self.recipient} ({self.status})"
+
+class EmailDailyStats(models.Model):
+    """Emails queued, sent and failed per day and kind, kept current by the outbox as it goes"""
+    day = models.DateField()
+    kind = models.CharField(max_length=20, choices=OutboxEmail.KIND_CHOICES)
+    queued = models.IntegerField(default=0)
+    sent = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('day', 'kind')
+
+    @classmethod
+    def bump(cls, kind, day=None, **counts):
+        """Add counts (queued/sent/failed) to the bucket of day (default: today)"""
+        day = day or timezone.localdate()
+        increments = {field: F(field) + n for field, n in counts.items() if n}
+        if not increments:
+            return
+        bucket = cls.objects.filter(day=day, kind=kind)
+        if bucket.update(**increments):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(day=day, kind=kind, **counts)
+        except IntegrityError:
+            # Another worker created the bucket first
+            bucket.update(**increments)
+
+    def __str__(self):
+        return f"{self.day} {self.kind}: {self.sent} sent, {self.failed} failed"
+
 # StudentFee and Installment models removed - replaced by unified Payments system
 # All payment data now calculated from Payments table using Student and StudentSession properties
 # All payment data now calculated from Payments table using Student and StudentSession properties
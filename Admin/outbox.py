@@ -0,0 +1,316 @@
+"""
+Outgoing email queue.
+
+Views call enqueue_email() and return at once; the send_outbox management
+command claims due messages in batches and hands them to an SMTPDispatchPool:
+worker threads that each keep one SMTP connection open across batches
+(get_connection + send_messages), paced by a global recipients-per-second limit.
+A message that fails is retried with exponential backoff until
+OUTBOX_MAX_ATTEMPTS, and keeps its status and last error on the OutboxEmail row.
+
+Every recipient of a queued message gets an EmailLog row that follows the
+message to Sent or Failed, and EmailDailyStats counts queued/sent/failed
+emails per day and kind as it happens, for the Email Services statistics.
+
+Broadcasts to a mailing list (enqueue_broadcast) are split into messages that
+BCC a chunk of the de-duplicated list each; EmailBroadcast.progress() follows
+their recipients through the log.
+"""
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EmailBroadcast, EmailDailyStats, EmailLog, OutboxEmail
+
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = timedelta(minutes=1)
+# A worker that held a batch this long without finishing it is presumed dead
+OUTBOX_CLAIM_TIMEOUT = timedelta(minutes=15)
+# Sending threads (one SMTP connection each) and the global send rate in
+# recipients per second, as provider quotas count them; 0 disables the limit
+OUTBOX_THREADS = getattr(settings, 'OUTBOX_THREADS', 1)
+OUTBOX_MAX_PER_SECOND = getattr(settings, 'OUTBOX_MAX_PER_SECOND', 0)
+# Recipients per broadcast message, kept under the provider's per-message limit
+OUTBOX_BCC_CHUNK_SIZE = getattr(settings, 'OUTBOX_BCC_CHUNK_SIZE', 50)
+
+
+def default_from_email():
+    return getattr(settings, 'EMAIL_HOST_USER', None) or 'admin@iqrainstitute.com'
+
+
+def enqueue_email(subject, body, recipients, from_email=None, created_by=None, kind='general', student_id=None,
+                  bcc=None, broadcast=None, chunk=0):
+    """Queue one message and log it per recipient; student_id: who a reminder is about"""
+    with transaction.atomic():
+        message = OutboxEmail.objects.create(
+            kind=kind,
+            subject=subject,
+            body=body,
+            recipients=list(recipients),
+            bcc=list(bcc or []),
+            broadcast=broadcast,
+            chunk=chunk,
+            from_email=from_email or default_from_email(),
+            created_by=created_by,
+        )
+        EmailLog.objects.bulk_create([
+            EmailLog(
+                outbox=message, kind=kind, subject=subject[:255], recipient=recipient,
+                student_id=student_id, sent_by=created_by, queued_at=message.created_at,
+            )
+            for recipient in message.all_recipients
+        ])
+        EmailDailyStats.bump(kind, queued=len(message.all_recipients))
+    return message
+
+
+def unique_addresses(addresses):
+    """Non-blank addresses, trimmed, first occurrence kept regardless of case"""
+    seen = set()
+    unique = []
+    for address in addresses:
+        address = (address or '').strip()
+        if address and address.lower() not in seen:
+            seen.add(address.lower())
+            unique.append(address)
+    return unique
+
+
+def enqueue_broadcast(subject, body, addresses, created_by=None, chunk_size=None):
+    """
+    Queue one message for a mailing list: the de-duplicated addresses go out in
+    chunks of chunk_size BCC recipients, so no recipient sees the others and no
+    message exceeds the provider's per-message recipient limit.
+    """
+    chunk_size = chunk_size or OUTBOX_BCC_CHUNK_SIZE
+    addresses = unique_addresses(addresses)
+    with transaction.atomic():
+        broadcast = EmailBroadcast.objects.create(
+            subject=subject, body=body, recipient_count=len(addresses), chunk_size=chunk_size, created_by=created_by,
+        )
+        for number, start in enumerate(range(0, len(addresses), chunk_size), start=1):
+            enqueue_email(
+                subject, body, [], created_by=created_by, kind='broadcast',
+                bcc=addresses[start:start + chunk_size], broadcast=broadcast, chunk=number,
+            )
+    return broadcast
+
+
+def retry_delay(attempts):
+    """Wait before attempt number attempts + 1: 1, 2, 4, 8... minutes"""
+    return OUTBOX_RETRY_DELAY * (2 ** (attempts - 1))
+
+
+def requeue_stale_claims():
+    """Hand back batches whose worker died between claiming and recording the outcome"""
+    return OutboxEmail.objects.filter(
+        status='Sending', claimed_at__lt=timezone.now() - OUTBOX_CLAIM_TIMEOUT,
+    ).update(status='Queued', claimed_by='', claimed_at=None)
+
+
+def claim_batch(size=OUTBOX_BATCH_SIZE):
+    """Mark up to size due messages as Sending for this worker and return them"""
+    now = timezone.now()
+    due = list(
+        OutboxEmail.objects.filter(status='Queued', next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'id')
+        .values_list('id', flat=True)[:size]
+    )
+    if not due:
+        return []
+    # Rows another worker claimed in the meantime are no longer Queued and stay theirs
+    token = uuid.uuid4().hex
+    OutboxEmail.objects.filter(id__in=due, status='Queued').update(
+        status='Sending', claimed_by=token, claimed_at=now,
+    )
+    return list(OutboxEmail.objects.filter(claimed_by=token, status='Sending').order_by('next_attempt_at', 'id'))
+
+
+def _record_sent(message):
+    message.attempts += 1
+    message.status = 'Sent'
+    message.sent_at = timezone.now()
+    message.last_error = ''
+    with transaction.atomic():
+        message.save(update_fields=['attempts', 'status', 'sent_at', 'last_error'])
+        EmailLog.objects.filter(outbox=message).update(status='Sent', sent_at=message.sent_at, error='')
+        EmailDailyStats.bump(message.kind, sent=len(message.all_recipients))
+
+
+def _record_failure(message, error):
+    now = timezone.now()
+    message.attempts += 1
+    message.last_error = str(error)
+    message.claimed_by = ''
+    message.claimed_at = None
+    if message.attempts >= OUTBOX_MAX_ATTEMPTS:
+        message.status = 'Failed'
+    else:
+        message.status = 'Queued'
+        message.next_attempt_at = now + retry_delay(message.attempts)
+    with transaction.atomic():
+        message.save(update_fields=['attempts', 'last_error', 'claimed_by', 'claimed_at', 'status', 'next_attempt_at'])
+        logs = EmailLog.objects.filter(outbox=message)
+        if message.status == 'Failed':
+            logs.update(status='Failed', failed_at=now, error=message.last_error)
+            EmailDailyStats.bump(message.kind, failed=len(message.all_recipients))
+        else:
+            logs.update(error=message.last_error)
+
+
+class RateLimiter:
+    """
+    Paces units (recipients) to rate per second across all threads: wait(count)
+    takes count units and holds the next caller back count/rate seconds.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def wait(self, count=1):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval * count
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def connection_lost(error):
+    """True when error leaves the SMTP session unusable, rather than refusing one message"""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        # 421: the server is closing the channel
+        return error.smtp_code == 421
+    # Socket errors; SMTPException is itself an OSError, but one the session survives
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class SMTPDispatchPool:
+    """
+    size worker threads, each sending over its own connection that stays open
+    across batches, under one global recipients-per-second limit (0: no limit).
+    The defaults come from OUTBOX_THREADS and OUTBOX_MAX_PER_SECOND. The threads
+    only talk SMTP; outcomes are recorded on the calling thread as they arrive.
+    """
+
+    def __init__(self, size=None, rate=None):
+        self.size = max(1, size or OUTBOX_THREADS)
+        rate = OUTBOX_MAX_PER_SECOND if rate is None else rate
+        self.limiter = RateLimiter(rate) if rate else None
+        self.connections = [None] * self.size
+        self.executor = ThreadPoolExecutor(max_workers=self.size) if self.size > 1 else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown()
+        for connection in self.connections:
+            if connection is not None:
+                connection.close()
+        self.connections = [None] * self.size
+
+    def _connection(self, lane):
+        if self.connections[lane] is None:
+            connection = get_connection(fail_silently=False)
+            connection.open()
+            self.connections[lane] = connection
+        return self.connections[lane]
+
+    def _reconnect(self, lane):
+        if self.connections[lane] is not None:
+            self.connections[lane].close()
+            self.connections[lane] = None
+        return self._connection(lane)
+
+    def _send_lane(self, lane, messages, report):
+        """Send messages over the lane's connection, calling report(message, error or None) for each"""
+        try:
+            connection = self._connection(lane)
+        except Exception as e:
+            # Nothing can go out over this lane this round; the messages wait for their next attempt
+            for message in messages:
+                report(message, e)
+            return
+
+        for i, message in enumerate(messages):
+            if self.limiter:
+                # A broadcast chunk counts for every address it BCCs
+                self.limiter.wait(max(1, len(message.all_recipients)))
+            try:
+                email = EmailMessage(message.subject, message.body, message.from_email, message.recipients, bcc=message.bcc)
+                try:
+                    # One message per call so a bad address fails only its own row
+                    connection.send_messages([email])
+                except smtplib.SMTPServerDisconnected:
+                    # The server dropped the idle connection between batches: not the message's fault
+                    connection = self._reconnect(lane)
+                    connection.send_messages([email])
+            except Exception as e:
+                report(message, e)
+                # A refused message leaves the session usable, a dropped connection does not
+                if connection_lost(e):
+                    try:
+                        connection = self._reconnect(lane)
+                    except Exception as reconnect_error:
+                        for pending in messages[i + 1:]:
+                            report(pending, reconnect_error)
+                        return
+                continue
+            report(message, None)
+
+    def deliver(self, messages):
+        """
+        Send claimed messages and record each outcome.
+        Returns (sent, failed) counts; failed messages are rescheduled or given up on.
+        """
+        counts = {'sent': 0, 'failed': 0}
+
+        def record(message, error):
+            if error is None:
+                _record_sent(message)
+                counts['sent'] += 1
+            else:
+                _record_failure(message, error)
+                counts['failed'] += 1
+
+        lanes = [(lane, messages[lane::self.size]) for lane in range(self.size) if messages[lane::self.size]]
+        if self.executor is None:
+            for lane, lane_messages in lanes:
+                self._send_lane(lane, lane_messages, record)
+            return counts['sent'], counts['failed']
+
+        outcomes = queue.Queue()
+        futures = [
+            self.executor.submit(self._send_lane, lane, lane_messages, lambda m, e: outcomes.put((m, e)))
+            for lane, lane_messages in lanes
+        ]
+        for _ in range(len(messages)):
+            record(*outcomes.get())
+        for future in futures:
+            future.result()
+        return counts['sent'], counts['failed']
+
+
+def deliver_batch(messages):
+    """Send claimed messages over a single connection"""
+    with SMTPDispatchPool(size=1, rate=0) as pool:
+        return pool.deliver(messages)
@@ -0,0 +1,135 @@
+"""
+Who gets a fee reminder and what it says.
+
+reminder_candidates() answers for every active student with unpaid
+installments, from one grouped query over FeeInstallment: the student's email,
+pending and overdue totals and a per-session breakdown. Payments not yet
+matched to an installment are deducted, earliest installments first, so the
+totals agree with StudentSession.outstanding_amount. The bulk and single
+reminder views and any scheduled reminder job build their messages from it.
+"""
+from datetime import date
+
+from django.db.models import Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import FeeInstallment, Payments
+
+REMINDER_SUBJECT = "Fee Payment Reminder - Iqra Academy"
+
+
+def reminder_candidates(student_ids=None, today=None, with_email=True):
+    """
+    Students owing unpaid installments, by student id, each as
+    {'student_id', 'name', 'email', 'pending', 'overdue', 'sessions'} where
+    sessions lists {'session_id', 'name', 'pending', 'overdue', 'first_overdue', 'next_due'}.
+    with_email: only students who can be emailed.
+    """
+    today = today or date.today()
+    installments = FeeInstallment.objects.filter(status='Unpaid', studentsession__student__status='Active')
+    if student_ids is not None:
+        installments = installments.filter(studentsession__student_id__in=student_ids)
+    if with_email:
+        installments = installments.exclude(studentsession__student__email__isnull=True).exclude(
+            studentsession__student__email='',
+        )
+
+    # Paid on the enrollment but short of settling its next installment
+    paid = (
+        Payments.objects.filter(studentsession=OuterRef('studentsession'))
+        .order_by()
+        .values('studentsession')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    settled = (
+        FeeInstallment.objects.filter(studentsession=OuterRef('studentsession'), status='Paid')
+        .order_by()
+        .values('studentsession')
+        .annotate(total=Sum('expected_amount'))
+        .values('total')
+    )
+    overdue = Q(due_date__lt=today)
+    rows = (
+        installments.order_by()
+        .values(
+            'studentsession', 'studentsession__student_id', 'studentsession__student__student_name',
+            'studentsession__student__email', 'studentsession__session_id', 'studentsession__session__session_name',
+        )
+        .annotate(
+            credit=Coalesce(Subquery(paid), 0) - Coalesce(Subquery(settled), 0),
+            pending=Coalesce(Sum('expected_amount'), 0),
+            overdue=Coalesce(Sum('expected_amount', filter=overdue), 0),
+            first_overdue=Min('due_date', filter=overdue),
+            next_due=Min('due_date', filter=~overdue),
+        )
+        .order_by('studentsession__student_id', 'studentsession__session__session_name', 'studentsession__session_id')
+    )
+
+    candidates = []
+    for row in rows:
+        # The credit goes to the earliest installments, the overdue ones first. It is
+        # less than a whole installment (settle() would have marked that one Paid),
+        # so first_overdue and next_due still stand
+        credit = max(0, row['credit'])
+        pending = max(0, row['pending'] - credit)
+        overdue = max(0, row['overdue'] - credit)
+        if not pending:
+            continue
+        if not candidates or candidates[-1]['student_id'] != row['studentsession__student_id']:
+            candidates.append({
+                'student_id': row['studentsession__student_id'],
+                'name': row['studentsession__student__student_name'],
+                'email': row['studentsession__student__email'],
+                'pending': 0,
+                'overdue': 0,
+                'sessions': [],
+            })
+        candidate = candidates[-1]
+        candidate['pending'] += pending
+        candidate['overdue'] += overdue
+        candidate['sessions'].append({
+            'session_id': row['studentsession__session_id'],
+            'name': row['studentsession__session__session_name'],
+            'pending': pending,
+            'overdue': overdue,
+            'first_overdue': row['first_overdue'],
+            'next_due': row['next_due'],
+        })
+    return candidates
+
+
+def reminder_message(candidate, today=None):
+    """Body of the fee reminder for one candidate: overdue amounts first, then upcoming ones"""
+    today = today or date.today()
+    overdue_details = []
+    upcoming_details = []
+    for session in candidate['sessions']:
+        if session['overdue'] > 0:
+            days_overdue = (today - session['first_overdue']).days
+            overdue_details.append(f"- {session['name']}: Rs. {session['overdue']:,.0f} ({days_overdue} days overdue)")
+        upcoming = session['pending'] - session['overdue']
+        if upcoming > 0:
+            upcoming_details.append(f"- {session['name']}: Rs. {upcoming:,.0f} (due: {session['next_due']})")
+    all_details = overdue_details + upcoming_details
+
+    return f"""Dear {candidate['name']},
+
+This is a friendly reminder that you have an outstanding payment of Rs. {candidate['pending']:,.0f} for your courses at Iqra Academy.
+
+Payment Details:
+{chr(10).join(all_details) if all_details else '- Course fees pending'}
+
+Total Pending Amount: Rs. {candidate['pending']:,.0f}
+
+Please arrange for the payment at your earliest convenience to avoid any interruption in your learning experience.
+
+If you have already made the payment, please disregard this message.
+
+For any queries regarding your payment, please contact our accounts department.
+
+Regards,
+Iqra Academy
+Accounts Department
+Phone: [Your Phone Number]
+Email: admin@iqrainstitute.com"""
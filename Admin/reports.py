@@ -0,0 +1,122 @@
+"""
+Report files rendered off the request path.
+
+The page enqueues a ReportJob, the run_report_jobs management command renders
+queued jobs into the job row (ReportJob.content), and the page polls the job
+until its file can be downloaded. A job remembers the finance data version it was asked for, so
+asking again with the same parameters before any payment or enrollment
+changes hands back the finished file instead of rendering it again.
+Finished jobs are deleted after REPORT_RETENTION, and only admins and the
+user who asked for a job can poll or download it.
+"""
+import hashlib
+import json
+from datetime import date, timedelta
+
+from django.utils import timezone
+
+from .dashboard import finance_version
+from .models import ReportJob
+
+# How long a Done or Failed job (and its file) is kept
+REPORT_RETENTION = timedelta(days=7)
+
+
+def report_renderers():
+    """kind -> callable(params) returning (filename, bytes)"""
+    # The renderers build on the metric helpers in views; import them late so
+    # the worker and the views can both import this module
+    from .views import build_revenue_word_report
+    return {
+        'revenue_word': build_revenue_word_report,
+    }
+
+
+def params_hash(kind, params):
+    payload = json.dumps({'kind': kind, 'params': params}, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def report_data_version(today=None):
+    """Reports render relative periods ("last 30 days") against today, so the day is part of the version"""
+    today = today or date.today()
+    return f'{today.isoformat()}:{finance_version()}'
+
+
+def visible_jobs(user):
+    """The report jobs a user may poll and download: all of them for admins, their own otherwise"""
+    if user is None:
+        return ReportJob.objects.none()
+    if user.usertype == 1:
+        return ReportJob.objects.all()
+    return ReportJob.objects.filter(requested_by=user)
+
+
+def enqueue_report(kind, params, user=None):
+    """
+    The job that will produce this report: a finished or pending job for the same
+    kind, parameters and data version when there is one the user can see, else a
+    new queued job.
+    """
+    digest = params_hash(kind, params)
+    version = report_data_version()
+    jobs = ReportJob.objects.all() if user is None else visible_jobs(user)
+    existing = (
+        jobs.filter(kind=kind, params_hash=digest, data_version=version)
+        .exclude(status='Failed')
+        .defer('content')
+        .order_by('-created_at', '-id')
+        .first()
+    )
+    if existing:
+        return existing
+    return ReportJob.objects.create(
+        kind=kind, params=params, params_hash=digest, data_version=version, requested_by=user,
+    )
+
+
+def claim_next_job():
+    """Move the oldest queued job to Running and return it; None when the queue is empty"""
+    while True:
+        job = ReportJob.objects.filter(status='Queued').defer('content').order_by('created_at', 'id').first()
+        if job is None:
+            return None
+        # Conditional update: of several workers racing for a job, exactly one wins it
+        claimed = ReportJob.objects.filter(pk=job.pk, status='Queued').update(
+            status='Running', started_at=timezone.now(),
+        )
+        if claimed:
+            job.refresh_from_db(fields=['status', 'started_at'])
+            return job
+
+
+def requeue_stale_jobs(older_than=timedelta(minutes=30)):
+    """Put back jobs whose worker died mid-render"""
+    return ReportJob.objects.filter(status='Running', started_at__lt=timezone.now() - older_than).update(
+        status='Queued', started_at=None,
+    )
+
+
+def purge_finished_jobs(older_than=REPORT_RETENTION):
+    """Delete Done and Failed jobs, and the files stored in them, finished before the retention window"""
+    deleted, _ = ReportJob.objects.filter(
+        status__in=['Done', 'Failed'], finished_at__lt=timezone.now() - older_than,
+    ).delete()
+    return deleted
+
+
+def run_report_job(job):
+    """Render a claimed job into its row and record the outcome"""
+    try:
+        filename, content = report_renderers()[job.kind](job.params)
+    except Exception as e:
+        job.status = 'Failed'
+        job.error = str(e)
+    else:
+        job.content = content
+        job.filename = filename
+        job.status = 'Done'
+        job.error = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['content', 'filename', 'status', 'error', 'finished_at'])
+    return job
@@ -0,0 +1,122 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from .dashboard import bump_finance_version
+from .memo import invalidate_all, invalidate_student
+from .models import DailyRevenue, FeeInstallment, Payments, Sessions, Student, StudentBalance, StudentSession
+
+
+def schedule_due_status_refresh(**enrollments):
+    """
+    Refresh the due status of the enrollments matching the filter once the
+    current transaction commits, when their payments and schedule are final.
+    """
+    transaction.on_commit(lambda: StudentSession.objects.filter(**enrollments).refresh_due_status())
+
+
+def schedule_balance_refresh(**students):
+    """
+    Recompute the StudentBalance rows of the students matching the filter after
+    commit, then drop memoized fees read from the old rows in the meantime.
+    """
+    def refresh():
+        StudentBalance.refresh(Student.objects.filter(**students).distinct())
+        invalidate_all()
+    transaction.on_commit(refresh)
+
+
+def schedule_revenue_refresh(buckets):
+    """Recompute the given (day, session_id, collector_id) DailyRevenue buckets after commit"""
+    for bucket in set(buckets):
+        transaction.on_commit(lambda bucket=bucket: DailyRevenue.refresh_bucket(*bucket))
+
+
+def schedule_finance_bump():
+    """
+    Invalidate the cached dashboard metrics once the write is committed and,
+    being registered last, after the due status/rollup refreshes it triggered.
+    """
+    transaction.on_commit(bump_finance_version)
+
+
+@receiver(pre_save, sender=Payments)
+def payment_saving(sender, instance, **kwargs):
+    # Remember the bucket an edited payment is leaving
+    instance._revenue_bucket_before = (
+        Payments.objects.filter(pk=instance.pk)
+        .values_list('date', 'studentsession__session_id', 'user_id')
+        .first()
+        if instance.pk else None
+    )
+
+
+@receiver([post_save, post_delete], sender=Payments)
+def payment_changed(sender, instance, **kwargs):
+    enrollment = (
+        StudentSession.objects.filter(pk=instance.studentsession_id)
+        .values_list('student_id', 'session_id')
+        .first()
+    )
+    if not enrollment:
+        return
+    student_id, session_id = enrollment
+    invalidate_student(student_id)
+    schedule_due_status_refresh(student_id=student_id)
+    schedule_balance_refresh(pk=student_id)
+
+    buckets = [(instance.date, session_id, instance.user_id)]
+    if getattr(instance, '_revenue_bucket_before', None):
+        buckets.append(instance._revenue_bucket_before)
+    schedule_revenue_refresh(buckets)
+    schedule_finance_bump()
+
+
+@receiver([post_save, post_delete], sender=FeeInstallment)
+def installment_changed(sender, instance, **kwargs):
+    # The schedule drives StudentSession.next_due_date/outstanding_amount
+    schedule_due_status_refresh(pk=instance.studentsession_id)
+    schedule_finance_bump()
+
+
+@receiver(pre_save, sender=StudentSession)
+def student_session_saving(sender, instance, **kwargs):
+    instance._session_id_before = (
+        StudentSession.objects.filter(pk=instance.pk).values_list('session_id', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver([post_save, post_delete], sender=StudentSession)
+def student_session_changed(sender, instance, **kwargs):
+    invalidate_student(instance.student_id)
+    # Which of the student's enrollments carries the registration fee may have changed
+    schedule_due_status_refresh(student_id=instance.student_id)
+    schedule_balance_refresh(pk=instance.student_id)
+
+    # Moving an enrollment to another session moves its payments between revenue buckets
+    session_before = getattr(instance, '_session_id_before', None)
+    if session_before and session_before != instance.session_id:
+        buckets = Payments.objects.filter(studentsession=instance).values_list('date', 'user_id').distinct()
+        schedule_revenue_refresh(
+            (day, session_id, user_id)
+            for day, user_id in buckets
+            for session_id in (session_before, instance.session_id)
+        )
+    schedule_finance_bump()
+
+
+@receiver([post_save, post_delete], sender=Student)
+def student_changed(sender, instance, **kwargs):
+    # Status changes move students in and out of the dashboard totals
+    schedule_finance_bump()
+
+
+@receiver(post_save, sender=Sessions)
+def session_changed(sender, instance, created, **kwargs):
+    # Enrollments without their own registration_fee inherit the session's
+    invalidate_all()
+    if created:
+        return
+    schedule_due_status_refresh(session=instance)
+    schedule_balance_refresh(student_sessions__session=instance)
+    schedule_finance_bump()
@@ -1,3 +1,1641 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import socketserver
+import threading
+import time
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from dateutil.relativedelta import relativedelta
+from docx import Document
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from authentication.models import User
+from Admin.dashboard import PaymentDashboardService, bump_finance_version, collector_analytics, receivables_aging, session_leaderboard
+from Admin.fee_engine import FeeSnapshot
+from Admin.memo import memo_scope
+from Admin.metrics import compute as compute_metrics
+from Admin.outbox import (
+    OUTBOX_MAX_ATTEMPTS, SMTPDispatchPool, claim_batch, deliver_batch, enqueue_broadcast, enqueue_email,
+)
+from Admin.reminders import reminder_candidates, reminder_message
+from Admin.reports import REPORT_RETENTION, enqueue_report
+from Admin.models import (
+    Attendance, DailyRevenue, EmailBroadcast, EmailDailyStats, EmailLog, FeeInstallment, Lead, Notification,
+    OutboxEmail, Payments, ReportJob, Sessions, Student, StudentBalance, StudentSession,
+)
+
+
+class AdminTestCase(TestCase):
+    """Tests acting as the institute's admin: cls.user, and log_in() for the views"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(first_name='Admin', last_name='User', email='admin@example.com', password='x', usertype=1)
+
+    def log_in(self, user=None):
+        """Start a session for user (default: the admin) the way the login view does"""
+        session = self.client.session
+        session['user_id'] = (user or self.user).id
+        session.save()
+
+
+class LoggedInTestCase(AdminTestCase):
+    """AdminTestCase whose client is logged in as the admin before each test"""
+
+    def setUp(self):
+        super().setUp()
+        self.log_in()
+
+
+class FinancialsParityTests(AdminTestCase):
+    """Student.objects.with_financials() must agree with the Python fee properties"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course = Sessions.objects.create(session_name='Physics', registration_fee=500, fee=10000)
+        cls.monthly = Sessions.objects.create(session_name='English', registration_fee=300, fee=4000, session_type='monthly')
+        cls.today = date.today()
+
+    def enroll(self, student, session, **kwargs):
+        kwargs.setdefault('fee', session.fee)
+        return StudentSession.objects.create(student=student, session=session, **kwargs)
+
+    def pay(self, enrollment, amount, days_ago=0):
+        return Payments.objects.create(
+            studentsession=enrollment, user=self.user, amount=amount,
+            date=self.today - timedelta(days=days_ago),
+        )
+
+    def assertParity(self):
+        annotated = {s.id: s for s in Student.objects.with_financials()}
+        self.assertEqual(len(annotated), Student.objects.count())
+        for student in Student.objects.all():
+            row = annotated[student.id]
+            self.assertEqual(
+                (row.total_fee, row.total_paid, row.remaining_balance, row.payment_status),
+                (student.total_fee, student.total_paid, student.remaining_balance, student.payment_status),
+                f"Mismatch for {student}",
+            )
+
+    def test_student_without_sessions(self):
+        Student.objects.create(student_name='Nobody')
+        self.assertParity()
+
+    def test_unpaid_single_session(self):
+        student = Student.objects.create(student_name='Ali')
+        enrollment = self.enroll(student, self.course, registration_date=self.today, discount=250)
+        self.pay(enrollment, 0)
+        self.assertParity()
+        self.assertEqual(Student.objects.with_financials().get().payment_status, 'Unpaid')
+
+    def test_partial_and_paid(self):
+        partial = Student.objects.create(student_name='Sara')
+        self.pay(self.enroll(partial, self.course, registration_date=self.today), 3000)
+        paid = Student.objects.create(student_name='Omar')
+        self.pay(self.enroll(paid, self.course, registration_date=self.today), 20000)
+        self.assertParity()
+        statuses = dict(Student.objects.with_financials().values_list('student_name', 'payment_status_db'))
+        self.assertEqual(statuses, {'Sara': 'Partial', 'Omar': 'Paid'})
+
+    def test_registration_fee_falls_back_to_session(self):
+        student = Student.objects.create(student_name='Hina')
+        enrollment = self.enroll(student, self.course, registration_date=self.today)
+        StudentSession.objects.filter(pk=enrollment.pk).update(registration_fee=None)
+        self.assertParity()
+        self.assertEqual(Student.objects.with_financials().get().total_fee, 10500)
+
+    def test_primary_session_ordering(self):
+        # Registration fee is charged once, on the earliest dated enrollment
+        dated = Student.objects.create(student_name='Bilal')
+        self.enroll(dated, self.course, registration_date=self.today, registration_fee=900, status='Completed')
+        self.enroll(dated, self.monthly, registration_date=self.today - timedelta(days=30), registration_fee=100)
+
+        # Without any registration_date the lowest id wins
+        undated = Student.objects.create(student_name='Zara')
+        self.enroll(undated, self.monthly, registration_fee=700, status='Completed')
+        self.enroll(undated, self.course, registration_fee=50)
+        self.assertParity()
+
+    def test_null_amounts_fees_and_discounts(self):
+        student = Student.objects.create(student_name='Usman')
+        enrollment = self.enroll(student, self.course, fee=None, registration_date=self.today)
+        Payments.objects.create(studentsession=enrollment, user=self.user, amount=None, date=self.today)
+        self.pay(enrollment, 200)
+        self.assertParity()
+
+    def test_many_students_single_query(self):
+        for i in range(20):
+            student = Student.objects.create(student_name=f'Student {i}')
+            enrollment = self.enroll(student, self.course, registration_date=self.today, discount=i * 100)
+            for j in range(i % 4):
+                self.pay(enrollment, 1000 * (j + 1), days_ago=j)
+        self.assertParity()
+        with self.assertNumQueries(1):
+            rows = list(Student.objects.with_financials())
+            [(s.total_fee, s.total_paid, s.remaining_balance, s.payment_status) for s in rows]
+
+
+class PrimarySessionFlagTests(AdminTestCase):
+    """StudentSession.objects.with_primary_flag() must agree with is_primary_session"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course = Sessions.objects.create(session_name='Physics', registration_fee=500, fee=10000)
+        cls.monthly = Sessions.objects.create(session_name='English', registration_fee=300, fee=4000, session_type='monthly')
+        today = date.today()
+        for i in range(10):
+            student = Student.objects.create(student_name=f'Student {i}')
+            StudentSession.objects.create(
+                student=student, session=cls.monthly, fee=4000, status='Completed',
+                registration_date=today - timedelta(days=60),
+            )
+            enrollment = StudentSession.objects.create(
+                student=student, session=cls.course, fee=10000,
+                registration_date=today - timedelta(days=i) if i % 2 else None,
+            )
+            Payments.objects.create(studentsession=enrollment, user=cls.user, amount=1000 * i, date=today)
+
+    def test_flag_matches_property(self):
+        annotated = {e.id: e for e in StudentSession.objects.with_primary_flag()}
+        for enrollment in StudentSession.objects.all():
+            row = annotated[enrollment.id]
+            self.assertEqual(bool(row.is_primary_session), bool(enrollment.is_primary_session))
+            self.assertEqual(row.session_total_fee, enrollment.session_total_fee)
+            self.assertEqual(row.session_balance, enrollment.session_balance)
+
+    def test_flag_ignores_queryset_filters(self):
+        # Filtering to one session must not make its rows primary for students whose primary is elsewhere
+        rows = StudentSession.objects.filter(session=self.course).with_primary_flag()
+        self.assertTrue(all(row.is_primary_session for row in rows))
+        rows = StudentSession.objects.filter(session=self.monthly).with_primary_flag()
+        self.assertFalse(any(row.is_primary_session for row in rows))
+
+    def test_balances_without_per_row_queries(self):
+        with self.assertNumQueries(2):
+            rows = list(
+                StudentSession.objects.with_primary_flag()
+                .select_related('session')
+                .prefetch_related('student_payments')
+            )
+            [(row.session_total_fee, row.session_balance) for row in rows]
+
+
+class MemoScopeTests(AdminTestCase):
+    """Fee properties are computed once per memo_scope and dropped on writes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course = Sessions.objects.create(session_name='Physics', registration_fee=500, fee=10000)
+        cls.student = Student.objects.create(student_name='Ali')
+        cls.enrollment = StudentSession.objects.create(
+            student=cls.student, session=cls.course, fee=10000, registration_date=date.today(),
+        )
+
+    def read_all(self, student):
+        return (student.total_fee, student.total_paid, student.remaining_balance, student.payment_status)
+
+    def test_repeated_reads_are_free(self):
+        with memo_scope():
+            student = Student.objects.get(pk=self.student.pk)
+            first = self.read_all(student)
+            with self.assertNumQueries(0):
+                self.assertEqual(self.read_all(student), first)
+                # Another instance of the same row shares the scope's values
+                self.assertEqual(self.read_all(Student(pk=self.student.pk)), first)
+
+    def test_no_memoization_outside_scope(self):
+        student = Student.objects.get(pk=self.student.pk)
+        student.total_paid
+        # One primary-key read of the student's StudentBalance row
+        with self.assertNumQueries(1):
+            student.total_paid
+
+    def test_writes_invalidate_scope(self):
+        with memo_scope():
+            student = Student.objects.get(pk=self.student.pk)
+            self.assertEqual(student.remaining_balance, 10500)
+            enrollment = StudentSession.objects.get(pk=self.enrollment.pk)
+            self.assertEqual(enrollment.session_balance, 10500)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Payments.objects.create(studentsession=self.enrollment, user=self.user, amount=4000, date=date.today())
+            student = Student.objects.get(pk=self.student.pk)
+            self.assertEqual(student.remaining_balance, 6500)
+            self.assertEqual(student.payment_status, 'Partial')
+            enrollment = StudentSession.objects.get(pk=self.enrollment.pk)
+            self.assertEqual(enrollment.session_balance, 6500)
+
+            enrollment.discount = 500
+            with self.captureOnCommitCallbacks(execute=True):
+                enrollment.save()
+            self.assertEqual(Student.objects.get(pk=self.student.pk).remaining_balance, 6000)
+
+
+class StudentBalanceTests(AdminTestCase):
+    """The Student fee properties read one StudentBalance row the write paths keep current"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course = Sessions.objects.create(session_name='Physics', registration_fee=500, fee=10000)
+        cls.student = Student.objects.create(student_name='Ali')
+
+    def enroll(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return StudentSession.objects.create(student=self.student, session=self.course, fee=10000, **fields)
+
+    def pay(self, enrollment, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Payments.objects.create(studentsession=enrollment, user=self.user, amount=amount, date=date.today())
+
+    def test_profile_reads_one_row(self):
+        enrollment = self.enroll(registration_date=date.today())
+        for _ in range(5):
+            self.pay(enrollment, 1000)
+
+        student = Student.objects.get(pk=self.student.pk)
+        with memo_scope(), self.assertNumQueries(1):
+            self.assertEqual(
+                (student.total_fee, student.total_paid, student.remaining_balance, student.payment_status),
+                (10500, 5000, 5500, 'Partial'),
+            )
+
+    def test_ledger_follows_writes(self):
+        first = self.enroll(registration_date=date.today() - timedelta(days=30), status='Completed')
+        second = self.enroll(registration_date=date.today(), discount=1000)
+        self.pay(second, 4000)
+        self.assertEqual(
+            StudentBalance.objects.filter(student=self.student).values_list('total_fee', 'total_paid').get(),
+            (19500, 4000),
+        )
+
+        # The session's registration fee is inherited by enrollments without their own
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.registration_fee = 800
+            self.course.save()
+        self.assertEqual(Student.objects.get(pk=self.student.pk).total_fee, 19800)
+
+        # The re-enrollment carries a waived registration fee of its own
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        ledger = StudentBalance.objects.get(student=self.student)
+        self.assertEqual((ledger.total_fee, ledger.remaining_balance), (9000, 5000))
+
+    def test_matches_financials_annotations(self):
+        enrollment = self.enroll(registration_date=date.today())
+        self.pay(enrollment, 10500)
+        StudentBalance.objects.all().delete()
+        call_command('refresh_due_status', rebuild=True, stdout=io.StringIO())
+
+        annotated = Student.objects.with_financials().get(pk=self.student.pk)
+        ledger = StudentBalance.objects.get(student=self.student)
+        self.assertEqual(
+            (ledger.total_fee, ledger.total_paid, ledger.remaining_balance, ledger.payment_status),
+            (annotated.total_fee, annotated.total_paid, annotated.remaining_balance, annotated.payment_status),
+        )
+        self.assertEqual(ledger.payment_status, 'Paid')
+
+
+class FeeSnapshotTests(AdminTestCase):
+    """FeeSnapshot must reproduce the model properties without loading model instances"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        course = Sessions.objects.create(session_name='Physics', registration_fee=500, fee=10000)
+        monthly = Sessions.objects.create(session_name='English', registration_fee=300, fee=4000, session_type='monthly')
+        today = date.today()
+        Student.objects.create(student_name='No enrollments')
+        for i in range(12):
+            student = Student.objects.create(student_name=f'Student {i}')
+            old = StudentSession.objects.create(
+                student=student, session=monthly, fee=4000, status='Completed', discount=i * 50,
+                registration_date=today - timedelta(days=90) if i % 3 else None,
+            )
+            current = StudentSession.objects.create(
+                student=student, session=course, fee=None if i == 5 else 10000,
+                registration_date=today - timedelta(days=i) if i % 2 else None,
+                due_date=today - timedelta(days=5 - i),
+            )
+            Payments.objects.create(studentsession=old, user=cls.user, amount=500 * i, date=today)
+            Payments.objects.create(studentsession=current, user=cls.user, amount=None if i == 7 else 1500 * i, date=today)
+
+    def test_matches_properties(self):
+        fees = FeeSnapshot.build(Student.objects.all())
+        students = {s.id: s for s in Student.objects.all()}
+        self.assertEqual(sorted(students), fees.student_ids)
+        for i, student_id in enumerate(fees.student_ids):
+            student = students[student_id]
+            self.assertEqual(
+                (fees.total_fee[i], fees.total_paid[i], fees.remaining_balance[i], fees.payment_status[i]),
+                (student.total_fee, student.total_paid, student.remaining_balance, student.payment_status),
+                f"Mismatch for {student}",
+            )
+            active = student.student_sessions.filter(status='Active')
+            self.assertEqual(fees.active_discount[i], sum(s.discount or 0 for s in active))
+
+    def test_query_count_is_fixed(self):
+        with self.assertNumQueries(3):
+            fees = FeeSnapshot.build()
+        self.assertEqual(len(fees), Student.objects.filter(status='Active').count())
+        self.assertEqual(sum(fees.status_counts().values()), len(fees))
+
+
+class DailyRevenueTests(AdminTestCase):
+    """The DailyRevenue rollup follows payment writes and matches a full rebuild"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.cashier = User.objects.create(first_name='Cash', last_name='Ier', email='cashier@example.com', password='x', usertype=1)
+        cls.course = Sessions.objects.create(session_name='Physics', registration_fee=500, fee=10000)
+        cls.monthly = Sessions.objects.create(session_name='English', registration_fee=300, fee=4000, session_type='monthly')
+        cls.today = date.today()
+        cls.enrollment = StudentSession.objects.create(
+            student=Student.objects.create(student_name='Ali'), session=cls.course, fee=10000,
+        )
+
+    def buckets(self):
+        return sorted(DailyRevenue.objects.values_list('day', 'session_id', 'collector_id', 'amount', 'payment_count'))
+
+    def assertMatchesRebuild(self):
+        incremental = self.buckets()
+        DailyRevenue.rebuild()
+        self.assertEqual(incremental, self.buckets())
+
+    def pay(self, amount, user=None, days_ago=0):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Payments.objects.create(
+                studentsession=self.enrollment, user=user or self.cashier, amount=amount,
+                date=self.today - timedelta(days=days_ago),
+            )
+
+    def test_payments_roll_up_per_bucket(self):
+        self.pay(1000)
+        self.pay(2500)
+        self.pay(0, days_ago=3)
+        self.pay(700, user=self.user)
+        self.assertEqual(self.buckets(), [
+            (self.today - timedelta(days=3), self.course.id, self.cashier.id, 0, 1),
+            (self.today, self.course.id, self.user.id, 700, 1),
+            (self.today, self.course.id, self.cashier.id, 3500, 2),
+        ])
+        self.assertMatchesRebuild()
+
+    def test_edits_move_payments_between_buckets(self):
+        payment = self.pay(1000)
+        self.pay(400)
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.date = self.today - timedelta(days=1)
+            payment.user = self.user
+            payment.save()
+        self.assertMatchesRebuild()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.enrollment.session = self.monthly
+            self.enrollment.save()
+        self.assertEqual({row[1] for row in self.buckets()}, {self.monthly.id})
+        self.assertMatchesRebuild()
+
+    def test_deletes_drop_empty_buckets(self):
+        payment = self.pay(1000)
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.delete()
+        self.assertEqual(self.buckets(), [])
+
+        self.pay(300)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.delete()
+        self.assertEqual(self.buckets(), [])
+
+
+    def test_concurrent_refresh_updates_the_other_workers_bucket(self):
+        # Not committed, so the bucket is left to refresh_bucket below
+        Payments.objects.create(studentsession=self.enrollment, user=self.cashier, amount=1000, date=self.today)
+        DailyRevenue.objects.bulk_create([
+            DailyRevenue(day=self.today, session=self.course, collector=self.cashier, amount=1, payment_count=1),
+        ])
+        update = QuerySet.update
+        looked = []
+
+        def before_the_other_worker(queryset, **kwargs):
+            # The first update() runs before the other worker's bucket exists
+            if not looked:
+                looked.append(True)
+                return 0
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', before_the_other_worker):
+            bucket = DailyRevenue.refresh_bucket(self.today, self.course.id, self.cashier.id)
+        self.assertEqual((bucket.amount, bucket.payment_count), (1000, 1))
+        self.assertEqual(DailyRevenue.objects.count(), 1)
+
+class RevenueSeriesTests(LoggedInTestCase):
+    """/payments/revenue-series/ groups the rollup by period and optional split"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.cashier = User.objects.create(first_name='Cash', last_name='Ier', email='cashier@example.com', password='x', usertype=1)
+        cls.course = Sessions.objects.create(session_name='Physics', registration_fee=500, fee=10000)
+        cls.monthly = Sessions.objects.create(session_name='English', registration_fee=300, fee=4000, session_type='monthly')
+        for day, session, user, amount in [
+            (date(2024, 1, 3), cls.course, cls.cashier, 1000),
+            (date(2024, 1, 20), cls.course, cls.user, 500),
+            (date(2024, 1, 20), cls.monthly, cls.cashier, 200),
+            (date(2024, 3, 1), cls.monthly, cls.user, 700),
+        ]:
+            DailyRevenue.objects.create(day=day, session=session, collector=user, amount=amount, payment_count=1)
+
+    def series(self, **params):
+        response = self.client.get('/payments/revenue-series/', params)
+        self.assertTrue(response.json()['success'], response.content)
+        return response.json()['data']
+
+    def test_monthly_totals(self):
+        # Session lookup and SessionStatusMiddleware take two queries, the series one GROUP BY
+        with self.assertNumQueries(2 + 1):
+            data = self.series(granularity='month')
+        self.assertEqual(data['labels'], ['2024-01-01', '2024-03-01'])
+        self.assertEqual(data['series'], [{'key': None, 'label': 'Revenue', 'data': [1700, 700]}])
+
+    def test_split_by_session_aligns_periods(self):
+        data = self.series(granularity='day', split='session', **{'from': '2024-01-10'})
+        self.assertEqual(data['labels'], ['2024-01-20', '2024-03-01'])
+        by_label = {s['label']: s['data'] for s in data['series']}
+        self.assertEqual(by_label, {'Physics': [500, 0], 'English': [200, 700]})
+
+    def test_split_by_collector(self):
+        data = self.series(granularity='week', split='collector')
+        totals = {s['label']: sum(s['data']) for s in data['series']}
+        self.assertEqual(totals, {'Cash Ier': 1200, 'Admin User': 1200})
+
+    def test_rejects_unknown_granularity(self):
+        response = self.client.get('/payments/revenue-series/', {'granularity': 'hour'})
+        self.assertFalse(response.json()['success'])
+
+
+class FeeInstallmentTests(LoggedInTestCase):
+    """Installments and renewals live on the FeeInstallment schedule, not in Payments"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course = Sessions.objects.create(session_name='Physics', registration_fee=500, fee=9000)
+        cls.monthly = Sessions.objects.create(session_name='English', registration_fee=0, fee=3000, session_type='monthly')
+        cls.today = date.today()
+        cls.student = Student.objects.create(student_name='Ali')
+        cls.enrollment = StudentSession.objects.create(student=cls.student, session=cls.course, fee=9000)
+        cls.subscriber = Student.objects.create(student_name='Sara')
+        cls.subscription = StudentSession.objects.create(
+            student=cls.subscriber, session=cls.monthly, fee=3000,
+            registration_date=cls.today - timedelta(days=27),
+        )
+
+    def test_mark_installment_paid_records_payment(self):
+        for i in range(3):
+            FeeInstallment.objects.create(
+                studentsession=self.enrollment, expected_amount=3000, due_date=self.today + timedelta(days=30 * i),
+            )
+        response = self.client.post(
+            f'/Admin-Students/{self.student.id}/mark-installment-paid/', HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        data = response.json()
+        self.assertTrue(data['success'], data)
+        self.assertEqual((data['paid_installments'], data['installments_due']), (1, 2))
+
+        first = FeeInstallment.objects.order_by('due_date').first()
+        self.assertEqual(first.status, 'Paid')
+        self.assertEqual((first.payment.amount, first.payment.date), (3000, self.today))
+        self.assertEqual(Payments.objects.filter(amount=0).count(), 0)
+
+    def test_mark_installment_paid_reports_partial_payment(self):
+        FeeInstallment.objects.create(studentsession=self.enrollment, expected_amount=3000, due_date=self.today)
+        response = self.client.post(
+            f'/Admin-Students/{self.student.id}/mark-installment-paid/', {'amount': 1000},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        data = response.json()
+        self.assertTrue(data['partial'], data)
+        self.assertIn('Partial payment', data['message'])
+        self.assertEqual((data['paid_installments'], data['installments_due']), (0, 1))
+        self.assertEqual(Payments.objects.get().amount, 1000)
+
+    def test_student_view_payment_settles_installments(self):
+        for i in range(3):
+            FeeInstallment.objects.create(
+                studentsession=self.enrollment, expected_amount=3000, due_date=self.today + timedelta(days=30 * i),
+            )
+        self.client.post(
+            f'/Admin-Students/{self.student.id}/', {'update_payment': '1', 'paid_amount': 6000, 'discount': 0},
+        )
+        self.assertEqual(Payments.objects.get().amount, 6000)
+        self.assertEqual(
+            list(FeeInstallment.objects.order_by('due_date').values_list('status', flat=True)),
+            ['Paid', 'Paid', 'Unpaid'],
+        )
+
+    def test_partial_payments_add_up_to_settle_installments(self):
+        for i in range(3):
+            FeeInstallment.objects.create(
+                studentsession=self.enrollment, expected_amount=3000, due_date=self.today + timedelta(days=30 * i),
+            )
+        due_date = (self.today + timedelta(days=30)).isoformat()
+
+        def pay(amount):
+            response = self.client.post(
+                f'/add_fee_payment/{self.enrollment.id}/', {'amount': amount, 'due_date': due_date},
+            )
+            self.assertTrue(response.json()['success'], response.json())
+            return list(FeeInstallment.objects.order_by('due_date').values_list('status', flat=True))
+
+        self.assertEqual(pay(2000), ['Unpaid', 'Unpaid', 'Unpaid'])
+        self.assertEqual(pay(1000), ['Paid', 'Unpaid', 'Unpaid'])
+        # One payment covering two installments settles both, linked to the first
+        self.assertEqual(pay(6000), ['Paid', 'Paid', 'Paid'])
+        second, third = FeeInstallment.objects.order_by('due_date')[1:]
+        self.assertEqual((second.payment.amount, third.payment), (6000, None))
+
+    def test_renewal_follows_latest_payment_or_installment(self):
+        registered = self.subscription.registration_date
+        self.assertEqual(FeeInstallment.next_renewal_due(self.subscription), registered + relativedelta(months=1))
+
+        FeeInstallment.objects.create(
+            studentsession=self.subscription, kind='renewal', expected_amount=3000,
+            due_date=registered + relativedelta(months=1),
+        )
+        self.assertEqual(FeeInstallment.next_renewal_due(self.subscription), registered + relativedelta(months=2))
+
+        paid_on = registered + relativedelta(months=2, days=5)
+        Payments.objects.create(studentsession=self.subscription, user=self.user, amount=3000, date=paid_on)
+        self.assertEqual(FeeInstallment.next_renewal_due(self.subscription), paid_on + relativedelta(months=1))
+
+    def test_notification_view_schedules_renewal_once(self):
+        self.client.get('/Admin-Notification/')
+        self.client.get('/Admin-Notification/')
+        renewals = FeeInstallment.objects.filter(studentsession=self.subscription, kind='renewal')
+        self.assertEqual(renewals.count(), 1)
+        self.assertEqual(renewals.get().expected_amount, 3000)
+
+        response = self.client.get('/Admin-Notification/')
+        due = response.context['due_fee_sessions']
+        self.assertEqual([(d.student, d.balance) for d in due], [(self.subscriber, 3000)])
+
+
+class DueStatusTests(AdminTestCase):
+    """next_due_date/overdue_since/outstanding_amount follow payment and schedule writes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course = Sessions.objects.create(session_name='Physics', registration_fee=0, fee=9000)
+        cls.today = date.today()
+
+    def refreshed(self, enrollment):
+        return StudentSession.objects.get(pk=enrollment.pk)
+
+    def test_payments_and_installments_move_due_status(self):
+        student = Student.objects.create(student_name='Ali')
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollment = StudentSession.objects.create(
+                student=student, session=self.course, fee=9000, due_date=self.today + timedelta(days=60),
+            )
+            first = FeeInstallment.objects.create(
+                studentsession=enrollment, expected_amount=3000, due_date=self.today - timedelta(days=10),
+            )
+            FeeInstallment.objects.create(
+                studentsession=enrollment, expected_amount=3000, due_date=self.today + timedelta(days=20),
+            )
+        enrollment = self.refreshed(enrollment)
+        self.assertEqual(enrollment.outstanding_amount, 9000)
+        self.assertEqual(enrollment.next_due_date, self.today - timedelta(days=10))
+        self.assertEqual(enrollment.overdue_since, self.today - timedelta(days=10))
+        self.assertEqual(StudentSession.objects.overdue_totals(), {'students': 1, 'amount': 9000})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            payment = Payments.objects.create(studentsession=enrollment, user=self.user, amount=3000, date=self.today)
+            first.mark_paid(payment)
+        enrollment = self.refreshed(enrollment)
+        self.assertEqual(enrollment.outstanding_amount, 6000)
+        self.assertEqual((enrollment.next_due_date, enrollment.overdue_since), (self.today + timedelta(days=20), None))
+        self.assertFalse(StudentSession.objects.overdue().exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Payments.objects.create(studentsession=enrollment, user=self.user, amount=6000, date=self.today)
+        enrollment = self.refreshed(enrollment)
+        self.assertEqual((enrollment.outstanding_amount, enrollment.next_due_date), (0, None))
+
+    def test_nightly_refresh_follows_the_calendar(self):
+        student = Student.objects.create(student_name='Sara')
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollment = StudentSession.objects.create(
+                student=student, session=self.course, fee=9000, due_date=self.today,
+            )
+        self.assertIsNone(self.refreshed(enrollment).overdue_since)
+
+        tomorrow = self.today + timedelta(days=1)
+        self.assertEqual(StudentSession.objects.refresh_overdue_since(tomorrow), (1, 0))
+        self.assertEqual(self.refreshed(enrollment).overdue_since, self.today)
+        self.assertEqual(StudentSession.objects.overdue_totals(tomorrow), {'students': 1, 'amount': 9000})
+
+        self.assertEqual(StudentSession.objects.refresh_overdue_since(self.today), (0, 1))
+        self.assertIsNone(self.refreshed(enrollment).overdue_since)
+
+    def test_rebuild_recomputes_stale_enrollments_in_bounded_queries(self):
+        enrollments = []
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(5):
+                student = Student.objects.create(student_name=f'Student {i}')
+                enrollments.append(StudentSession.objects.create(
+                    student=student, session=self.course, fee=9000, due_date=self.today - timedelta(days=i + 1),
+                ))
+        StudentSession.objects.update(next_due_date=None, overdue_since=None, outstanding_amount=0)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(StudentSession.objects.refresh_due_status(), 5)
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(StudentSession.objects.overdue_totals(), {'students': 5, 'amount': 45000})
+
+        call_command('refresh_due_status', '--rebuild', stdout=io.StringIO())
+        self.assertEqual(self.refreshed(enrollments[0]).overdue_since, self.today - timedelta(days=1))
+
+
+class PaymentDashboardQueryTests(AdminTestCase):
+    """The Payments page metrics cost the same number of queries at any institute size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.sessions = [
+            Sessions.objects.create(session_name='Physics', registration_fee=500, fee=9000),
+            Sessions.objects.create(session_name='English', registration_fee=0, fee=3000, session_type='monthly'),
+        ]
+
+    def add_students(self, count):
+        today = date.today()
+        start = Student.objects.count()
+        students = Student.objects.bulk_create(
+            [Student(student_name=f'Student {start + i}') for i in range(count)], batch_size=1000,
+        )
+        enrollments = StudentSession.objects.bulk_create(
+            [
+                StudentSession(
+                    student=student, session=self.sessions[i % 2], fee=self.sessions[i % 2].fee,
+                    registration_date=today, due_date=today - timedelta(days=i % 5),
+                )
+                for i, student in enumerate(students)
+            ],
+            batch_size=1000,
+        )
+        Payments.objects.bulk_create(
+            [
+                Payments(studentsession=enrollment, user=self.user, amount=1000 * (i % 4), date=today)
+                for i, enrollment in enumerate(enrollments)
+            ],
+            batch_size=1000,
+        )
+        DailyRevenue.rebuild()
+
+    def test_query_count_is_fixed(self):
+        for total in (10, 1000, 10000):
+            self.add_students(total - Student.objects.count())
+            with self.subTest(students=total):
+                with self.assertNumQueries(7):
+                    context = PaymentDashboardService().build()
+                self.assertEqual(context['total_students'], total)
+                self.assertEqual(
+                    context['students_paid'] + context['students_partial'] + context['students_unpaid'], total,
+                )
+
+    def test_revenue_figures_are_aggregated_in_sql(self):
+        self.add_students(20)
+        today = date.today()
+        for days_ago, amount in [(3, 700), (20, 1100), (400, 1300)]:
+            Payments.objects.create(
+                studentsession=StudentSession.objects.first(), user=self.user, amount=amount,
+                date=today - timedelta(days=days_ago),
+            )
+        DailyRevenue.rebuild()
+
+        with CaptureQueriesContext(connection) as queries:
+            context = PaymentDashboardService(today).build()
+        self.assertFalse(any('SELECT "Admin_dailyrevenue"."id"' in q['sql'] for q in queries.captured_queries))
+
+        payments = list(Payments.objects.values_list('amount', 'date'))
+        self.assertEqual(context['total_revenue'], sum(a for a, _ in payments))
+        self.assertEqual(context['total_payments_count'], len(payments))
+        self.assertEqual(context['daily_revenue'], sum(a for a, d in payments if d == today))
+        self.assertEqual(context['weekly_revenue'], sum(a for a, d in payments if d >= today - timedelta(days=7)))
+        self.assertEqual(
+            context['monthly_revenue'], sum(a for a, d in payments if (d.year, d.month) == (today.year, today.month)),
+        )
+        self.assertEqual(context['yearly_revenue'], sum(a for a, d in payments if d.year == today.year))
+
+    def test_payment_page_renders(self):
+        cache.clear()
+        self.add_students(10)
+        self.log_in()
+        response = self.client.get('/Admin-Payments/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_students'], 10)
+
+
+class FinanceCacheTests(LoggedInTestCase):
+    """Dashboard metrics are served from the cache until a finance write commits"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course = Sessions.objects.create(session_name='Physics', registration_fee=0, fee=9000)
+        cls.student = Student.objects.create(student_name='Ali')
+        cls.enrollment = StudentSession.objects.create(student=cls.student, session=cls.course, fee=9000)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def visit(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/Admin-Payments/')
+        return response.context, queries
+
+    def test_repeat_visit_is_served_from_cache(self):
+        first, first_queries = self.visit()
+        second, second_queries = self.visit()
+        self.assertEqual(second['total_pending'], first['total_pending'])
+        self.assertEqual(len(first_queries) - len(second_queries), 7)
+
+    def test_writes_invalidate_cached_metrics(self):
+        self.assertEqual(self.visit()[0]['total_pending'], 9000)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Payments.objects.create(studentsession=self.enrollment, user=self.user, amount=4000, date=date.today())
+        context = self.visit()[0]
+        self.assertEqual((context['total_pending'], context['total_revenue']), (5000, 4000))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student.status = 'Inactive'
+            self.student.save()
+        self.assertEqual(self.visit()[0]['total_students'], 0)
+
+
+class StudentFeesTableTests(LoggedInTestCase):
+    """Server-side DataTables endpoint of the student fee table"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        course = Sessions.objects.create(session_name='Physics', registration_fee=0, fee=10000)
+        for i, paid in enumerate([0, 2500, 10000, 7000, 4000]):
+            student = Student.objects.create(student_name=f'Student {i}', rollno=f'PHY-{i:03d}')
+            enrollment = StudentSession.objects.create(student=student, session=course, fee=10000)
+            if paid:
+                Payments.objects.create(studentsession=enrollment, user=cls.user, amount=paid, date=date.today())
+        Student.objects.create(student_name='Student gone', status='Inactive')
+
+    def fetch(self, **params):
+        params = {'draw': 3, 'start': 0, 'length': 2, 'order[0][column]': 5, 'order[0][dir]': 'desc', **params}
+        return self.client.get('/payments/student-fees/', params).json()
+
+    def test_pages_ordered_by_balance(self):
+        data = self.fetch()
+        self.assertEqual((data['draw'], data['recordsTotal'], data['recordsFiltered']), (3, 5, 5))
+        self.assertEqual([row['remaining'] for row in data['data']], [10000, 7500])
+        self.assertEqual(data['data'][0]['sessions'], ['Physics'])
+
+        data = self.fetch(start=4)
+        self.assertEqual([(row['remaining'], row['status']) for row in data['data']], [(0, 'Paid')])
+
+    def test_search_by_rollno_name_or_status(self):
+        data = self.fetch(**{'search[value]': 'phy-003'})
+        self.assertEqual([row['student_name'] for row in data['data']], ['Student 3'])
+        self.assertEqual(data['recordsFiltered'], 1)
+
+        data = self.fetch(length=-1, **{'search[value]': 'Partial', 'order[0][column]': 1, 'order[0][dir]': 'asc'})
+        self.assertEqual([row['student_name'] for row in data['data']], ['Student 1', 'Student 3', 'Student 4'])
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        # session + SessionStatusMiddleware, two counts, the page and its enrollments
+        with self.assertNumQueries(6):
+            self.fetch(length=-1, **{'search[value]': 'Student'})
+
+    def test_export_writes_every_student_not_just_the_page(self):
+        cache.clear()
+        response = self.client.get('/payments/student-fees/export-csv/', {
+            'period': 'Last 30 Days', 'search[value]': 'Student', 'order[0][column]': 5, 'order[0][dir]': 'desc',
+        })
+        self.assertTrue(response.streaming)
+        self.assertIn('last_30_days', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        header = rows.index(['Roll No', 'Student Name', 'Mobile', 'Sessions', 'Total Fee', 'Paid Amount', 'Remaining', 'Status'])
+        students = rows[header + 1:rows.index([], header)]
+        self.assertEqual([row[6] for row in students], ['10000', '7500', '6000', '3000', '0'])
+        self.assertEqual(students[0][3], 'Physics')
+        self.assertIn(['Total Students:', '5'], rows)
+
+
+class PaymentsExportTests(LoggedInTestCase):
+    """The ledger export streams every payment in the filter_payments date range"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        course = Sessions.objects.create(session_name='Physics', registration_fee=0, fee=10000)
+        student = Student.objects.create(student_name='Ali, Khan', rollno='PHY-001')
+        enrollment = StudentSession.objects.create(student=student, session=course, fee=10000)
+        cls.today = date.today()
+        for days_ago, amount in [(0, 1000), (3, 2000), (40, 3000)]:
+            Payments.objects.create(
+                studentsession=enrollment, user=cls.user, amount=amount, date=cls.today - timedelta(days=days_ago),
+            )
+
+    def export(self, **params):
+        response = self.client.get('/payments/export-csv/', params)
+        self.assertTrue(response.streaming)
+        return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_streams_all_rows(self):
+        header, *rows = self.export()
+        self.assertEqual(header[:3], ['Payment ID', 'Date', 'Amount'])
+        self.assertEqual([row[2] for row in rows], ['3000', '2000', '1000'])
+        self.assertEqual(rows[0][4], 'Ali, Khan')
+        self.assertEqual(rows[0][6:], ['Physics', 'Admin', 'User'])
+
+    def test_uses_filter_payments_date_semantics(self):
+        _, *rows = self.export(type='days', value='7')
+        self.assertEqual([row[2] for row in rows], ['2000', '1000'])
+        _, *rows = self.export(type='today')
+        self.assertEqual([row[2] for row in rows], ['1000'])
+        start = (self.today - timedelta(days=50)).isoformat()
+        end = (self.today - timedelta(days=2)).isoformat()
+        _, *rows = self.export(type='custom', fromDate=start, toDate=end)
+        self.assertEqual([row[2] for row in rows], ['3000', '2000'])
+
+    def test_rejects_malformed_filter(self):
+        response = self.client.get('/payments/export-csv/', {'type': 'custom', 'fromDate': 'x', 'toDate': 'y'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SessionLeaderboardTests(AdminTestCase):
+    """session_leaderboard() groups by session id in a single query"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.today = date.today()
+        # Two sessions sharing a name must not be merged
+        cls.morning = Sessions.objects.create(session_name='Physics', registration_fee=0, fee=10000)
+        cls.evening = Sessions.objects.create(session_name='Physics', registration_fee=0, fee=8000)
+        Sessions.objects.create(session_name='Idle', registration_fee=0, fee=5000)
+        with cls.captureOnCommitCallbacks(execute=True):
+            for i, (session, amount, days_ago) in enumerate([
+                (cls.morning, 6000, 0), (cls.morning, 4000, 0), (cls.evening, 8000, 20),
+            ]):
+                student = Student.objects.create(student_name=f'Student {i}')
+                enrollment = StudentSession.objects.create(
+                    student=student, session=session, fee=session.fee, discount=1000 if i == 0 else None,
+                )
+                Payments.objects.create(
+                    studentsession=enrollment, user=cls.user, amount=amount, date=cls.today - timedelta(days=days_ago),
+                )
+
+    def test_per_session_rows(self):
+        with self.assertNumQueries(1):
+            rows = session_leaderboard()
+        self.assertEqual(
+            [(row['id'], row['revenue'], row['students'], row['avg_per_student'], row['collection_rate']) for row in rows],
+            [(self.morning.id, 10000, 2, 5000, 52.6), (self.evening.id, 8000, 1, 8000, 100.0)],
+        )
+
+    def test_date_range(self):
+        rows = session_leaderboard(self.today - timedelta(days=7), self.today)
+        self.assertEqual([row['id'] for row in rows], [self.morning.id])
+
+    def test_payments_page_charts_each_session(self):
+        cache.clear()
+        self.log_in()
+        response = self.client.get('/Admin-Payments/')
+        self.assertNotIn('session_revenue', response.context)
+        self.assertContains(response, "labels: ['Physics', 'Physics'],")
+        self.assertContains(response, 'data: [10000, 8000],')
+
+
+class CollectorAnalyticsTests(AdminTestCase):
+    """Collector figures are grouped by user id, not by display name"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.today = date.today()
+        # Two staff members with the same name
+        cls.first = User.objects.create(first_name='Sana', last_name='Ali', email='sana1@example.com', password='x', usertype=1)
+        cls.second = User.objects.create(first_name='Sana', last_name='Ali', email='sana2@example.com', password='x', usertype=1)
+        course = Sessions.objects.create(session_name='Physics', registration_fee=0, fee=50000)
+        student = Student.objects.create(student_name='Ali')
+        with cls.captureOnCommitCallbacks(execute=True):
+            enrollment = StudentSession.objects.create(student=student, session=course, fee=50000)
+            for user, amount, days_ago in [
+                (cls.first, 3000, 0), (cls.first, 1000, 0), (cls.first, 2000, 1), (cls.second, 9000, 40),
+            ]:
+                Payments.objects.create(
+                    studentsession=enrollment, user=user, amount=amount, date=cls.today - timedelta(days=days_ago),
+                )
+
+    def test_groups_by_collector_id(self):
+        with self.assertNumQueries(2):
+            collectors = collector_analytics()
+        self.assertEqual(
+            [(c['id'], c['name'], c['total'], c['payments'], c['avg_ticket']) for c in collectors],
+            [(self.second.id, 'Sana Ali', 9000, 1, 9000), (self.first.id, 'Sana Ali', 6000, 3, 2000)],
+        )
+        self.assertEqual(collectors[1]['series'], [
+            {'day': (self.today - timedelta(days=1)).isoformat(), 'amount': 2000},
+            {'day': self.today.isoformat(), 'amount': 4000},
+        ])
+
+    def test_endpoint_uses_payment_filter(self):
+        self.log_in(self.first)
+        data = self.client.get('/payments/collector-analytics/', {'type': 'days', 'value': 30}).json()['data']
+        self.assertEqual(data['filter_description'], 'Last 30 Days')
+        self.assertEqual([c['id'] for c in data['collectors']], [self.first.id])
+
+
+class ReceivablesAgingTests(AdminTestCase):
+    """Outstanding balances are bucketed by days past the next due date"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.today = date.today()
+        cls.physics = Sessions.objects.create(session_name='Physics', registration_fee=0, fee=10000)
+        cls.english = Sessions.objects.create(session_name='English', registration_fee=0, fee=4000)
+        with cls.captureOnCommitCallbacks(execute=True):
+            for i, (session, days_overdue, paid) in enumerate([
+                (cls.physics, None, 0), (cls.physics, -5, 2000), (cls.physics, 15, 0),
+                (cls.physics, 45, 5000), (cls.english, 75, 0), (cls.english, 200, 1000), (cls.english, 10, 4000),
+            ]):
+                student = Student.objects.create(student_name=f'Student {i}')
+                due_date = cls.today - timedelta(days=days_overdue) if days_overdue is not None else None
+                enrollment = StudentSession.objects.create(
+                    student=student, session=session, fee=session.fee, due_date=due_date,
+                )
+                if paid:
+                    Payments.objects.create(studentsession=enrollment, user=cls.user, amount=paid, date=cls.today)
+
+    def test_buckets_per_session_and_total(self):
+        with self.assertNumQueries(1):
+            aging = receivables_aging(self.today)
+        keys = [bucket['key'] for bucket in aging['buckets']]
+        rows = [(row['id'], [row[key] for key in keys], row['total']) for row in aging['sessions']]
+        self.assertEqual(rows, [
+            (self.physics.id, [18000, 10000, 5000, 0, 0], 33000),
+            (self.english.id, [0, 0, 0, 4000, 3000], 7000),
+        ])
+        self.assertEqual([aging['totals'][key] for key in keys] + [aging['totals']['total']], [18000, 10000, 5000, 4000, 3000, 40000])
+
+    def test_word_report_has_aging_section(self):
+        self.log_in()
+        response = self.client.post(
+            '/payments/export-word/', json.dumps({'filter': {'type': 'all'}}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        document = Document(io.BytesIO(response.content))
+        self.assertIn('Receivables Aging', [p.text for p in document.paragraphs])
+
+
+class FilterPaymentsConditionalTests(LoggedInTestCase):
+    """GET filter_payments is cached per filter and answers revalidation with 304"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        course = Sessions.objects.create(session_name='Physics', registration_fee=0, fee=10000)
+        student = Student.objects.create(student_name='Ali')
+        cls.enrollment = StudentSession.objects.create(student=student, session=course, fee=10000)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def get(self, **headers):
+        return self.client.get('/payments/filter/', {'type': 'days', 'value': 7}, **headers)
+
+    def test_revalidation_costs_no_recomputation(self):
+        response = self.get()
+        self.assertEqual(response.json()['data']['filter_description'], 'Last 7 Days')
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag = response['ETag']
+
+        # Only the session and SessionStatusMiddleware queries remain
+        with self.assertNumQueries(2):
+            response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        other = self.client.get('/payments/filter/', {'type': 'today'})
+        self.assertNotEqual(other['ETag'], etag)
+
+    def test_payment_write_changes_the_etag(self):
+        etag = self.get()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Payments.objects.create(studentsession=self.enrollment, user=self.user, amount=2500, date=date.today())
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['total_revenue'], 2500)
+
+    def test_post_is_still_accepted(self):
+        response = self.client.post('/payments/filter/', json.dumps({'type': 'today'}), content_type='application/json')
+        self.assertEqual(response.json()['data']['filter_description'], 'Today')
+
+
+class HotQueryIndexTests(AdminTestCase):
+    """The dashboard/attendance/notification lookups must be served by the composite indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course = Sessions.objects.create(session_name='Physics', registration_fee=500, fee=9000)
+        cls.today = date.today()
+        cls.student = Student.objects.create(student_name='Ali')
+        cls.enrollment = StudentSession.objects.create(student=cls.student, session=cls.course, fee=9000)
+        Payments.objects.create(studentsession=cls.enrollment, user=cls.user, amount=3000, date=cls.today)
+        Attendance.objects.create(course=cls.course, student=cls.student, date=cls.today, status='Present')
+        Notification.objects.create(user=cls.user, category='General', content='Hello')
+
+    def index_name(self, model, fields):
+        return next(index.name for index in model._meta.indexes if index.fields == fields)
+
+    def chosen_keys(self, plan):
+        """The "key" (index the optimizer picked) of every table in a MySQL JSON plan"""
+        if isinstance(plan, dict):
+            keys = [plan['key']] if isinstance(plan.get('key'), str) else []
+            return keys + [key for value in plan.values() for key in self.chosen_keys(value)]
+        if isinstance(plan, list):
+            return [key for value in plan for key in self.chosen_keys(value)]
+        return []
+
+    def assertUsesIndex(self, queryset, model, fields):
+        name = self.index_name(model, fields)
+        if connection.vendor == 'sqlite':
+            # "SEARCH ... USING INDEX <name>" only names the index the plan uses
+            self.assertIn(name, queryset.explain())
+        elif connection.vendor == 'mysql':
+            # possible_keys only proves the index exists; key is the one chosen
+            self.assertIn(name, self.chosen_keys(json.loads(queryset.explain(format='json'))))
+        else:
+            self.skipTest(f'No plan expectations for {connection.vendor}')
+
+    def test_hot_queries_use_indexes(self):
+        cases = [
+            (Payments.objects.filter(studentsession=self.enrollment, amount__gt=0, date__lte=self.today),
+             Payments, ['studentsession', 'amount', 'date']),
+            (Payments.objects.filter(date__range=[self.today - timedelta(days=30), self.today]),
+             Payments, ['date']),
+            (Attendance.objects.filter(course=self.course, date__range=[self.today, self.today]),
+             Attendance, ['course', 'date', 'student']),
+            (StudentSession.objects.filter(student=self.student, status='Active'),
+             StudentSession, ['student', 'status']),
+            (StudentSession.objects.filter(session=self.course, status='Active'),
+             StudentSession, ['session', 'status']),
+            (Notification.objects.filter(date__gte=timezone.now() - timedelta(days=7)), Notification, ['date']),
+            (Student.objects.filter(status='Active'), Student, ['status']),
+        ]
+        if connection.vendor != 'sqlite':
+            # Django renders is_read=False as "NOT is_read", which SQLite cannot match to an index
+            cases.append((Notification.objects.filter(is_read=False), Notification, ['is_read']))
+        for queryset, model, fields in cases:
+            with self.subTest(model=model.__name__, fields=fields):
+                self.assertUsesIndex(queryset, model, fields)
+
+    def test_attendance_is_unique_per_day(self):
+        with self.assertRaises(IntegrityError):
+            Attendance.objects.create(course=self.course, student=self.student, date=self.today, status='Absent')
+
+
+class ReportJobTests(LoggedInTestCase):
+    """Word exports are queued, rendered by the worker and reused while the data is unchanged"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        session = Sessions.objects.create(session_name='Physics', registration_fee=0, fee=10000)
+        student = Student.objects.create(student_name='Ali')
+        enrollment = StudentSession.objects.create(student=student, session=session, fee=10000)
+        Payments.objects.create(studentsession=enrollment, user=cls.user, amount=4000, date=date.today())
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def enqueue(self, filter_data):
+        response = self.client.post(
+            '/payments/reports/', json.dumps({'kind': 'revenue_word', 'filter': filter_data}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()['job']
+
+    def test_enqueue_render_poll_download(self):
+        job = self.enqueue({'type': 'all'})
+        self.assertEqual(job['status'], 'Queued')
+        self.assertIsNone(job['download_url'])
+
+        call_command('run_report_jobs', '--once', stdout=io.StringIO())
+
+        job = self.client.get(f"/payments/reports/{job['id']}/").json()['job']
+        self.assertEqual(job['status'], 'Done')
+        # The file is kept in the database, not on the worker's disk
+        with override_settings(MEDIA_ROOT='/nonexistent'):
+            response = self.client.get(job['download_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment; filename="Revenue_Report_', response['Content-Disposition'])
+        document = Document(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIn('Revenue Report', [p.text for p in document.paragraphs])
+
+    def test_identical_request_reuses_job_until_data_changes(self):
+        first = self.enqueue({'type': 'all'})
+        self.assertEqual(self.enqueue({'type': 'all'})['id'], first['id'])
+        self.assertNotEqual(self.enqueue({'type': 'days', 'value': 7})['id'], first['id'])
+
+        call_command('run_report_jobs', '--once', stdout=io.StringIO())
+        again = self.enqueue({'type': 'all'})
+        self.assertEqual((again['id'], again['status']), (first['id'], 'Done'))
+
+        bump_finance_version()
+        self.assertNotEqual(self.enqueue({'type': 'all'})['id'], first['id'])
+
+    def test_failed_job_records_error_and_is_not_reused(self):
+        job = enqueue_report('revenue_word', {'type': 'custom', 'fromDate': 'not-a-date', 'toDate': '2024-01-01'})
+        call_command('run_report_jobs', '--once', stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'Failed')
+        self.assertTrue(job.error)
+        self.assertEqual(self.client.get(f'/payments/reports/{job.id}/download/').status_code, 404)
+        self.assertNotEqual(enqueue_report('revenue_word', job.params).id, job.id)
+
+    def test_only_admins_and_the_requester_see_a_job(self):
+        requester = User.objects.create(first_name='Front', last_name='Desk', email='desk@example.com', password='x', usertype=2)
+        other = User.objects.create(first_name='Other', last_name='Desk', email='other@example.com', password='x', usertype=2)
+        job = enqueue_report('revenue_word', {'type': 'all'}, requester)
+        call_command('run_report_jobs', '--once', stdout=io.StringIO())
+
+        def fetch(user):
+            self.log_in(user)
+            return (
+                self.client.get(f'/payments/reports/{job.id}/').status_code,
+                self.client.get(f'/payments/reports/{job.id}/download/').status_code,
+            )
+
+        self.assertEqual(fetch(other), (404, 404))
+        self.assertEqual(fetch(requester), (200, 200))
+        self.assertEqual(fetch(self.user), (200, 200))
+        # Another user asking for the same report gets a job of their own
+        self.assertNotEqual(enqueue_report('revenue_word', {'type': 'all'}, other).id, job.id)
+
+    def test_worker_deletes_expired_jobs(self):
+        kept = enqueue_report('revenue_word', {'type': 'all'})
+        expired = enqueue_report('revenue_word', {'type': 'days', 'value': 7})
+        call_command('run_report_jobs', '--once', stdout=io.StringIO())
+        ReportJob.objects.filter(pk=expired.pk).update(
+            finished_at=timezone.now() - REPORT_RETENTION - timedelta(minutes=1),
+        )
+
+        call_command('run_report_jobs', '--once', stdout=io.StringIO())
+        self.assertEqual(list(ReportJob.objects.values_list('id', flat=True)), [kept.id])
+
+    def test_requires_login(self):
+        self.client.session.flush()
+        self.client.cookies.clear()
+        response = self.client.post('/payments/reports/', '{}', content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(ReportJob.objects.exists())
+
+
+class RevenueMetricsRegistryTests(AdminTestCase):
+    """The declared KPIs match the FeeSnapshot/DailyRevenue figures they replaced, one query per source"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.today = date.today()
+        course = Sessions.objects.create(session_name='Physics', registration_fee=500, fee=10000)
+        free = Sessions.objects.create(session_name='Open Day', registration_fee=0, fee=0)
+        with cls.captureOnCommitCallbacks(execute=True):
+            for i, (session, paid, days_ago, overdue) in enumerate([
+                (course, 0, 0, True), (course, 4000, 0, True), (course, 10500, 3, False),
+                (course, 2500, 40, False), (free, 0, 0, False),
+            ]):
+                student = Student.objects.create(student_name=f'Student {i}')
+                enrollment = StudentSession.objects.create(
+                    student=student, session=session, fee=session.fee, discount=100 if i == 1 else 0,
+                    due_date=cls.today - timedelta(days=5) if overdue else cls.today + timedelta(days=5),
+                )
+                if paid:
+                    Payments.objects.create(
+                        studentsession=enrollment, user=cls.user, amount=paid, date=cls.today - timedelta(days=days_ago),
+                    )
+            inactive = Student.objects.create(student_name='Left', status='Inactive')
+            StudentSession.objects.create(student=inactive, session=course, fee=course.fee)
+
+    def reference(self, start_date):
+        """The figures as _calculate_revenue_metrics computed them before the registry"""
+        fees = FeeSnapshot.build()
+        rows = [row for row in DailyRevenue.objects.all() if not start_date or row.day >= start_date]
+        revenue = sum(row.amount for row in rows)
+        count = sum(row.payment_count for row in rows)
+        month = sum(row.amount for row in rows if row.day.month == self.today.month and row.day.year == self.today.year)
+        balances = list(zip(fees.remaining_balance, fees.total_fee))
+        return {
+            'total_revenue': revenue,
+            'total_pending': fees.total_pending,
+            'collection_rate': round(revenue / fees.total_expected_revenue * 100, 1),
+            'avg_payment': revenue / count if count else 0,
+            'daily_revenue': sum(row.amount for row in rows if row.day == self.today),
+            'active_students_count': len(fees),
+            'overdue_students_count': 2,
+            'projected_monthly_revenue': month + month / self.today.day * (30 - self.today.day),
+            'students_paid': sum(1 for balance, fee in balances if balance == 0),
+            'students_partial': sum(1 for balance, fee in balances if 0 < balance < fee),
+            'students_unpaid': sum(1 for balance, fee in balances if balance == fee),
+        }
+
+    def test_matches_previous_figures(self):
+        for start_date in [None, self.today - timedelta(days=30)]:
+            with self.subTest(start_date=start_date):
+                values = compute_metrics(list(self.reference(start_date)), start_date, self.today, self.today)
+                self.assertEqual(values, self.reference(start_date))
+
+    def test_one_query_per_source(self):
+        names = list(self.reference(None))
+        with self.assertNumQueries(3):
+            compute_metrics(names, None, self.today, self.today)
+        # Another KPI over a source already in use rides along in the same query
+        with self.assertNumQueries(3):
+            values = compute_metrics(names + ['overdue_amount'], None, self.today, self.today)
+        self.assertEqual(values['overdue_amount'], 10500 + 10400 - 4000)
+
+
+class RejectingBackend(locmem.EmailBackend):
+    """locmem backend that counts opened connections and refuses one address"""
+    opened = 0
+
+    def open(self):
+        RejectingBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if 'bounce@example.com' in message.to:
+                raise ConnectionError('Recipient refused')
+        return super().send_messages(messages)
+
+
+class OutboxTests(LoggedInTestCase):
+    """Reminder endpoints only queue mail; send_outbox delivers it in batches and retries failures"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        session = Sessions.objects.create(session_name='Physics', registration_fee=0, fee=10000)
+        cls.student = Student.objects.create(student_name='Ali', email='ali@example.com')
+        enrollment = StudentSession.objects.create(student=cls.student, session=session, fee=10000)
+        FeeInstallment.objects.create(
+            studentsession=enrollment, due_date=date.today() - timedelta(days=3), expected_amount=2500,
+        )
+
+    def setUp(self):
+        super().setUp()
+        RejectingBackend.opened = 0
+
+    def test_reminder_is_queued_then_sent_by_worker(self):
+        response = self.client.post(
+            '/send-fee-reminder/', json.dumps({'student_id': self.student.id}), content_type='application/json',
+        )
+        self.assertEqual(response.json()['status'], 'success')
+        self.assertEqual(len(mail.outbox), 0)
+        queued = OutboxEmail.objects.get()
+        self.assertEqual((queued.status, queued.recipients), ('Queued', ['ali@example.com']))
+
+        call_command('send_outbox', '--once', stdout=io.StringIO())
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'Sent')
+        self.assertEqual(mail.outbox[0].to, ['ali@example.com'])
+        self.assertIn('Rs. 2,500', mail.outbox[0].body)
+
+    def test_bulk_reminders_are_queued(self):
+        response = self.client.post('/notify-late-fee-students/')
+        self.assertEqual(response.json()['details']['emails_queued'], 1)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxEmail.objects.filter(status='Queued').count(), 1)
+
+    @override_settings(EMAIL_BACKEND='Admin.tests.RejectingBackend')
+    def test_batch_reuses_connection_and_backs_off_failures(self):
+        for address in ['a@example.com', 'bounce@example.com', 'b@example.com']:
+            enqueue_email('Notice', 'Hello', [address])
+
+        sent, failed = deliver_batch(claim_batch())
+        self.assertEqual((sent, failed), (2, 1))
+        # One connection for the batch, reopened once after the failure
+        self.assertEqual(RejectingBackend.opened, 2)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['a@example.com', 'b@example.com'])
+
+        bounced = OutboxEmail.objects.get(recipients=['bounce@example.com'])
+        self.assertEqual((bounced.status, bounced.attempts, bounced.last_error), ('Queued', 1, 'Recipient refused'))
+        self.assertGreater(bounced.next_attempt_at, timezone.now())
+        self.assertEqual(claim_batch(), [])
+
+        for _ in range(OUTBOX_MAX_ATTEMPTS - 1):
+            OutboxEmail.objects.filter(pk=bounced.pk).update(next_attempt_at=timezone.now())
+            deliver_batch(claim_batch())
+        bounced.refresh_from_db()
+        self.assertEqual((bounced.status, bounced.attempts), ('Failed', OUTBOX_MAX_ATTEMPTS))
+
+
+class StandInSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: accepts every message except to bounce@ addresses"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 localhost stand-in')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 localhost')
+            elif command.startswith('RCPT') and 'BOUNCE@' in command:
+                self.reply('550 No such user')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with server.lock:
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                time.sleep(server.latency)
+                with server.lock:
+                    server.in_flight -= 1
+                    server.messages += 1
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPDispatchPoolTests(TestCase):
+    """The pool sends over persistent per-thread connections to a local SMTP stand-in, under a global rate"""
+
+    def setUp(self):
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), StandInSMTPHandler)
+        server.daemon_threads = True
+        server.lock = threading.Lock()
+        server.connections = server.messages = server.in_flight = server.max_in_flight = 0
+        server.latency = 0.02
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+
+        smtp = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=server.server_address[1],
+            EMAIL_USE_TLS=False, EMAIL_USE_SSL=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+        )
+        smtp.enable()
+        self.addCleanup(smtp.disable)
+
+    def enqueue(self, count, prefix='student'):
+        for i in range(count):
+            enqueue_email('Fee Payment Reminder', 'Please pay', [f'{prefix}{i}@example.com'])
+
+    def test_threads_keep_their_connections_across_batches(self):
+        self.enqueue(12)
+        with SMTPDispatchPool(size=3, rate=0) as pool:
+            self.assertEqual(pool.deliver(claim_batch()), (12, 0))
+            self.enqueue(6, prefix='late')
+            self.assertEqual(pool.deliver(claim_batch()), (6, 0))
+        self.assertEqual(self.server.connections, 3)
+        self.assertEqual(self.server.messages, 18)
+        self.assertGreater(self.server.max_in_flight, 1)
+        self.assertEqual(OutboxEmail.objects.filter(status='Sent').count(), 18)
+
+    def test_rate_limit_is_shared_by_all_threads(self):
+        self.server.latency = 0
+        self.enqueue(10)
+        started = time.monotonic()
+        with SMTPDispatchPool(size=4, rate=20) as pool:
+            self.assertEqual(pool.deliver(claim_batch()), (10, 0))
+        # 10 sends 1/20 s apart, however many threads
+        self.assertGreaterEqual(time.monotonic() - started, 9 / 20)
+
+    def test_rate_limit_counts_every_bcc_recipient(self):
+        self.server.latency = 0
+        enqueue_broadcast('Notice', 'Body', [f'student{i}@example.com' for i in range(10)], chunk_size=5)
+        started = time.monotonic()
+        with SMTPDispatchPool(size=2, rate=20) as pool:
+            self.assertEqual(pool.deliver(claim_batch()), (2, 0))
+        # The second chunk waits for the five recipients of the first at 20 per second
+        self.assertGreaterEqual(time.monotonic() - started, 5 / 20)
+
+    def test_refused_recipient_fails_only_its_message(self):
+        self.enqueue(3)
+        enqueue_email('Fee Payment Reminder', 'Please pay', ['bounce@example.com'])
+        with SMTPDispatchPool(size=2, rate=0) as pool:
+            self.assertEqual(pool.deliver(claim_batch()), (3, 1))
+        # The session survives a refused recipient: no reconnect
+        self.assertEqual(self.server.connections, 2)
+        bounced = OutboxEmail.objects.get(status='Queued')
+        self.assertEqual((bounced.recipients, bounced.attempts), (['bounce@example.com'], 1))
+        self.assertIn('No such user', bounced.last_error)
+
+
+@override_settings(EMAIL_BACKEND='Admin.tests.RejectingBackend')
+class EmailLogTests(LoggedInTestCase):
+    """Email statistics and history come from the log and daily counters the outbox keeps"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.student = Student.objects.create(student_name='Ali', email='ali@example.com')
+
+    def test_log_follows_each_recipient(self):
+        reminder = enqueue_email('Reminder', 'Please pay', [self.student.email], kind='fee_reminder', student_id=self.student.id)
+        broadcast = enqueue_email('Holiday', 'Closed', ['a@example.com', 'bounce@example.com'], created_by=self.user, kind='broadcast')
+        self.assertEqual(EmailLog.objects.filter(status='Queued').count(), 3)
+        self.assertEqual(EmailLog.objects.get(outbox=reminder).student, self.student)
+
+        for _ in range(OUTBOX_MAX_ATTEMPTS):
+            OutboxEmail.objects.filter(status='Queued').update(next_attempt_at=timezone.now())
+            deliver_batch(claim_batch())
+
+        self.assertEqual(EmailLog.objects.get(outbox=reminder).status, 'Sent')
+        self.assertEqual(
+            sorted(EmailLog.objects.filter(outbox=broadcast).values_list('status', flat=True)), ['Failed', 'Failed'],
+        )
+        counters = {row.kind: (row.queued, row.sent, row.failed) for row in EmailDailyStats.objects.all()}
+        self.assertEqual(counters, {'fee_reminder': (1, 1, 0), 'broadcast': (2, 0, 2)})
+
+    def test_statistics_and_history_endpoints(self):
+        enqueue_email('Reminder', 'Please pay', [self.student.email], kind='fee_reminder', student_id=self.student.id)
+        deliver_batch(claim_batch())
+        enqueue_email('Holiday', 'Closed', ['a@example.com', 'b@example.com'], created_by=self.user, kind='broadcast')
+
+        stats = self.client.get('/get-email-statistics/').json()['data']
+        self.assertEqual(
+            (stats['total_emails_sent'], stats['emails_in_queue'], stats['delivery_success_rate']), (1, 2, 100.0),
+        )
+        self.assertEqual(stats['recent_activity']['last_30_days'], 1)
+
+        history = self.client.get('/get-email-history/').json()['data']
+        self.assertEqual(
+            [(row['subject'], row['recipients'], row['recipient_type'], row['status']) for row in history],
+            [('Holiday', '2', 'Mailing List', 'Pending'), ('Reminder', '1', 'Students', 'Delivered')],
+        )
+        self.assertEqual(history[0]['sent_by'], 'Admin User')
+
+
+class ReminderCandidateTests(AdminTestCase):
+    """Reminder recipients, their totals and per-session breakdown come from one grouped query"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.today = date.today()
+        physics = Sessions.objects.create(session_name='Physics', registration_fee=0, fee=10000)
+        english = Sessions.objects.create(session_name='English', registration_fee=0, fee=4000, session_type='monthly')
+        cls.ali = Student.objects.create(student_name='Ali', email='ali@example.com')
+        no_email = Student.objects.create(student_name='Sara', email='')
+        inactive = Student.objects.create(student_name='Omar', email='omar@example.com', status='Inactive')
+
+        def schedule(student, session, *installments, status='Active'):
+            enrollment = StudentSession.objects.create(student=student, session=session, fee=session.fee, status=status)
+            for days_from_today, amount, status in installments:
+                FeeInstallment.objects.create(
+                    studentsession=enrollment, due_date=cls.today + timedelta(days=days_from_today),
+                    expected_amount=amount, status=status,
+                )
+
+        schedule(cls.ali, physics, (-40, 2500, 'Unpaid'), (-10, 2500, 'Unpaid'), (20, 2500, 'Unpaid'), (-70, 2500, 'Paid'))
+        # Earlier enrollment, renewal still owed
+        schedule(cls.ali, english, (5, 4000, 'Unpaid'), status='Completed')
+        schedule(no_email, physics, (-3, 2500, 'Unpaid'))
+        schedule(inactive, physics, (-3, 2500, 'Unpaid'))
+
+    def test_one_query_per_student_breakdown(self):
+        with self.assertNumQueries(1):
+            candidates = reminder_candidates(today=self.today)
+        self.assertEqual(len(candidates), 1)
+        candidate = candidates[0]
+        self.assertEqual(
+            (candidate['student_id'], candidate['email'], candidate['pending'], candidate['overdue']),
+            (self.ali.id, 'ali@example.com', 11500, 5000),
+        )
+        self.assertEqual(
+            [(s['name'], s['pending'], s['overdue'], s['first_overdue'], s['next_due']) for s in candidate['sessions']],
+            [
+                ('English', 4000, 0, None, self.today + timedelta(days=5)),
+                ('Physics', 7500, 5000, self.today - timedelta(days=40), self.today + timedelta(days=20)),
+            ],
+        )
+        self.assertEqual(len(reminder_candidates(with_email=False, today=self.today)), 2)
+
+    def test_partial_payment_reduces_totals(self):
+        course = Sessions.objects.create(session_name='Chemistry', registration_fee=0, fee=10000)
+        student = Student.objects.create(student_name='Zara', email='zara@example.com')
+        enrollment = StudentSession.objects.create(student=student, session=course, fee=10000)
+        for days_from_today in (-10, 20):
+            FeeInstallment.objects.create(
+                studentsession=enrollment, due_date=self.today + timedelta(days=days_from_today), expected_amount=5000,
+            )
+        payment = Payments.objects.create(studentsession=enrollment, user=self.user, amount=3000, date=self.today)
+        self.assertEqual(FeeInstallment.settle(enrollment, payment), [])
+        StudentSession.objects.filter(pk=enrollment.pk).refresh_due_status(today=self.today)
+
+        candidate = reminder_candidates([student.id], today=self.today)[0]
+        self.assertEqual((candidate['pending'], candidate['overdue']), (7000, 2000))
+        self.assertEqual(candidate['pending'], StudentSession.objects.get(pk=enrollment.pk).outstanding_amount)
+        self.assertIn('Total Pending Amount: Rs. 7,000', reminder_message(candidate, today=self.today))
+
+        # Once the payments cover the schedule nobody is reminded
+        Payments.objects.create(studentsession=enrollment, user=self.user, amount=7000, date=self.today)
+        self.assertEqual(reminder_candidates([student.id], today=self.today), [])
+
+    def test_message_lists_overdue_before_upcoming(self):
+        body = reminder_message(reminder_candidates([self.ali.id], today=self.today)[0], today=self.today)
+        self.assertIn(
+            "- Physics: Rs. 5,000 (40 days overdue)\n"
+            f"- English: Rs. 4,000 (due: {self.today + timedelta(days=5)})\n"
+            f"- Physics: Rs. 2,500 (due: {self.today + timedelta(days=20)})",
+            body,
+        )
+        self.assertIn('Total Pending Amount: Rs. 11,500', body)
+
+
+class EmailBroadcastTests(LoggedInTestCase):
+    """Broadcasts go out as de-duplicated BCC chunks through the outbox, with pollable progress"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i in range(4):
+            Student.objects.create(student_name=f'Student {i}', email=f'student{i}@example.com')
+        Student.objects.create(student_name='No Email', email='')
+        Lead.objects.create(name='Lead', email='STUDENT0@example.com')
+
+    def test_chunks_are_bcc_and_unique(self):
+        broadcast = enqueue_broadcast(
+            'Holiday', 'Closed on Friday', ['a@example.com', ' A@example.com', '', 'b@example.com', 'c@example.com'],
+            chunk_size=2,
+        )
+        self.assertEqual(broadcast.recipient_count, 3)
+        self.assertEqual(
+            [(chunk.chunk, chunk.recipients, chunk.bcc) for chunk in broadcast.chunks.order_by('chunk')],
+            [(1, [], ['a@example.com', 'b@example.com']), (2, [], ['c@example.com'])],
+        )
+
+        deliver_batch(claim_batch())
+        self.assertEqual([(m.to, m.bcc) for m in mail.outbox], [
+            ([], ['a@example.com', 'b@example.com']), ([], ['c@example.com']),
+        ])
+        self.assertEqual(broadcast.progress(), {'queued': 0, 'sent': 3, 'failed': 0, 'total': 3, 'done': True})
+
+    def test_page_queues_selected_groups_and_reports_progress(self):
+        response = self.client.post('/Admin-EmailService/', {
+            'email_subject': 'Holiday', 'email_content': 'Closed on Friday',
+            'faculty_checkbox': 'false', 'student_checkbox': 'true', 'lead_checkbox': 'true',
+        })
+        data = response.json()
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(len(mail.outbox), 0)
+        broadcast = EmailBroadcast.objects.get(id=data['broadcast_id'])
+        # Four students; the lead repeats a student address and faculty was not selected
+        self.assertEqual(broadcast.recipient_count, 4)
+
+        progress = self.client.get(data['progress_url']).json()['data']
+        self.assertEqual((progress['queued'], progress['sent'], progress['done']), (4, 0, False))
+        call_command('send_outbox', '--once', stdout=io.StringIO())
+        progress = self.client.get(data['progress_url']).json()['data']
+        self.assertEqual((progress['queued'], progress['sent'], progress['done']), (0, 4, True))
+
+        history = self.client.get('/get-email-history/').json()['data']
+        self.assertEqual([(row['subject'], row['recipients'], row['status']) for row in history], [('Holiday', '4', 'Delivered')])
@@ -1,10 +1,20 @@
 import os
 from django.conf import settings
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.contrib import messages
 from authentication.models import User
 from Admin import models as admin_models
 from .forms import UserForm, SessionForm, StudentForm, LeadForm
+from .fee_engine import FeeSnapshot
+from .metrics import compute as compute_metrics
+from .dashboard import (
+    PaymentDashboardService, cached_finance, collector_analytics, finance_last_modified, finance_version,
+    receivables_aging, session_leaderboard,
+)
+from .outbox import enqueue_broadcast, enqueue_email
+from .reminders import REMINDER_SUBJECT, reminder_candidates, reminder_message
+from .reports import enqueue_report, visible_jobs
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from datetime import date, datetime
@@ -14,12 +24,17 @@ from reportlab.pdfgen import canvas
 from reportlab.lib import colors
 from reportlab.platypus import Table, TableStyle
 from django.http import HttpResponse
-from django.core.mail import send_mail
-from django.db.models import Count
+from django.db.models import Count, Prefetch, Q, Sum
+from django.db.models.functions import Coalesce, TruncDay, TruncMonth, TruncWeek
 from decimal import Decimal
-from django.http import JsonResponse, HttpResponse
+from django.http import FileResponse, JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
 from datetime import datetime, timedelta
+import csv
+import hashlib
 import json
 from docx import Document
 from docx.shared import Inches
@@ -59,128 +74,32 @@ def notify_late_fee_students(request):
                     return JsonResponse({'status': 'error', 'message': 'Email host not configured. Please contact administrator.'})
             
             # Track statistics for the response
-            emails_sent = 0
+            emails_queued = 0
             students_with_pending_fees = 0
-            failed_emails = 0
+            sender = User.objects.filter(id=request.session.get('user_id')).first()
             
-            # Get all unpaid payments for active students
-            from datetime import date
-            today_date = date.today()
-            
-            unpaid_payments = admin_models.Payments.objects.filter(
-                amount=0,  # Unpaid payments
-                studentsession__student__status='Active'
-            ).select_related('studentsession__student', 'studentsession__session')
-            
-            # Group payments by student
-            student_payments = {}
-            for payment in unpaid_payments:
-                if payment.studentsession and payment.studentsession.student:
-                    student = payment.studentsession.student
-                    if student not in student_payments:
-                        student_payments[student] = []
-                    student_payments[student].append(payment)
-            
-            for student, payments in student_payments.items():
-                # Skip students with no email
-                if not student.email:
-                    continue
-                    
-                # Calculate total pending amount and build session details
-                pending_amount = 0
-                session_details = []
-                overdue_details = []
-                
-                for payment in payments:
-                    if payment.studentsession and payment.studentsession.session:
-                        session_fee = payment.studentsession.session.fee
-                        pending_amount += session_fee
-                        
-                        # Calculate days overdue
-                        days_diff = (payment.date - today_date).days
-                        days_overdue = abs(days_diff) if days_diff < 0 else 0
-                        
-                        if days_overdue > 0:
-                            overdue_details.append(f"- {payment.studentsession.session.session_name}: Rs. {session_fee:,.0f} ({days_overdue} days overdue)")
-                        else:
-                            session_details.append(f"- {payment.studentsession.session.session_name}: Rs. {session_fee:,.0f} (due: {payment.date})")
-                
+            # Pending and overdue totals per student, with the per-session breakdown, in one query
+            for candidate in reminder_candidates():
                 # Only proceed if there's an actual pending amount
-                if pending_amount <= 0:
+                if candidate['pending'] <= 0:
                     continue
                     
                 students_with_pending_fees += 1
                 
-                # Combine overdue and upcoming payments
-                all_details = overdue_details + session_details
-                
-                # Create a more detailed and professional email
-                subject = "Fee Payment Reminder - Iqra Academy"
-                message = f"""Dear {student.student_name},
-
-This is a friendly reminder that you have an outstanding payment of Rs. {pending_amount:,.0f} for your courses at Iqra Academy.
-
-Payment Details:
-{'\n'.join(all_details)}
-
-Total Pending Amount: Rs. {pending_amount:,.0f}
-
-Please arrange for the payment at your earliest convenience to avoid any interruption in your learning experience.
-
-If you have already made the payment, please disregard this message.
-
-For any queries regarding your payment, please contact our accounts department.
-
-Regards,
-Iqra Academy
-Accounts Department
-Phone: [Your Phone Number]
-Email: admin@iqrainstitute.com"""
-                
-                # Retry logic for each email
-                import time
-                max_retries = 3
-                retry_delay = 1  # seconds (shorter for bulk emails)
-                email_sent = False
-                
-                for attempt in range(max_retries):
-                    try:
-                        # Send the email
-                        send_mail(
-                            subject=subject,
-                            message=message,
-                            from_email=getattr(settings, 'EMAIL_HOST_USER', 'admin@iqrainstitute.com'),
-                            recipient_list=[student.email],
-                            fail_silently=False,
-                        )
-                        emails_sent += 1
-                        email_sent = True
-                        break  # Success, exit retry loop
-                    except Exception as email_error:
-                        # If this is the last attempt, log failure
-                        if attempt == max_retries - 1:
-                            failed_emails += 1
-                            print(f"Failed to send email to {student.email} after {max_retries} attempts: {str(email_error)}")
-                            # Log the specific error for debugging
-                            if 'WinError 10060' in str(email_error):
-                                print(f"Connection timeout error for {student.email} - check firewall/network settings")
-                        else:
-                            # Wait before retrying (shorter delay for bulk emails)
-                            time.sleep(retry_delay * (attempt + 1))
-                            print(f"Email send attempt {attempt + 1} failed for {student.email}, retrying...")
+                # Delivery (and its retries) happens in the send_outbox worker
+                enqueue_email(
+                    REMINDER_SUBJECT, reminder_message(candidate), [candidate['email']],
+                    created_by=sender, kind='fee_reminder', student_id=candidate['student_id'],
+                )
+                emails_queued += 1
             
             # Return detailed success response
-            message = f'Bulk reminder process completed. {emails_sent} emails sent successfully'
-            if failed_emails > 0:
-                message += f', {failed_emails} emails failed to send'
-            
             return JsonResponse({
                 'status': 'success', 
-                'message': message,
+                'message': f'Bulk reminder process completed. {emails_queued} emails queued for delivery',
                 'details': {
-                    'emails_sent': emails_sent,
+                    'emails_queued': emails_queued,
                     'students_with_pending_fees': students_with_pending_fees,
-                    'failed_emails': failed_emails
                 }
             })
         except Exception as e:
@@ -221,63 +140,12 @@ def send_fee_reminder(request):
         if not student.email:
             return JsonResponse({'status': 'error', 'message': 'Student email not available'})
         
-        # Check for unpaid payments (amount = 0) for this student
-        from datetime import date
-        today_date = date.today()
-        
-        unpaid_payments = admin_models.Payments.objects.filter(
-            studentsession__student=student,
-            amount=0,  # Unpaid payments
-            studentsession__student__status='Active'
-        ).select_related('studentsession__session')
-        
-        if not unpaid_payments.exists():
+        # Pending fees of this student (active students with unpaid installments only)
+        candidates = reminder_candidates([student.id])
+        if not candidates:
             return JsonResponse({'status': 'error', 'message': 'No pending fees for this student'})
-        
-        # Calculate total pending amount and get session details
-        pending_amount = 0
-        session_details = []
-        overdue_details = []
-        
-        for payment in unpaid_payments:
-            if payment.studentsession and payment.studentsession.session:
-                session_fee = payment.studentsession.session.fee
-                pending_amount += session_fee
-                
-                # Calculate days overdue
-                days_diff = (payment.date - today_date).days
-                days_overdue = abs(days_diff) if days_diff < 0 else 0
-                
-                if days_overdue > 0:
-                    overdue_details.append(f"- {payment.studentsession.session.session_name}: Rs. {session_fee:,.0f} ({days_overdue} days overdue)")
-                else:
-                    session_details.append(f"- {payment.studentsession.session.session_name}: Rs. {session_fee:,.0f} (due: {payment.date})")
-        
-        # Combine overdue and upcoming payments
-        all_details = overdue_details + session_details
-        
-        # Create professional email content
-        subject = "Fee Payment Reminder - Iqra Academy"
-        message = f"""Dear {student.student_name},
-
-This is a friendly reminder that you have an outstanding payment of Rs. {pending_amount:,.0f} for your courses at Iqra Academy.
-
-Payment Details:
-{chr(10).join(all_details) if all_details else '- Course fees pending'}
-
-Total Pending Amount: Rs. {pending_amount:,.0f}
-
-Please arrange for the payment at your earliest convenience to avoid any interruption in your learning experience.
-
-If you have already made the payment, please disregard this message.
-
-For any queries regarding your payment, please contact our accounts department.
-
-Regards,
-Iqra Academy
-Accounts Department
-Phone: [Your Phone Number]
-Email: admin@iqrainstitute.com"""
+        candidate = candidates[0]
+        pending_amount = candidate['pending']
         
         # Validate email configuration before sending
         from django.conf import settings
@@ -291,52 +159,19 @@ Email: admin@iqrainstitute.com"""
             if not getattr(settings, 'EMAIL_HOST', None):
                 return JsonResponse({'status': 'error', 'message': 'Email host not configured. Please contact administrator.'})
         
-        # Retry logic for email sending
-        import time
-        max_retries = 3
-        retry_delay = 2  # seconds
-        
-        for attempt in range(max_retries):
-            try:
-                # Send the email
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=getattr(settings, 'EMAIL_HOST_USER', 'admin@iqrainstitute.com'),
-                    recipient_list=[student.email],
-                    fail_silently=False,
-                )
-                break  # Success, exit retry loop
-            except Exception as email_error:
-                error_message = str(email_error)
-                
-                # If this is the last attempt, return error
-                if attempt == max_retries - 1:
-                    if 'WinError 10060' in error_message or 'Connection refused' in error_message:
-                        return JsonResponse({
-                            'status': 'error', 
-                            'message': f'Failed to send reminder after {max_retries} attempts: Connection timeout. Please check your internet connection and email configuration. Try switching to SSL port 465 if the issue persists.'
-                        })
-                    else:
-                        return JsonResponse({
-                            'status': 'error', 
-                            'message': f'Failed to send reminder after {max_retries} attempts: {error_message}. Please check email configuration.'
-                        })
-                
-                # Wait before retrying (exponential backoff)
-                time.sleep(retry_delay * (2 ** attempt))
-                print(f"Email send attempt {attempt + 1} failed, retrying in {retry_delay * (2 ** attempt)} seconds...")
+        # Delivery (and its retries) happens in the send_outbox worker
+        enqueue_email(REMINDER_SUBJECT, reminder_message(candidate), [student.email], created_by=user, kind='fee_reminder', student_id=student.id)
         
         # Create notification for this reminder
         admin_models.Notification.objects.create(
             user=user,
             category='Late Fee',
-            content=f"Fee reminder sent to {student.student_name} ({student.email}) - Rs. {pending_amount:,.0f} pending"
+            content=f"Fee reminder queued for {student.student_name} ({student.email}) - Rs. {pending_amount:,.0f} pending"
         )
         
         return JsonResponse({
             'status': 'success', 
-            'message': 'Reminder sent successfully',
+            'message': 'Reminder queued for delivery',
             'details': {
                 'student_name': student.student_name,
                 'email': student.email,
@@ -358,38 +193,50 @@ def EmailService(request):
         email_content = request.POST.get('email_content')  # Email body
         email_subject = request.POST.get('email_subject')  # Email subject
         email_list = []
-        if 'faculty_checkbox' in request.POST:
-            selected_users = User.objects.all()
-            email_addresses = [user.email for user in selected_users if user.email]
-            email_list.extend(email_addresses)
-        if 'student_checkbox' in request.POST:
-            selected_users = admin_models.Student.objects.all()
-            email_addresses = [user.email for user in selected_users if user.email]
-            email_list.extend(email_addresses)
-        if 'lead_checkbox' in request.POST:
-            selected_users = admin_models.Lead.objects.all()
-            email_addresses = [user.email for user in selected_users if user.email]
-            email_list.extend(email_addresses)
+        def selected(name):
+            # The page posts every checkbox as 'true'/'false'; a plain form posts 'on' when checked
+            return request.POST.get(name) in ('on', 'true')
+
+        if selected('faculty_checkbox'):
+            email_list.extend(User.objects.exclude(email__isnull=True).exclude(email='').values_list('email', flat=True))
+        if selected('student_checkbox'):
+            email_list.extend(
+                admin_models.Student.objects.exclude(email__isnull=True).exclude(email='').values_list('email', flat=True)
+            )
+        if selected('lead_checkbox'):
+            email_list.extend(
+                admin_models.Lead.objects.exclude(email__isnull=True).exclude(email='').values_list('email', flat=True)
+            )
 
         if email_list:
             try:
-                # Send the email to the selected users
-                send_mail(
-                    subject=email_subject,
-                    message=email_content,
-                    from_email='callmemutiurrehman@gmail.com',  # Replace with your sender email
-                    recipient_list=email_list,
-                    fail_silently=False,
-                )
-                return JsonResponse({'status': 'success', 'message': 'Emails sent successfully!'})
+                # De-duplicated and split into BCC chunks; delivered (and logged) by the send_outbox worker
+                broadcast = enqueue_broadcast(email_subject, email_content, email_list, created_by=user)
+                return JsonResponse({
+                    'status': 'success',
+                    'message': f'Email queued for {broadcast.recipient_count} recipients!',
+                    'broadcast_id': broadcast.id,
+                    'progress_url': reverse('email_broadcast_progress', args=[broadcast.id]),
+                })
             except Exception as e:
-                return JsonResponse({'status': 'error', 'message': f'Failed to send emails: {str(e)}'})
+                return JsonResponse({'status': 'error', 'message': f'Failed to queue emails: {str(e)}'})
 
         return JsonResponse({'status': 'error', 'message': 'No valid email addresses found.'})
     context = {
         'user': user,
     }
     return render(request, 'Admin/EmailService.html', context)
+
+def email_broadcast_progress(request, broadcast_id):
+    """Sent/failed/queued recipient counts of a broadcast, polled by the Email Services page"""
+    if 'user_id' not in request.session:
+        return JsonResponse({'status': 'error', 'message': 'Not authenticated'}, status=401)
+
+    broadcast = admin_models.EmailBroadcast.objects.filter(id=broadcast_id).first()
+    if broadcast is None:
+        return JsonResponse({'status': 'error', 'message': 'Broadcast not found'}, status=404)
+    return JsonResponse({'status': 'success', 'data': {'id': broadcast.id, **broadcast.progress()}})
+
 def print_attendance_report(request, course_id):
     # Get date range from request
     start_date = request.GET.get('start_date')
@@ -553,255 +400,11 @@ def Payment(request):
     if user.usertype == 2:
         return redirect('Admin_Dashboard')
     
-    # UNIFIED DATA SOURCE: Use only Payments table and calculated properties
-    payments = admin_models.Payments.objects.select_related(
-        'studentsession__student', 'studentsession__session', 'user'
-    ).all()
-    
-    # Get all active students (single source for student data)
-    students = admin_models.Student.objects.filter(status='Active')
-    
-    # Initialize metrics
-    total_revenue = 0
-    total_pending = 0
-    total_discount = 0
-    total_expected_revenue = 0
-    session_revenue = {}
-    user_collection = {}
-    overdue_amount = 0
-    
-    # Student payment status counters
-    students_paid = 0
-    students_partial = 0
-    students_unpaid = 0
-    
-    # Calculate total revenue from Payments table (SINGLE SOURCE)
-    total_revenue = sum(p.amount or 0 for p in payments)
-    
-    # Track session revenue from payments (unified system)
-    for payment in payments:
-        if payment.studentsession and payment.studentsession.session:
-            session_name = payment.studentsession.session.session_name
-            session_revenue[session_name] = session_revenue.get(session_name, 0) + (payment.amount or 0)
-    
-    # Track user collection from payment records
-    for payment in payments:
-        if payment.user:
-            collector_name = f"{payment.user.first_name} {payment.user.last_name}"
-            user_collection[collector_name] = user_collection.get(collector_name, 0) + (payment.amount or 0)
-    
-    # Calculate totals using unified Student model properties
-    student_fee_data = []
-    for student in students:
-        # Use calculated properties from unified system
-        student_total_fee = student.total_fee
-        student_paid = student.total_paid
-        student_balance = student.remaining_balance
-        student_status = student.payment_status
-        
-        # Get student sessions for display
-        student_sessions = student.student_sessions.filter(status='Active')
-        
-        # Calculate discount from sessions
-        student_discount = sum(session.discount or 0 for session in student_sessions)
-        
-        # Update totals
-        total_expected_revenue += student_total_fee
-        total_pending += student_balance
-        total_discount += student_discount
-        
-        # Count payment status
-        if student_status == 'Paid':
-            students_paid += 1
-        elif student_status == 'Partial':
-            students_partial += 1
-        else:
-            students_unpaid += 1
-        
-        # Check for overdue amounts
-        from datetime import date
-        today = date.today()
-        is_overdue = any(
-            session.due_date and session.due_date < today and session.session_balance > 0
-            for session in student_sessions
-        )
-        if is_overdue:
-            overdue_amount += student_balance
-        
-        # Create student fee object for display (using unified data)
-        student_fee = type('StudentFee', (), {
-            'student': student,
-            'sessions': list(student_sessions),
-            'calculated_final_fee': student_total_fee,
-            'display_paid_amount': student_paid,
-            'calculated_remaining_amount': student_balance,
-            'display_discount': student_discount,
-            'payment_status': student_status
-        })()
-        
-        student_fee_data.append(student_fee)
-    
-    # Get session revenue from student sessions
-    student_sessions = admin_models.StudentSession.objects.select_related(
-        'student', 'session'
-    ).filter(status='Active')
-    
-    # Create student fee data for display using UNIFIED SYSTEM ONLY
-    student_fee_data = []
-    processed_students = set()  # Track processed students to avoid duplicates
-    
-    for student in students:
-        if student.id in processed_students:
-            continue
-        processed_students.add(student.id)
-        
-        # Use unified Student model properties (calculated from Payments)
-        student_total_fee = student.total_fee
-        student_paid = student.total_paid
-        student_balance = student.remaining_balance
-        student_status = student.payment_status
-        
-        # Get student sessions for display
-        student_sessions_list = list(student.student_sessions.filter(status='Active'))
-        
-        # Calculate discount from sessions
-        student_discount = sum(session.discount or 0 for session in student_sessions_list)
-        
-        # Update totals
-        total_expected_revenue += student_total_fee
-        total_pending += student_balance
-        total_discount += student_discount
-        
-        # Count payment status
-        if student_status == 'Paid':
-            students_paid += 1
-        elif student_status == 'Partial':
-            students_partial += 1
-        else:
-            students_unpaid += 1
-        
-        # Check for overdue amounts
-        from datetime import date
-        today = date.today()
-        is_overdue = any(
-            session.due_date and session.due_date < today and session.session_balance > 0
-            for session in student_sessions_list
-        )
-        if is_overdue:
-            overdue_amount += student_balance
-        
-        # Create student fee object for display (using unified data)
-        student_fee = type('StudentFee', (), {
-            'student': student,
-            'sessions': student_sessions_list,
-            'calculated_final_fee': student_total_fee,
-            'display_paid_amount': student_paid,
-            'calculated_remaining_amount': student_balance,
-            'display_discount': student_discount,
-            'payment_status': student_status
-        })()
-        
-        student_fee_data.append(student_fee)
-    
-    # Calculate additional metrics
-    total_students = len(student_fee_data)
-    total_payments_count = payments.count()
-    avg_payment = total_revenue / total_payments_count if total_payments_count > 0 else 0
-    collection_rate = (total_revenue / total_expected_revenue * 100) if total_expected_revenue > 0 else 0
-    
-    # Get recent payments (ordered by date)
-    recent_payments = payments.order_by('-date', '-id')[:10]
-    
-    # Get top sessions by revenue
-    top_sessions = sorted(session_revenue.items(), key=lambda x: x[1], reverse=True)[:5]
-    
-    # Calculate daily and yearly revenue
-    from datetime import date, timedelta
+    # Every metric on the page comes from a fixed number of queries, and is
+    # served from the cache until the next Payments/StudentSession/Student write
     today = date.today()
-    daily_revenue = sum(p.amount or 0 for p in payments if p.date == today)
-    yearly_revenue = sum(p.amount or 0 for p in payments if p.date and p.date.year == today.year)
-    
-    # Calculate monthly revenue (current month)
-    monthly_revenue = sum(p.amount or 0 for p in payments if p.date and p.date.month == today.month and p.date.year == today.year)
-    
-    # Business Intelligence Metrics
-    active_students_count = admin_models.Student.objects.filter(status='Active').count()
-    revenue_per_student = total_revenue / active_students_count if active_students_count > 0 else 0
-    
-    # Count overdue students using unified system
-    overdue_students_count = 0
-    for student in students:
-        if student.remaining_balance > 0:
-            # Check if any session for this student is overdue
-            student_sessions_list = student.student_sessions.filter(status='Active')
-            for session in student_sessions_list:
-                if session.due_date and session.due_date < today:
-                    overdue_students_count += 1
-                    break
-    
-    # Calculate projected monthly revenue based on current trends
-    days_in_month = today.day
-    if days_in_month > 0:
-        daily_avg = monthly_revenue / days_in_month
-        days_remaining = 30 - days_in_month
-        projected_monthly_revenue = monthly_revenue + (daily_avg * days_remaining)
-    else:
-        projected_monthly_revenue = 0
-    
-    # Calculate payment trends (last 7 days)
-    week_ago = today - timedelta(days=7)
-    weekly_payments = [p for p in payments if p.date and p.date >= week_ago]
-    weekly_revenue = sum(p.amount or 0 for p in weekly_payments)
-    
-    # Session performance analysis
-    session_performance = []
-    for session_name, revenue in session_revenue.items():
-        # Count students in this session
-        session_obj = admin_models.Sessions.objects.filter(session_name=session_name).first()
-        if session_obj:
-            student_count = admin_models.StudentSession.objects.filter(session=session_obj, status='Active').count()
-            avg_revenue_per_student = revenue / student_count if student_count > 0 else 0
-            session_performance.append({
-                'name': session_name,
-                'revenue': revenue,
-                'students': student_count,
-                'avg_per_student': avg_revenue_per_student
-            })
-    
-    # Sort by revenue
-    session_performance.sort(key=lambda x: x['revenue'], reverse=True)
-    
-    context = {
-        'user': user,
-        'payments': recent_payments,
-        'student_fees': student_fee_data,
-        'total_revenue': total_revenue,
-        'total_pending': total_pending,
-        'total_discount': total_discount,
-        'total_expected_revenue': total_expected_revenue,
-        'session_revenue': session_revenue,
-        'user_collection': user_collection,
-        'total_payments_count': total_payments_count,
-        'recent_payments': recent_payments,
-        'top_sessions': top_sessions,
-        'avg_payment': avg_payment,
-        'collection_rate': round(collection_rate, 1),
-        'students_paid': students_paid,
-        'students_partial': students_partial,
-        'students_unpaid': students_unpaid,
-        'total_students': total_students,
-        'overdue_amount': overdue_amount,
-        'daily_revenue': daily_revenue,
-        'yearly_revenue': yearly_revenue,
-        'monthly_revenue': monthly_revenue,
-        'active_students_count': active_students_count,
-        'revenue_per_student': round(revenue_per_student, 0),
-        'overdue_students_count': overdue_students_count,
-        'projected_monthly_revenue': round(projected_monthly_revenue, 0),
-        'weekly_revenue': weekly_revenue,
-        'session_performance': session_performance,
-        'today_date': today,
-    }
+    context = dict(cached_finance('payments-page', PaymentDashboardService(today).build, today))
+    context['user'] = user
     return render(request, 'Admin/Payments.html', context)
 @csrf_exempt
 def add_fee_payment(request, session_id):
@@ -813,7 +416,7 @@ def add_fee_payment(request, session_id):
     if request.method == "POST":
         try:
             # Get the session and payment details
-            session = admin_models.StudentSession.objects.get(id=session_id)
+            session = admin_models.StudentSession.objects.with_primary_flag().get(id=session_id)
             amount = int(request.POST.get("amount"))
             due_date = request.POST.get("due_date")
 
@@ -830,6 +433,9 @@ def add_fee_payment(request, session_id):
                 date=date.today(),
             )
 
+            # Settle the scheduled installments the payments now cover
+            admin_models.FeeInstallment.settle(session, payment)
+
             # Update due_date (no need to update fee_paid - it's calculated from Payments)
             session.due_date = due_date
             session.save()
@@ -899,34 +505,24 @@ def Notification(request):
     renewals_created = 0
     for student_session in monthly_student_sessions:
         try:
-            # Get the last payment for this student session
-            last_payment = admin_models.Payments.objects.filter(
-                studentsession=student_session
-            ).order_by('-date').first()
-            
-            next_due_date = None
-            if last_payment:
-                # Calculate next monthly due date from last payment
-                next_due_date = last_payment.date + relativedelta(months=1)
-            elif student_session.registration_date:
-                # No payments yet, calculate from registration date
-                next_due_date = student_session.registration_date + relativedelta(months=1)
+            # One month after the last payment or scheduled renewal
+            next_due_date = admin_models.FeeInstallment.next_renewal_due(student_session)
             
             if next_due_date and next_due_date <= seven_days_from_now:
-                # Check if there's already an unpaid payment for this due date
-                existing_unpaid = admin_models.Payments.objects.filter(
+                # Check if there's already a renewal scheduled for this due date
+                existing_unpaid = admin_models.FeeInstallment.objects.filter(
                     studentsession=student_session,
-                    date=next_due_date,
-                    amount=0
+                    due_date=next_due_date
                 ).exists()
                 
                 if not existing_unpaid:
-                    # Create new unpaid payment for monthly renewal
-                    admin_models.Payments.objects.create(
+                    # Schedule the monthly renewal
+                    admin_models.FeeInstallment.objects.create(
                         studentsession=student_session,
-                        user=user,
-                        amount=0,  # Unpaid
-                        date=next_due_date
+                        kind='renewal',
+                        created_by=user,
+                        expected_amount=student_session.session.fee or 0,
+                        due_date=next_due_date
                     )
                     
                     # Update next_monthly_due field
@@ -951,34 +547,33 @@ def Notification(request):
             # Log error but continue processing other sessions
             print(f"Error processing monthly renewal for {student_session.student.student_name}: {str(e)}")
     
-    # Get unpaid payments that are due within 7 days or overdue
-    due_payments = admin_models.Payments.objects.filter(
-        amount=0,  # Unpaid payments
-        date__lte=seven_days_from_now,  # Due within 7 days or overdue
+    # Get unpaid installments that are due within 7 days or overdue
+    due_installments = admin_models.FeeInstallment.objects.filter(
+        status='Unpaid',
+        due_date__lte=seven_days_from_now,  # Due within 7 days or overdue
         studentsession__student__status='Active',
         studentsession__session__status='Active'
     ).select_related('studentsession__student', 'studentsession__session')
     
-    # Process each payment to create session-like objects for template compatibility
+    # Process each installment to create session-like objects for template compatibility
     processed_sessions = []
-    for payment in due_payments:
-        if payment.studentsession:
-            # Calculate days until due or days overdue
-            days_diff = (payment.date - today_date).days
-            
-            # Create a session-like object for template compatibility
-            session_obj = type('DuePaymentSession', (), {
-                'student': payment.studentsession.student,
-                'session': payment.studentsession.session,
-                'due_date': payment.date,
-                'days_until_due': days_diff,
-                'days_overdue': abs(days_diff) if days_diff < 0 else 0,
-                'fee_amount': payment.studentsession.session.fee if payment.studentsession.session else 0,
-                'balance': payment.studentsession.session.fee if payment.studentsession.session else 0,  # Unpaid amount
-                'payment_id': payment.id
-            })()
-            
-            processed_sessions.append(session_obj)
+    for installment in due_installments:
+        # Calculate days until due or days overdue
+        days_diff = (installment.due_date - today_date).days
+        
+        # Create a session-like object for template compatibility
+        session_obj = type('DuePaymentSession', (), {
+            'student': installment.studentsession.student,
+            'session': installment.studentsession.session,
+            'due_date': installment.due_date,
+            'days_until_due': days_diff,
+            'days_overdue': abs(days_diff) if days_diff < 0 else 0,
+            'fee_amount': installment.studentsession.session.fee or 0,
+            'balance': installment.expected_amount,  # Unpaid amount
+            'installment_id': installment.id
+        })()
+        
+        processed_sessions.append(session_obj)
     
     # Sort all sessions by due date
     processed_sessions.sort(key=lambda x: x.due_date)
@@ -1389,18 +984,22 @@ def StudentView(request, studentid):
     available_sessions = all_active.exclude(id__in=enrolled_ids)
 
     # Get student's payment information using UNIFIED SYSTEM
-    # Calculate installment information from payment records
     all_payments = admin_models.Payments.objects.filter(
         studentsession__student=userdata
     ).order_by('date')
     
+    # Installment plan and monthly renewals come from the FeeInstallment schedule
+    schedule = admin_models.FeeInstallment.objects.filter(
+        studentsession__student=userdata
+    ).select_related('payment').order_by('due_date', 'id')
+    
     # Get latest payment
     latest_payment = all_payments.filter(amount__gt=0).order_by('-date').first()
     
-    # Count installments (payments with amount=0 are unpaid installments)
-    total_installments = all_payments.count()
-    paid_installments = all_payments.filter(amount__gt=0).count()
-    unpaid_installments = all_payments.filter(amount=0).count()
+    # Count installments
+    total_installments = schedule.count()
+    paid_installments = schedule.filter(status='Paid').count()
+    unpaid_installments = schedule.filter(status='Unpaid').count()
     
     # Calculate one-time registration fee from primary session
     primary_session = (
@@ -1419,13 +1018,9 @@ def StudentView(request, studentid):
         )
         
     # Calculate per installment amount
-    per_installment_amount = 0
-    if paid_installments > 0:
-        # Use amount from first paid installment
-        first_paid = all_payments.filter(amount__gt=0).first()
-        if first_paid:
-            per_installment_amount = first_paid.amount
-    else:
+    first_installment = schedule.first()
+    per_installment_amount = first_installment.expected_amount if first_installment else 0
+    if not per_installment_amount:
         # Calculate per installment amount based on final fee (total_fee already includes registration_fee - discount)
         discount_amount = sum(s.discount or 0 for s in student_sessions.filter(status='Active'))
         calculated_final_fee = userdata.total_fee - discount_amount
@@ -1448,28 +1043,29 @@ def StudentView(request, studentid):
         'discount': discount_amount
     })()
     
-    # Get installment details from payment records
+    # Get installment details from the schedule
     installments = []
-    for payment in all_payments:
+    for installment in schedule:
         # Show expected amount for unpaid installments, actual amount for paid ones
-        display_amount = payment.amount if payment.amount > 0 else per_installment_amount
+        is_paid = installment.status == 'Paid'
+        paid_with = installment.payment if is_paid else None
         
         installment_info = {
-            'id': payment.id,
-            'amount': display_amount,
-            'due_date': payment.date,
-            'paid_date': payment.date if payment.amount > 0 else None,
-            'status': 'Paid' if payment.amount > 0 else 'Unpaid',
-            'is_paid': payment.amount > 0
+            'id': installment.id,
+            'amount': paid_with.amount if paid_with else installment.expected_amount,
+            'due_date': installment.due_date,
+            'paid_date': paid_with.date if paid_with else None,
+            'status': installment.status,
+            'is_paid': is_paid
         }
         installments.append(installment_info)
     
     next_due_date = None
     # Find next unpaid installment due date - only if there are unpaid installments and remaining balance
     if unpaid_installments > 0 and calculated_remaining > 0:
-        next_unpaid = all_payments.filter(amount=0).order_by('date').first()
+        next_unpaid = schedule.filter(status='Unpaid').first()
         if next_unpaid:
-            next_due_date = next_unpaid.date
+            next_due_date = next_unpaid.due_date
     
     # Add these attributes to payment_info
     payment_info.installments_paid = paid_installments
@@ -1562,23 +1158,23 @@ def StudentView(request, studentid):
             print(f"Debug: Found {student_sessions_for_installments.count()} student sessions")
             
             # Clear existing unpaid installments first
-            admin_models.Payments.objects.filter(
+            admin_models.FeeInstallment.objects.filter(
                 studentsession__student=userdata,
-                amount=0
+                status='Unpaid'
             ).delete()
             
             installments_created = 0
             for student_session in student_sessions_for_installments:
                 for i in range(1, installments_count + 1):
-                    # Create a payment record for each installment (initially unpaid)
-                    payment = admin_models.Payments.objects.create(
+                    # Schedule each installment (initially unpaid)
+                    installment = admin_models.FeeInstallment.objects.create(
                         studentsession=student_session,
-                        user=user,
-                        amount=0,  # Initially unpaid
-                        date=due_date
+                        created_by=user,
+                        expected_amount=int(per_installment_amount),
+                        due_date=due_date
                     )
                     installments_created += 1
-                    print(f"Debug: Created installment {i} with payment ID {payment.id}, due date {due_date}")
+                    print(f"Debug: Created installment {i} with ID {installment.id}, due date {due_date}")
                     # Next due date is one month later
                     due_date = due_date + timedelta(days=30)
             
@@ -1695,12 +1291,13 @@ def StudentView(request, studentid):
                         additional_payment = paid_amount - current_total_paid
                         primary_session = student_sessions.first()
                         if primary_session:
-                            admin_models.Payments.objects.create(
+                            payment = admin_models.Payments.objects.create(
                                 studentsession=primary_session,
                                 user=user,
                                 amount=int(additional_payment),
                                 date=date.today()
                             )
+                            admin_models.FeeInstallment.settle(primary_session, payment)
                             print(f"Debug: Added payment of {additional_payment}")
                     
                     # Debug: Check what's in the database after updates
@@ -1738,12 +1335,13 @@ def StudentView(request, studentid):
                         additional_payment = paid_amount - current_total_paid
                         primary_session = student_sessions.first()
                         if primary_session:
-                            admin_models.Payments.objects.create(
+                            payment = admin_models.Payments.objects.create(
                                 studentsession=primary_session,
                                 user=user,
                                 amount=int(additional_payment),
                                 date=date.today()
                             )
+                            admin_models.FeeInstallment.settle(primary_session, payment)
                             print(f"Debug: Added payment of {additional_payment}")
                     
                     # Debug: Check what's in the database after updates
@@ -1774,9 +1372,9 @@ def StudentView(request, studentid):
                     due_date = single_due_date if single_due_date else date.today()
                     
                     # Clear existing unpaid installments to avoid duplicates
-                    admin_models.Payments.objects.filter(
+                    admin_models.FeeInstallment.objects.filter(
                         studentsession__student=saved_student,
-                        amount=0
+                        status='Unpaid'
                     ).delete()
                     
                     student_sessions = admin_models.StudentSession.objects.filter(student=saved_student)
@@ -1785,14 +1383,14 @@ def StudentView(request, studentid):
                     installments_created = 0
                     for student_session in student_sessions:
                         for i in range(1, installments_count + 1):
-                            payment = admin_models.Payments.objects.create(
+                            installment = admin_models.FeeInstallment.objects.create(
                                 studentsession=student_session,
-                                user=user,
-                                amount=0,  # initially unpaid
-                                date=due_date
+                                created_by=user,
+                                expected_amount=int(per_installment_amount),  # initially unpaid
+                                due_date=due_date
                             )
                             installments_created += 1
-                            print(f"Debug: Created installment {i} with payment ID {payment.id}, due date {due_date}")
+                            print(f"Debug: Created installment {i} with ID {installment.id}, due date {due_date}")
                             due_date = due_date + timedelta(days=30)
                     
                     print(f"Debug: Total installments created: {installments_created}")
@@ -1847,12 +1445,13 @@ def StudentView(request, studentid):
                 # Create payment record for the additional amount
                 primary_session = student_sessions.first()
                 if primary_session and additional_payment > 0:
-                    admin_models.Payments.objects.create(
+                    payment = admin_models.Payments.objects.create(
                         studentsession=primary_session,
                         user=user,
                         amount=int(additional_payment),
                         date=date.today()
                     )
+                    admin_models.FeeInstallment.settle(primary_session, payment)
                     
                     message = f"Added payment of Rs. {additional_payment} for {userdata.student_name}"
                     admin_models.Notification.objects.create(user=user, category='New Fee', content=message)
@@ -1875,9 +1474,9 @@ def StudentView(request, studentid):
                 due_date = single_due_date if single_due_date else date.today()
                 
                 # Clear existing unpaid installments to avoid duplicates
-                admin_models.Payments.objects.filter(
+                admin_models.FeeInstallment.objects.filter(
                     studentsession__student=userdata,
-                    amount=0
+                    status='Unpaid'
                 ).delete()
                 
                 student_sessions = admin_models.StudentSession.objects.filter(student=userdata)
@@ -1886,14 +1485,14 @@ def StudentView(request, studentid):
                 installments_created = 0
                 for student_session in student_sessions:
                     for i in range(1, installments_count + 1):
-                        payment = admin_models.Payments.objects.create(
+                        installment = admin_models.FeeInstallment.objects.create(
                             studentsession=student_session,
-                            user=user,
-                            amount=0,
-                            date=due_date
+                            created_by=user,
+                            expected_amount=int(per_installment_amount),
+                            due_date=due_date
                         )
                         installments_created += 1
-                        print(f"Debug: [update_payment] Created installment {i} with payment ID {payment.id}, due date {due_date}")
+                        print(f"Debug: [update_payment] Created installment {i} with ID {installment.id}, due date {due_date}")
                         due_date = due_date + timedelta(days=30)
                 
                 print(f"Debug: [update_payment] Total installments created: {installments_created}")
@@ -1941,11 +1540,11 @@ def mark_installment_paid(request, studentid):
             user = User.objects.get(id=user_id)
             student = admin_models.Student.objects.get(id=studentid)
             
-            # Find the next unpaid installment (payment with amount=0)
-            next_unpaid = admin_models.Payments.objects.filter(
+            # Find the next unpaid installment on the schedule
+            next_unpaid = admin_models.FeeInstallment.objects.filter(
                 studentsession__student=student,
-                amount=0
-            ).order_by('date').first()
+                status='Unpaid'
+            ).order_by('due_date', 'id').first()
             
             if not next_unpaid:
                 return JsonResponse({
@@ -1954,7 +1553,7 @@ def mark_installment_paid(request, studentid):
                 })
             
             # Calculate the installment amount
-            installment_amount = request.POST.get('amount')
+            installment_amount = request.POST.get('amount') or next_unpaid.expected_amount
             if not installment_amount:
                 # Calculate from student's total fee and installment count
                 student_sessions = admin_models.StudentSession.objects.filter(student=student)
@@ -1963,20 +1562,27 @@ def mark_installment_paid(request, studentid):
                 total_with_reg = total_fee + registration_fee
                 
                 # Get total installment count
-                all_payments = admin_models.Payments.objects.filter(studentsession__student=student)
-                installment_count = all_payments.count()
+                installment_count = admin_models.FeeInstallment.objects.filter(studentsession__student=student).count()
                 
                 if installment_count > 0:
                     installment_amount = int(total_with_reg / installment_count)
                 else:
                     installment_amount = total_with_reg
             
-            # Mark the installment as paid
-            next_unpaid.amount = int(installment_amount)
-            next_unpaid.save()
+            # Record the payment and settle the installments it covers
+            payment = admin_models.Payments.objects.create(
+                studentsession=next_unpaid.studentsession,
+                user=user,
+                amount=int(installment_amount),
+                date=date.today()
+            )
+            settled = admin_models.FeeInstallment.settle(next_unpaid.studentsession, payment)
             
             # Create notification
-            message = f"Installment payment of ${installment_amount} received for {student.student_name}"
+            if settled:
+                message = f"Installment payment of ${installment_amount} received for {student.student_name}"
+            else:
+                message = f"Partial installment payment of ${installment_amount} received for {student.student_name}"
             admin_models.Notification.objects.create(
                 user=user, 
                 category='Payment', 
@@ -1984,13 +1590,14 @@ def mark_installment_paid(request, studentid):
             )
             
             # Calculate updated payment info
-            all_payments = admin_models.Payments.objects.filter(studentsession__student=student)
-            paid_count = all_payments.filter(amount__gt=0).count()
-            total_count = all_payments.count()
-            unpaid_count = all_payments.filter(amount=0).count()
+            schedule = admin_models.FeeInstallment.objects.filter(studentsession__student=student)
+            paid_count = schedule.filter(status='Paid').count()
+            total_count = schedule.count()
+            unpaid_count = schedule.filter(status='Unpaid').count()
             
-            # Calculate total paid amount - line 1578
-            total_paid = sum(payment.amount for payment in all_payments.filter(amount__gt=0))  # Only sum actual payments
+            # Calculate total paid amount
+            all_payments = admin_models.Payments.objects.filter(studentsession__student=student)
+            total_paid = sum(payment.amount or 0 for payment in all_payments)
             
             # Calculate remaining amount
             student_sessions = admin_models.StudentSession.objects.filter(student=student)
@@ -2000,18 +1607,25 @@ def mark_installment_paid(request, studentid):
             remaining_amount = total_with_reg - total_paid
             
             # Get next due date
-            next_unpaid_after = admin_models.Payments.objects.filter(
-                studentsession__student=student,
-                amount=0
-            ).order_by('date').first()
-            next_due_date = next_unpaid_after.date.strftime('%Y-%m-%d') if next_unpaid_after else None
+            next_unpaid_after = schedule.filter(status='Unpaid').order_by('due_date', 'id').first()
+            next_due_date = next_unpaid_after.due_date.strftime('%Y-%m-%d') if next_unpaid_after else None
             
             # Calculate next due amount (remaining installments)
             next_due_amount = int(remaining_amount / unpaid_count) if unpaid_count > 0 else 0
             
+            # A payment below the installment is recorded but leaves it unpaid
+            if settled:
+                result = f'Payment of ${installment_amount} recorded, {len(settled)} installment(s) marked as paid successfully!'
+            else:
+                result = (
+                    f'Partial payment of ${installment_amount} recorded. The installment due on '
+                    f'{next_unpaid.due_date:%Y-%m-%d} stays unpaid until Rs. {next_unpaid.expected_amount} is covered.'
+                )
+            
             return JsonResponse({
                 'success': True, 
-                'message': f'Installment of ${installment_amount} marked as paid successfully!',
+                'partial': not settled,
+                'message': result,
                 'paid_installments': paid_count,
                 'total_installments': total_count,
                 'installments_due': unpaid_count,
@@ -2223,26 +1837,26 @@ def AddStudent(request, id=None):
                 student_sessions_list = admin_models.StudentSession.objects.filter(student=selected_student)
                 primary_session = student_sessions_list.first()
                 
-                # Create initial payment records for tracking
+                # Schedule what falls due for tracking
                 if primary_session:
                     if not enable_installments or installments_count <= 1:
-                        # Create a single payment due on registration date (current date)
-                        payment = admin_models.Payments.objects.create(
+                        # A single installment for the whole fee, due on registration date (current date)
+                        admin_models.FeeInstallment.objects.create(
                             studentsession=primary_session,
-                            user=user,
-                            amount=0,  # Initially unpaid
-                            date=date.today()
+                            created_by=user,
+                            expected_amount=max(0, int(total_fee + registration_fee - discount)),
+                            due_date=date.today()
                         )
                     else:
-                        # For installments, create payment records for each installment
+                        # For installments, schedule each installment
                         due_date = single_due_date if single_due_date else date.today()
                         
                         for i in range(1, installments_count + 1):
-                            payment = admin_models.Payments.objects.create(
+                            admin_models.FeeInstallment.objects.create(
                                 studentsession=primary_session,
-                                user=user,
-                                amount=0,  # Initially unpaid
-                                date=due_date
+                                created_by=user,
+                                expected_amount=int(per_installment_amount),
+                                due_date=due_date
                             )
                             # Next due date is one month later
                             due_date = due_date + relativedelta(months=1)
@@ -2257,27 +1871,16 @@ def AddStudent(request, id=None):
                 
                 # Handle immediate payment if provided
                 if paid_amount > 0 and primary_session:
-                    # Find the first unpaid payment record and mark it as paid
-                    unpaid_payment = admin_models.Payments.objects.filter(
+                    # Record the payment on registration date (today)
+                    payment = admin_models.Payments.objects.create(
                         studentsession=primary_session,
-                        amount=0
-                    ).order_by('date').first()
+                        user=user,
+                        amount=int(paid_amount),
+                        date=date.today()
+                    )
                     
-                    if unpaid_payment:
-                        unpaid_payment.amount = int(paid_amount)
-                        # When installments are not enabled, set paid date to registration date (today)
-                        if not enable_installments or installments_count <= 1:
-                            unpaid_payment.date = date.today()
-                        unpaid_payment.save()
-                    else:
-                        # Create new payment record if no unpaid record exists
-                        # Use registration date (today) for the payment
-                        admin_models.Payments.objects.create(
-                            studentsession=primary_session,
-                            user=user,
-                            amount=int(paid_amount),
-                            date=date.today()
-                        )
+                    # and settle the installments it covers
+                    admin_models.FeeInstallment.settle(primary_session, payment)
                     
                     payment_message = f"Payment received for {selected_student.student_name}: Rs.{paid_amount}"
                     admin_models.Notification.objects.create(
@@ -2703,79 +2306,329 @@ def Admin_Dashboard(request):
         'notification_count': notification_count,
     }
     return render(request, 'Admin/Dashboard.html',context)
+def payment_date_range(filter_type, filter_value=None, from_date=None, to_date=None):
+    """
+    Date range of a Payments page time filter ('all', 'today', 'days' with a
+    number of days, or 'custom' with YYYY-MM-DD bounds).
+    Returns (start_date, end_date, description); start_date is None for all time.
+    """
+    today = datetime.now().date()
+    start_date = None
+    end_date = today
+    description = "All Time"
+    
+    if filter_type == 'today':
+        start_date = today
+        description = "Today"
+    elif filter_type == 'days' and filter_value:
+        days = int(filter_value)
+        start_date = today - timedelta(days=days)
+        description = f"Last {days} Days"
+    elif filter_type == 'custom' and from_date and to_date:
+        start_date = datetime.strptime(from_date, '%Y-%m-%d').date()
+        end_date = datetime.strptime(to_date, '%Y-%m-%d').date()
+        description = f"{start_date.strftime('%d %b %Y')} to {end_date.strftime('%d %b %Y')}"
+    
+    return start_date, end_date, description
+
+def filter_payments_by_date(payments, start_date, end_date):
+    if start_date:
+        payments = payments.filter(date__gte=start_date)
+    if end_date:
+        payments = payments.filter(date__lte=end_date)
+    return payments
+
+def _filter_payments_etag(request):
+    """
+    Validator of a GET filter_payments response: the finance data version, the
+    filter and the day (relative filters such as "7 days" move at midnight)
+    """
+    if request.method != 'GET' or 'user_id' not in request.session:
+        return None
+    params = '&'.join(f'{key}={request.GET.get(key, "")}' for key in ('type', 'value', 'fromDate', 'toDate'))
+    digest = hashlib.md5(f'{finance_version()}|{date.today()}|{params}'.encode()).hexdigest()
+    return f'"{digest}"'
+
+def _filter_payments_last_modified(request):
+    if request.method != 'GET' or 'user_id' not in request.session:
+        return None
+    # Midnight also changes the answer of relative filters
+    midnight = timezone.make_aware(datetime.combine(date.today(), datetime.min.time()))
+    return max(finance_last_modified(), midnight)
+
 @csrf_exempt
+@condition(etag_func=_filter_payments_etag, last_modified_func=_filter_payments_last_modified)
 def filter_payments(request):
-    if request.method != 'POST':
+    """
+    Revenue metrics for a time filter. GET takes the filter as query parameters
+    (type, value, fromDate, toDate) and answers conditional requests with 304
+    until the finance data changes; POST with a JSON body is still accepted.
+    """
+    if request.method not in ('GET', 'POST'):
         return JsonResponse({'success': False, 'error': 'Invalid request method'})
     
     if 'user_id' not in request.session:
         return JsonResponse({'success': False, 'error': 'Unauthorized'})
     
     try:
-        data = json.loads(request.body)
-        filter_type = data.get('type')
-        filter_value = data.get('value')
-        from_date = data.get('fromDate')
-        to_date = data.get('toDate')
-        
-        # Calculate date range based on filter
-        today = datetime.now().date()
-        start_date = None
-        end_date = today
-        filter_description = "All Time"
-        
-        if filter_type == 'today':
-            start_date = today
-            end_date = today
-            filter_description = "Today"
-        elif filter_type == 'days' and filter_value:
-            start_date = today - timedelta(days=filter_value)
-            filter_description = f"Last {filter_value} Days"
-        elif filter_type == 'custom' and from_date and to_date:
-            start_date = datetime.strptime(from_date, '%Y-%m-%d').date()
-            end_date = datetime.strptime(to_date, '%Y-%m-%d').date()
-            filter_description = f"{start_date.strftime('%d %b %Y')} to {end_date.strftime('%d %b %Y')}"
+        data = request.GET if request.method == 'GET' else json.loads(request.body)
+        start_date, end_date, filter_description = payment_date_range(
+            data.get('type'), data.get('value'), data.get('fromDate'), data.get('toDate')
+        )
         
         # Filter payments based on date range
-        payments = admin_models.Payments.objects.select_related(
-            'studentsession__student', 'studentsession__session', 'user'
-        ).all()
-        
-        if start_date:
-            payments = payments.filter(date__gte=start_date)
-        if end_date:
-            payments = payments.filter(date__lte=end_date)
+        payments = filter_payments_by_date(
+            admin_models.Payments.objects.select_related(
+                'studentsession__student', 'studentsession__session', 'user'
+            ),
+            start_date, end_date,
+        )
         
         # Recalculate metrics with filtered data
         filtered_data = calculate_revenue_metrics(payments, start_date, end_date)
         filtered_data['filter_description'] = filter_description
         
-        return JsonResponse({
+        response = JsonResponse({
             'success': True,
             'data': filtered_data
         })
+        # Let the browser keep the result but revalidate it (ETag) on every use
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
         
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
-def calculate_revenue_metrics(payments, start_date=None, end_date=None):
-    """Calculate revenue metrics for filtered payments"""
+REVENUE_SERIES_TRUNC = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+REVENUE_SERIES_SPLIT = {
+    'session': ('session_id', 'session__session_name'),
+    'collector': ('collector_id', 'collector__first_name', 'collector__last_name'),
+}
+
+def revenue_series(request):
+    """Revenue per day/week/month, optionally split by session or collector, for the trend charts"""
+    if 'user_id' not in request.session:
+        return JsonResponse({'success': False, 'error': 'Unauthorized'})
     
-    # Get all active students
-    students = admin_models.Student.objects.filter(status='Active')
+    granularity = request.GET.get('granularity', 'month')
+    split = request.GET.get('split') or None
+    if granularity not in REVENUE_SERIES_TRUNC:
+        return JsonResponse({'success': False, 'error': f'Unknown granularity: {granularity}'})
+    if split and split not in REVENUE_SERIES_SPLIT:
+        return JsonResponse({'success': False, 'error': f'Unknown split: {split}'})
+    
+    try:
+        rows = admin_models.DailyRevenue.objects.filter(day__isnull=False)
+        if request.GET.get('from'):
+            rows = rows.filter(day__gte=datetime.strptime(request.GET['from'], '%Y-%m-%d').date())
+        if request.GET.get('to'):
+            rows = rows.filter(day__lte=datetime.strptime(request.GET['to'], '%Y-%m-%d').date())
+        
+        # One GROUP BY over the rollup: (period[, session|collector]) -> revenue
+        group_by = ('period',) + REVENUE_SERIES_SPLIT.get(split, ())
+        rows = (
+            rows.annotate(period=REVENUE_SERIES_TRUNC[granularity]('day'))
+            .values(*group_by)
+            .annotate(revenue=Sum('amount'))
+            .order_by('period')
+        )
+        
+        labels = []
+        series = {}
+        for row in rows:
+            period = row['period'].isoformat()
+            if not labels or labels[-1] != period:
+                labels.append(period)
+            if split == 'session':
+                key, name = row['session_id'], row['session__session_name']
+            elif split == 'collector':
+                key, name = row['collector_id'], f"{row['collector__first_name']} {row['collector__last_name']}"
+            else:
+                key, name = None, 'Revenue'
+            values = series.setdefault(key, {'key': key, 'label': name, 'data': {}})['data']
+            values[period] = values.get(period, 0) + (row['revenue'] or 0)
+        
+        # Align every series on the shared labels, filling missing periods with 0
+        datasets = [
+            {'key': s['key'], 'label': s['label'], 'data': [s['data'].get(label, 0) for label in labels]}
+            for s in series.values()
+        ]
+        
+        return JsonResponse({
+            'success': True,
+            'data': {
+                'granularity': granularity,
+                'split': split,
+                'labels': labels,
+                'series': datasets,
+            }
+        })
+        
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+def session_leaderboard_view(request):
+    """Per-session revenue leaderboard for an optional from/to (YYYY-MM-DD) range"""
+    if 'user_id' not in request.session:
+        return JsonResponse({'success': False, 'error': 'Unauthorized'})
+    
+    try:
+        start_date = datetime.strptime(request.GET['from'], '%Y-%m-%d').date() if request.GET.get('from') else None
+        end_date = datetime.strptime(request.GET['to'], '%Y-%m-%d').date() if request.GET.get('to') else None
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+    
+    return JsonResponse({'success': True, 'data': session_leaderboard(start_date, end_date)})
+
+def collector_analytics_view(request):
+    """
+    Collections per staff member (totals, counts, average ticket, daily series)
+    for the filter_payments time filter given as query parameters.
+    """
+    if 'user_id' not in request.session:
+        return JsonResponse({'success': False, 'error': 'Unauthorized'})
     
-    # Calculate metrics
-    total_revenue = sum(p.amount or 0 for p in payments)
-    total_pending = sum(s.remaining_balance for s in students)
-    total_expected_revenue = sum(s.total_fee for s in students)
+    try:
+        start_date, end_date, description = payment_date_range(
+            request.GET.get('type'), request.GET.get('value'), request.GET.get('fromDate'), request.GET.get('toDate')
+        )
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
     
-    # Calculate collection rate
-    collection_rate = (total_revenue / total_expected_revenue * 100) if total_expected_revenue > 0 else 0
+    return JsonResponse({
+        'success': True,
+        'data': {
+            'filter_description': description,
+            'collectors': collector_analytics(start_date, end_date),
+        }
+    })
+
+def receivables_aging_view(request):
+    """Outstanding balances bucketed by days overdue, per session and institute-wide"""
+    if 'user_id' not in request.session:
+        return JsonResponse({'success': False, 'error': 'Unauthorized'})
+    
+    today = date.today()
+    aging = cached_finance('receivables-aging', lambda: receivables_aging(today), today)
+    return JsonResponse({'success': True, 'data': aging})
+
+# DataTables column index -> ordering field of Student.objects.with_financials()
+# (None: not orderable)
+STUDENT_FEES_ORDERING = [
+    'rollno',
+    'student_name',
+    None,  # sessions
+    'total_fee_db',
+    'total_paid_db',
+    'remaining_balance_db',
+    'payment_status_db',
+    None,  # actions
+]
+
+def student_fees_queryset(params):
+    """
+    Active students with their fee columns, searched and ordered as the DataTables
+    parameters in params ask. Returns (students, records_total, records_filtered);
+    raises ValueError on a malformed order column.
+    """
+    order_column = int(params.get('order[0][column]', 5))
+    order_dir = params.get('order[0][dir]', 'desc')
+    search = params.get('search[value]', '').strip()
+    
+    students = admin_models.Student.objects.filter(status='Active')
+    records_total = students.count()
+    
+    students = students.with_financials()
+    if search:
+        students = students.filter(
+            Q(student_name__icontains=search)
+            | Q(rollno__icontains=search)
+            | Q(payment_status_db__iexact=search)
+        )
+    records_filtered = students.count() if search else records_total
+    
+    order_field = STUDENT_FEES_ORDERING[order_column] if 0 <= order_column < len(STUDENT_FEES_ORDERING) else None
+    order_field = order_field or 'remaining_balance_db'
+    if order_dir == 'desc':
+        order_field = '-' + order_field
+    students = students.order_by(order_field, 'pk').prefetch_related(
+        Prefetch(
+            'student_sessions',
+            queryset=admin_models.StudentSession.objects.filter(status='Active').select_related('session'),
+            to_attr='active_sessions',
+        )
+    )
+    return students, records_total, records_filtered
+
+def student_fees_table(request):
+    """
+    Student fee table of the Payments page, in the DataTables server-side protocol:
+    paging, ordering and search by name/roll no (or payment status) run in the database.
+    """
+    if 'user_id' not in request.session:
+        return JsonResponse({'success': False, 'error': 'Unauthorized'})
     
-    # Student payment status
-    students_paid = sum(1 for s in students if s.remaining_balance == 0)
-    students_partial = sum(1 for s in students if 0 < s.remaining_balance < s.total_fee)
-    students_unpaid = sum(1 for s in students if s.remaining_balance == s.total_fee)
+    try:
+        draw = int(request.GET.get('draw', 0))
+        start = max(0, int(request.GET.get('start', 0)))
+        length = int(request.GET.get('length', 25))
+        students, records_total, records_filtered = student_fees_queryset(request.GET)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid paging parameters'})
+    # length=-1 is DataTables' "All"
+    page = students[start:start + length] if length > 0 else students[start:]
+    
+    data = [
+        {
+            'id': student.id,
+            'rollno': student.rollno or '',
+            'student_name': student.student_name or '',
+            'mobile_no': student.mobile_no or '',
+            'sessions': [enrollment.session.session_name for enrollment in student.active_sessions],
+            'total_fee': student.total_fee,
+            'paid': student.total_paid,
+            'remaining': student.remaining_balance,
+            'status': student.payment_status,
+        }
+        for student in page
+    ]
+    return JsonResponse({
+        'draw': draw,
+        'recordsTotal': records_total,
+        'recordsFiltered': records_filtered,
+        'data': data,
+    })
+
+def calculate_revenue_metrics(payments, start_date=None, end_date=None):
+    """
+    Calculate revenue metrics for filtered payments. payments must be the
+    Payments of the start_date..end_date range: the result is cached per range
+    until the next finance write.
+    """
+    today = datetime.now().date()
+    return cached_finance(
+        'revenue-metrics',
+        lambda: _calculate_revenue_metrics(payments, start_date, end_date),
+        start_date, end_date, today,
+    )
+
+
+REVENUE_METRICS = [
+    'total_revenue', 'total_pending', 'collection_rate', 'avg_payment', 'daily_revenue',
+    'active_students_count', 'overdue_students_count', 'projected_monthly_revenue',
+    'students_paid', 'students_partial', 'students_unpaid',
+]
+
+def _calculate_revenue_metrics(payments, start_date=None, end_date=None):
+    # KPIs are declared in Admin.metrics: one aggregate query per source table
+    # (DailyRevenue over the range, active students, overdue enrollments)
+    today = datetime.now().date()
+    values = compute_metrics(REVENUE_METRICS, start_date, end_date, today)
     
     # Recent payments (limited to filtered data)
     recent_payments = payments.order_by('-date', '-id')[:10]
@@ -2790,250 +2643,380 @@ def calculate_revenue_metrics(payments, start_date=None, end_date=None):
             'collected_by': f"{payment.user.first_name} {payment.user.last_name}" if payment.user else ''
         })
     
-    # Session performance
-    session_revenue = {}
-    for payment in payments:
-        if payment.studentsession and payment.studentsession.session:
-            session_name = payment.studentsession.session.session_name
-            session_revenue[session_name] = session_revenue.get(session_name, 0) + (payment.amount or 0)
-    
-    session_performance = []
-    for session_name, revenue in session_revenue.items():
-        session_obj = admin_models.Sessions.objects.filter(session_name=session_name).first()
-        if session_obj:
-            student_count = admin_models.StudentSession.objects.filter(session=session_obj, status='Active').count()
-            session_performance.append({
-                'name': session_name,
-                'revenue': float(revenue),
-                'students': student_count,
-                'avg_per_student': float(revenue / student_count) if student_count > 0 else 0
-            })
-    
-    session_performance.sort(key=lambda x: x['revenue'], reverse=True)
-    
-    # Calculate other metrics
-    today = datetime.now().date()
-    daily_revenue = sum(p.amount or 0 for p in payments if p.date == today)
-    avg_payment = total_revenue / len(payments) if payments else 0
-    
-    # Count overdue students
-    overdue_students_count = 0
-    for student in students:
-        if student.remaining_balance > 0:
-            student_sessions_list = student.student_sessions.filter(status='Active')
-            for session in student_sessions_list:
-                if session.due_date and session.due_date < today:
-                    overdue_students_count += 1
-                    break
-    
-    # Projected monthly revenue
-    days_in_month = today.day
-    if days_in_month > 0:
-        monthly_revenue = sum(p.amount or 0 for p in payments if p.date and p.date.month == today.month and p.date.year == today.year)
-        daily_avg = monthly_revenue / days_in_month
-        days_remaining = 30 - days_in_month
-        projected_monthly_revenue = monthly_revenue + (daily_avg * days_remaining)
-    else:
-        projected_monthly_revenue = 0
+    # Session performance, grouped by session id in one query
+    session_performance = [
+        {**row, 'revenue': float(row['revenue']), 'avg_per_student': float(row['avg_per_student'])}
+        for row in session_leaderboard(start_date, end_date)
+    ]
     
     return {
-        'total_revenue': float(total_revenue),
-        'total_pending': float(total_pending),
-        'collection_rate': round(collection_rate, 1),
-        'avg_payment': float(avg_payment),
-        'daily_revenue': float(daily_revenue),
-        'active_students_count': len(students),
-        'overdue_students_count': overdue_students_count,
-        'projected_monthly_revenue': float(projected_monthly_revenue),
-        'students_paid': students_paid,
-        'students_partial': students_partial,
-        'students_unpaid': students_unpaid,
+        'total_revenue': float(values['total_revenue']),
+        'total_pending': float(values['total_pending']),
+        'collection_rate': values['collection_rate'],
+        'avg_payment': float(values['avg_payment']),
+        'daily_revenue': float(values['daily_revenue']),
+        'active_students_count': values['active_students_count'],
+        'overdue_students_count': values['overdue_students_count'],
+        'projected_monthly_revenue': float(values['projected_monthly_revenue']),
+        'students_paid': values['students_paid'],
+        'students_partial': values['students_partial'],
+        'students_unpaid': values['students_unpaid'],
         'recent_payments': recent_payments_data,
         'session_performance': session_performance
     }
 
-@csrf_exempt
-def export_word_report(request):
-    if request.method != 'POST':
-        return HttpResponse('Invalid request method', status=405)
+PAYMENTS_EXPORT_CHUNK_SIZE = 2000
+
+PAYMENTS_EXPORT_COLUMNS = [
+    ('Payment ID', 'id'),
+    ('Date', 'date'),
+    ('Amount', 'amount'),
+    ('Roll No', 'studentsession__student__rollno'),
+    ('Student', 'studentsession__student__student_name'),
+    ('Father Name', 'studentsession__student__father_name'),
+    ('Session', 'studentsession__session__session_name'),
+    ('Collected By (First Name)', 'user__first_name'),
+    ('Collected By (Last Name)', 'user__last_name'),
+]
+
+class _Echo:
+    """File-like object whose write() hands the line back to the csv writer"""
+    def write(self, value):
+        return value
+
+def export_payments_csv(request):
+    """
+    Stream the whole payments ledger as CSV. Accepts the filter_payments time
+    filter as query parameters (type, value, fromDate, toDate). Rows are read in
+    chunks and written as they are produced, so memory does not grow with the ledger.
+    """
+    if 'user_id' not in request.session:
+        return HttpResponse('Unauthorized', status=401)
     
+    try:
+        start_date, end_date, _ = payment_date_range(
+            request.GET.get('type'), request.GET.get('value'), request.GET.get('fromDate'), request.GET.get('toDate')
+        )
+    except ValueError as e:
+        return HttpResponse(f'Invalid filter: {e}', status=400)
+    
+    rows = (
+        filter_payments_by_date(admin_models.Payments.objects.all(), start_date, end_date)
+        .order_by('date', 'id')
+        .values_list(*[field for _, field in PAYMENTS_EXPORT_COLUMNS])
+        .iterator(chunk_size=PAYMENTS_EXPORT_CHUNK_SIZE)
+    )
+    writer = csv.writer(_Echo())
+    
+    def lines():
+        yield writer.writerow([header for header, _ in PAYMENTS_EXPORT_COLUMNS])
+        for row in rows:
+            yield writer.writerow(row)
+    
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="Payments_Ledger_{date.today().isoformat()}.csv"'
+    return response
+
+def export_student_fees_csv(request):
+    """
+    Stream the Payments page revenue report as CSV: the dashboard summary, every
+    student of the fee table (with the table's search and ordering, not just the
+    page on screen) and the session revenue breakdown. Students are read in chunks.
+    """
     if 'user_id' not in request.session:
         return HttpResponse('Unauthorized', status=401)
     
     try:
-        data = json.loads(request.body)
-        filter_data = data.get('filter', {})
-        
-        # Get filtered payments
-        filter_type = filter_data.get('type')
-        filter_value = filter_data.get('value')
-        from_date = filter_data.get('fromDate')
-        to_date = filter_data.get('toDate')
-        
-        # Calculate date range
-        today = datetime.now().date()
-        start_date = None
-        end_date = today
-        period_description = "All Time"
-        
-        if filter_type == 'today':
-            start_date = today
-            end_date = today
-            period_description = "Today"
-        elif filter_type == 'days' and filter_value:
-            start_date = today - timedelta(days=filter_value)
-            period_description = f"Last {filter_value} Days"
-        elif filter_type == 'custom' and from_date and to_date:
-            start_date = datetime.strptime(from_date, '%Y-%m-%d').date()
-            end_date = datetime.strptime(to_date, '%Y-%m-%d').date()
-            period_description = f"{start_date.strftime('%d %b %Y')} to {end_date.strftime('%d %b %Y')}"
-        
-        # Filter payments
-        payments = admin_models.Payments.objects.select_related(
+        students, _, _ = student_fees_queryset(request.GET)
+    except ValueError:
+        return HttpResponse('Invalid ordering parameters', status=400)
+    today = date.today()
+    summary = cached_finance('payments-page', PaymentDashboardService(today).build, today)
+    period = request.GET.get('period') or 'All Time'
+    writer = csv.writer(_Echo())
+    
+    def lines():
+        yield writer.writerow(['IQRA ACADEMY - REVENUE REPORT'])
+        yield writer.writerow(['Generated on:', today.isoformat()])
+        yield writer.writerow(['Period:', period])
+        yield writer.writerow([])
+        yield writer.writerow(['SUMMARY METRICS'])
+        yield writer.writerow(['Total Revenue Collected:', f"Rs. {summary['total_revenue']:.0f}"])
+        yield writer.writerow(['Outstanding Receivables:', f"Rs. {summary['total_pending']:.0f}"])
+        yield writer.writerow(['Collection Rate:', f"{summary['collection_rate']}%"])
+        yield writer.writerow(['Total Students:', summary['total_students']])
+        yield writer.writerow(['Active Students:', summary['active_students_count']])
+        yield writer.writerow(['Students Fully Paid:', summary['students_paid']])
+        yield writer.writerow(['Students Partially Paid:', summary['students_partial']])
+        yield writer.writerow(['Students Unpaid:', summary['students_unpaid']])
+        yield writer.writerow([])
+        yield writer.writerow(['STUDENT PAYMENT DETAILS'])
+        yield writer.writerow(['Roll No', 'Student Name', 'Mobile', 'Sessions', 'Total Fee', 'Paid Amount', 'Remaining', 'Status'])
+        for student in students.iterator(chunk_size=PAYMENTS_EXPORT_CHUNK_SIZE):
+            yield writer.writerow([
+                student.rollno or '',
+                student.student_name or '',
+                student.mobile_no or '',
+                '; '.join(enrollment.session.session_name for enrollment in student.active_sessions),
+                student.total_fee,
+                student.total_paid,
+                student.remaining_balance,
+                student.payment_status,
+            ])
+        yield writer.writerow([])
+        yield writer.writerow(['SESSION REVENUE BREAKDOWN'])
+        yield writer.writerow(['Session Name', 'Revenue Amount'])
+        for name, amount in summary['top_sessions']:
+            yield writer.writerow([name, f'Rs. {amount:.0f}'])
+    
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    slug = period.lower().replace(' ', '_')
+    response['Content-Disposition'] = f'attachment; filename="iqra_academy_revenue_report_{slug}_{today.isoformat()}.csv"'
+    return response
+
+def build_revenue_word_report(filter_data):
+    """Render the revenue report for a payments filter; returns (filename, docx bytes)"""
+    # Payments in the requested period
+    start_date, end_date, period_description = payment_date_range(
+        filter_data.get('type'), filter_data.get('value'), filter_data.get('fromDate'), filter_data.get('toDate')
+    )
+    payments = filter_payments_by_date(
+        admin_models.Payments.objects.select_related(
             'studentsession__student', 'studentsession__session', 'user'
-        ).all()
-        
-        if start_date:
-            payments = payments.filter(date__gte=start_date)
-        if end_date:
-            payments = payments.filter(date__lte=end_date)
-        
-        # Get metrics
-        metrics = calculate_revenue_metrics(payments, start_date, end_date)
-        
-        # Create Word document
-        doc = Document()
-        
-        # Add title
-        title = doc.add_heading('IQRA ACADEMY', 0)
-        title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        
-        subtitle = doc.add_heading('Revenue Report', level=1)
-        subtitle.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        
-        # Add report details
-        doc.add_paragraph(f"Report Period: {period_description}")
-        doc.add_paragraph(f"Generated on: {datetime.now().strftime('%d %B %Y at %I:%M %p')}")
-        doc.add_paragraph("")
-        
-        # Executive Summary
-        doc.add_heading('Executive Summary', level=2)
-        summary_table = doc.add_table(rows=5, cols=2)
-        summary_table.style = 'Table Grid'
-        
-        summary_data = [
-            ('Total Revenue Collected', f"Rs. {metrics['total_revenue']:,.0f}"),
-            ('Outstanding Receivables', f"Rs. {metrics['total_pending']:,.0f}"),
-            ('Collection Efficiency', f"{metrics['collection_rate']}%"),
-            ('Average Payment Size', f"Rs. {metrics['avg_payment']:,.0f}"),
-            ('Active Students', str(metrics['active_students_count']))
-        ]
-        
-        for i, (label, value) in enumerate(summary_data):
-            summary_table.cell(i, 0).text = label
-            summary_table.cell(i, 1).text = value
-        
-        doc.add_paragraph("")
-        
-        # Student Analysis
-        doc.add_heading('Student Payment Analysis', level=2)
-        student_table = doc.add_table(rows=4, cols=2)
-        student_table.style = 'Table Grid'
-        
-        student_data = [
-            ('Students with Full Payment', str(metrics['students_paid'])),
-            ('Students with Partial Payment', str(metrics['students_partial'])),
-            ('Students with No Payment', str(metrics['students_unpaid'])),
-            ('Students with Overdue Payments', str(metrics['overdue_students_count']))
-        ]
-        
-        for i, (label, value) in enumerate(student_data):
-            student_table.cell(i, 0).text = label
-            student_table.cell(i, 1).text = value
-        
-        doc.add_paragraph("")
-        
-        # Session Performance
-        if metrics['session_performance']:
-            doc.add_heading('Session Performance', level=2)
-            session_table = doc.add_table(rows=len(metrics['session_performance']) + 1, cols=4)
-            session_table.style = 'Table Grid'
-            
-            # Headers
-            headers = ['Session Name', 'Revenue', 'Students', 'Avg per Student']
-            for i, header in enumerate(headers):
-                session_table.cell(0, i).text = header
-            
-            # Data
-            for i, session in enumerate(metrics['session_performance'][:10]):
-                session_table.cell(i + 1, 0).text = session['name']
-                session_table.cell(i + 1, 1).text = f"Rs. {session['revenue']:,.0f}"
-                session_table.cell(i + 1, 2).text = str(session['students'])
-                session_table.cell(i + 1, 3).text = f"Rs. {session['avg_per_student']:,.0f}"
-        
-        doc.add_paragraph("")
-        
-        # Recent Payments
-        if metrics['recent_payments']:
-            doc.add_heading('Recent Payments', level=2)
-            payments_table = doc.add_table(rows=min(len(metrics['recent_payments']), 20) + 1, cols=5)
-            payments_table.style = 'Table Grid'
-            
-            # Headers
-            headers = ['Date', 'Student', 'Session', 'Amount', 'Collected By']
-            for i, header in enumerate(headers):
-                payments_table.cell(0, i).text = header
-            
-            # Data
-            for i, payment in enumerate(metrics['recent_payments'][:20]):
-                payments_table.cell(i + 1, 0).text = datetime.fromisoformat(payment['date']).strftime('%d %b %Y') if payment['date'] else ''
-                payments_table.cell(i + 1, 1).text = payment['student_name']
-                payments_table.cell(i + 1, 2).text = payment['session_name']
-                payments_table.cell(i + 1, 3).text = f"Rs. {payment['amount']:,.0f}"
-                payments_table.cell(i + 1, 4).text = payment['collected_by']
+        ),
+        start_date, end_date,
+    )
+    
+    # Get metrics
+    metrics = calculate_revenue_metrics(payments, start_date, end_date)
+    
+    # Create Word document
+    doc = Document()
+    
+    # Add title
+    title = doc.add_heading('IQRA ACADEMY', 0)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    
+    subtitle = doc.add_heading('Revenue Report', level=1)
+    subtitle.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    
+    # Add report details
+    doc.add_paragraph(f"Report Period: {period_description}")
+    doc.add_paragraph(f"Generated on: {datetime.now().strftime('%d %B %Y at %I:%M %p')}")
+    doc.add_paragraph("")
+    
+    # Executive Summary
+    doc.add_heading('Executive Summary', level=2)
+    summary_table = doc.add_table(rows=5, cols=2)
+    summary_table.style = 'Table Grid'
+    
+    summary_data = [
+        ('Total Revenue Collected', f"Rs. {metrics['total_revenue']:,.0f}"),
+        ('Outstanding Receivables', f"Rs. {metrics['total_pending']:,.0f}"),
+        ('Collection Efficiency', f"{metrics['collection_rate']}%"),
+        ('Average Payment Size', f"Rs. {metrics['avg_payment']:,.0f}"),
+        ('Active Students', str(metrics['active_students_count']))
+    ]
+    
+    for i, (label, value) in enumerate(summary_data):
+        summary_table.cell(i, 0).text = label
+        summary_table.cell(i, 1).text = value
+    
+    doc.add_paragraph("")
+    
+    # Student Analysis
+    doc.add_heading('Student Payment Analysis', level=2)
+    student_table = doc.add_table(rows=4, cols=2)
+    student_table.style = 'Table Grid'
+    
+    student_data = [
+        ('Students with Full Payment', str(metrics['students_paid'])),
+        ('Students with Partial Payment', str(metrics['students_partial'])),
+        ('Students with No Payment', str(metrics['students_unpaid'])),
+        ('Students with Overdue Payments', str(metrics['overdue_students_count']))
+    ]
+    
+    for i, (label, value) in enumerate(student_data):
+        student_table.cell(i, 0).text = label
+        student_table.cell(i, 1).text = value
+    
+    doc.add_paragraph("")
+    
+    # Session Performance
+    if metrics['session_performance']:
+        doc.add_heading('Session Performance', level=2)
+        top_sessions = metrics['session_performance'][:10]
+        session_table = doc.add_table(rows=len(top_sessions) + 1, cols=5)
+        session_table.style = 'Table Grid'
+        
+        # Headers
+        headers = ['Session Name', 'Revenue', 'Students', 'Avg per Student', 'Collection Rate']
+        for i, header in enumerate(headers):
+            session_table.cell(0, i).text = header
+        
+        # Data
+        for i, session in enumerate(top_sessions):
+            session_table.cell(i + 1, 0).text = session['name']
+            session_table.cell(i + 1, 1).text = f"Rs. {session['revenue']:,.0f}"
+            session_table.cell(i + 1, 2).text = str(session['students'])
+            session_table.cell(i + 1, 3).text = f"Rs. {session['avg_per_student']:,.0f}"
+            session_table.cell(i + 1, 4).text = f"{session['collection_rate']}%"
+    
+    doc.add_paragraph("")
+    
+    # Receivables Aging
+    aging = receivables_aging()
+    if aging['sessions']:
+        doc.add_heading('Receivables Aging', level=2)
+        doc.add_paragraph(f"Outstanding balances by days past due, as of {date.today().strftime('%d %b %Y')}")
+        aging_rows = aging['sessions'] + [{'name': 'Total', **aging['totals']}]
+        aging_table = doc.add_table(rows=len(aging_rows) + 1, cols=len(aging['buckets']) + 2)
+        aging_table.style = 'Table Grid'
+        
+        # Headers
+        headers = ['Session'] + [bucket['label'] for bucket in aging['buckets']] + ['Total']
+        for i, header in enumerate(headers):
+            aging_table.cell(0, i).text = header
+        
+        # Data
+        for i, row in enumerate(aging_rows):
+            aging_table.cell(i + 1, 0).text = row['name']
+            for j, bucket in enumerate(aging['buckets']):
+                aging_table.cell(i + 1, j + 1).text = f"Rs. {row[bucket['key']]:,.0f}"
+            aging_table.cell(i + 1, len(headers) - 1).text = f"Rs. {row['total']:,.0f}"
         
         doc.add_paragraph("")
+    
+    # Recent Payments
+    if metrics['recent_payments']:
+        doc.add_heading('Recent Payments', level=2)
+        payments_table = doc.add_table(rows=min(len(metrics['recent_payments']), 20) + 1, cols=5)
+        payments_table.style = 'Table Grid'
         
-        # Recommendations
-        doc.add_heading('Recommendations', level=2)
-        recommendations = []
-        
-        if metrics['collection_rate'] < 70:
-            recommendations.append("• Collection rate is below 70% - Consider implementing automated payment reminders")
-            recommendations.append("• Follow up with students having overdue payments")
-        
-        if metrics['students_unpaid'] > 0:
-            recommendations.append(f"• {metrics['students_unpaid']} students have not made any payments - Immediate attention required")
-        
-        if metrics['overdue_students_count'] > 0:
-            recommendations.append(f"• {metrics['overdue_students_count']} students have overdue payments - Send payment reminders")
-        
-        recommendations.extend([
-            "• Consider offering flexible payment plans for students with large outstanding amounts",
-            "• Regular monthly collection drives can improve cash flow",
-            "• Implement early payment discounts to encourage prompt payments"
-        ])
-        
-        for rec in recommendations:
-            doc.add_paragraph(rec)
+        # Headers
+        headers = ['Date', 'Student', 'Session', 'Amount', 'Collected By']
+        for i, header in enumerate(headers):
+            payments_table.cell(0, i).text = header
         
-        # Save to BytesIO
-        doc_io = BytesIO()
-        doc.save(doc_io)
-        doc_io.seek(0)
+        # Data
+        for i, payment in enumerate(metrics['recent_payments'][:20]):
+            payments_table.cell(i + 1, 0).text = datetime.fromisoformat(payment['date']).strftime('%d %b %Y') if payment['date'] else ''
+            payments_table.cell(i + 1, 1).text = payment['student_name']
+            payments_table.cell(i + 1, 2).text = payment['session_name']
+            payments_table.cell(i + 1, 3).text = f"Rs. {payment['amount']:,.0f}"
+            payments_table.cell(i + 1, 4).text = payment['collected_by']
+    
+    doc.add_paragraph("")
+    
+    # Recommendations
+    doc.add_heading('Recommendations', level=2)
+    recommendations = []
+    
+    if metrics['collection_rate'] < 70:
+        recommendations.append("• Collection rate is below 70% - Consider implementing automated payment reminders")
+        recommendations.append("• Follow up with students having overdue payments")
+    
+    if metrics['students_unpaid'] > 0:
+        recommendations.append(f"• {metrics['students_unpaid']} students have not made any payments - Immediate attention required")
+    
+    if metrics['overdue_students_count'] > 0:
+        recommendations.append(f"• {metrics['overdue_students_count']} students have overdue payments - Send payment reminders")
+    
+    recommendations.extend([
+        "• Consider offering flexible payment plans for students with large outstanding amounts",
+        "• Regular monthly collection drives can improve cash flow",
+        "• Implement early payment discounts to encourage prompt payments"
+    ])
+    
+    for rec in recommendations:
+        doc.add_paragraph(rec)
+    
+    # Save to BytesIO
+    doc_io = BytesIO()
+    doc.save(doc_io)
+
+    filename = f'Revenue_Report_{period_description.replace(" ", "_")}_{datetime.now().strftime("%Y%m%d")}.docx'
+    return filename, doc_io.getvalue()
+
+@csrf_exempt
+def export_word_report(request):
+    if request.method != 'POST':
+        return HttpResponse('Invalid request method', status=405)
+    
+    if 'user_id' not in request.session:
+        return HttpResponse('Unauthorized', status=401)
+    
+    try:
+        data = json.loads(request.body)
+        filename, content = build_revenue_word_report(data.get('filter', {}))
         
-        # Create response
         response = HttpResponse(
-            doc_io.getvalue(),
+            content,
             content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
         )
-        response['Content-Disposition'] = f'attachment; filename="Revenue_Report_{period_description.replace(" ", "_")}_{today.strftime("%Y%m%d")}.docx"'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
         
         return response
         
     except Exception as e:
         return HttpResponse(f'Error generating report: {str(e)}', status=500)
 
+def report_job_payload(job):
+    payload = {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'error': job.error,
+        'download_url': None,
+    }
+    if job.status == 'Done':
+        payload['download_url'] = reverse('download_report', args=[job.id])
+    return payload
+
+@csrf_exempt
+def enqueue_report_job(request):
+    """Queue a report for the run_report_jobs worker (or hand back an identical finished one)"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+
+    if 'user_id' not in request.session:
+        return JsonResponse({'success': False, 'error': 'Unauthorized'}, status=401)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+
+    kind = data.get('kind', 'revenue_word')
+    if kind not in dict(admin_models.ReportJob.KIND_CHOICES):
+        return JsonResponse({'success': False, 'error': f'Unknown report: {kind}'}, status=400)
+
+    user = User.objects.filter(id=request.session['user_id']).first()
+    job = enqueue_report(kind, data.get('filter', {}), user)
+    return JsonResponse({'success': True, 'job': report_job_payload(job)})
+
+def report_job_status(request, job_id):
+    if 'user_id' not in request.session:
+        return JsonResponse({'success': False, 'error': 'Unauthorized'}, status=401)
+
+    user = User.objects.filter(id=request.session['user_id']).first()
+    job = visible_jobs(user).filter(id=job_id).defer('content').first()
+    if job is None:
+        return JsonResponse({'success': False, 'error': 'Report not found'}, status=404)
+    return JsonResponse({'success': True, 'job': report_job_payload(job)})
+
+def download_report(request, job_id):
+    if 'user_id' not in request.session:
+        return HttpResponse('Unauthorized', status=401)
+
+    user = User.objects.filter(id=request.session['user_id']).first()
+    job = visible_jobs(user).filter(id=job_id, status='Done').first()
+    if job is None:
+        return HttpResponse('Report not found', status=404)
+    return FileResponse(BytesIO(job.content), as_attachment=True, filename=job.filename)
+
 @csrf_exempt
 def get_email_statistics(request):
     """Get real-time email statistics for the Email Services dashboard"""
@@ -3041,7 +3024,6 @@ def get_email_statistics(request):
         return JsonResponse({'status': 'error', 'message': 'Not authenticated'})
     
     try:
-        from django.db.models import Count, Q
         from datetime import datetime, timedelta
         
         # Get current date for calculations
@@ -3067,38 +3049,37 @@ def get_email_statistics(request):
         
         total_recipients = total_students + total_faculty + total_leads
         
-        # Calculate students with pending fees (for reminder notifications)
-        students_with_pending = admin_models.Student.objects.filter(
+        # Fee balances of the students reachable by email
+        fees = FeeSnapshot.build(admin_models.Student.objects.filter(
             status='Active',
             email__isnull=False,
             email__gt=''
-        ).annotate(
-            unpaid_count=Count('student_sessions__student_payments', 
-                             filter=Q(student_sessions__student_payments__amount=0))
-        ).filter(unpaid_count__gt=0).count()
+        ))
         
-        # Calculate overdue students (those with payments past due date)
-        overdue_students = admin_models.Student.objects.filter(
-            status='Active',
-            email__isnull=False,
-            email__gt='',
-            student_sessions__student_payments__amount=0,
-            student_sessions__student_payments__date__lt=today
-        ).distinct().count()
-        
-        # Get recent notifications for email activity simulation
-        recent_notifications = admin_models.Notification.objects.filter(
-            date__gte=thirty_days_ago,
-            category__in=['Late Fee', 'General', 'New Entry']
-        ).count()
-        
-        # Simulate email statistics based on available data
-        # In a real system, you'd track actual email sends in a separate model
-        estimated_emails_sent = recent_notifications + (students_with_pending * 2)  # Assume 2 reminders per pending student
-        delivery_success_rate = 95.5  # Typical email delivery rate
+        # Calculate students with pending fees (for reminder notifications)
+        students_with_pending = fees.pending_count()
+        
+        # Calculate overdue students (money outstanding on an enrollment past its next due date)
+        overdue_students = admin_models.StudentSession.objects.filter(
+            student__status='Active',
+            student__email__isnull=False,
+            student__email__gt=''
+        ).overdue_totals(today)['students']
+        
+        # Email activity from the per-day counters the outbox maintains (one row per day and kind)
+        counters = admin_models.EmailDailyStats.objects.aggregate(
+            queued=Coalesce(Sum('queued'), 0),
+            sent=Coalesce(Sum('sent'), 0),
+            failed=Coalesce(Sum('failed'), 0),
+            recent_sent=Coalesce(Sum('sent', filter=Q(day__gte=thirty_days_ago)), 0),
+        )
+        finished = counters['sent'] + counters['failed']
+        delivery_success_rate = round(counters['sent'] / finished * 100, 1) if finished else 0
         
         statistics = {
-            'total_emails_sent': estimated_emails_sent,
+            'total_emails_sent': counters['sent'],
+            'total_emails_failed': counters['failed'],
+            'emails_in_queue': counters['queued'] - finished,
             'delivery_success_rate': delivery_success_rate,
             'pending_reminders': students_with_pending,
             'total_recipients': total_recipients,
@@ -3109,7 +3090,7 @@ def get_email_statistics(request):
             },
             'overdue_students': overdue_students,
             'recent_activity': {
-                'last_30_days': recent_notifications,
+                'last_30_days': counters['recent_sent'],
                 'pending_notifications': students_with_pending
             }
         }
@@ -3125,84 +3106,70 @@ def get_email_statistics(request):
              'message': f'Error fetching email statistics: {str(e)}'
          })
 
+EMAIL_RECIPIENT_TYPES = {
+    'fee_reminder': 'Students',
+    'broadcast': 'Mailing List',
+}
+
 @csrf_exempt
 def get_email_history(request):
-    """Get recent email activity for the Email Services dashboard"""
+    """Recent outgoing emails for the Email Services dashboard, one row per queued message"""
     if 'user_id' not in request.session:
         return JsonResponse({'status': 'error', 'message': 'Not authenticated'})
     
     try:
-        from django.db.models import Q
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        # Get current user for sent_by field
-        current_user = User.objects.get(id=request.session['user_id'])
-        
-        # Get recent notifications that represent email activity
-        recent_notifications = admin_models.Notification.objects.filter(
-            category__in=['Late Fee', 'General', 'New Entry']
-        ).order_by('-date')[:20]
+        # A broadcast is listed once, by its first chunk
+        recent_messages = list(
+            admin_models.OutboxEmail.objects.filter(chunk__lte=1)
+            .select_related('created_by').order_by('-created_at', '-id')[:20]
+        )
+        # Delivery per recipient, from the email log of just these messages (and broadcasts)
+        delivery_counts = dict(
+            recipients=Count('id'),
+            sent=Count('id', filter=Q(status='Sent')),
+            failed=Count('id', filter=Q(status='Failed')),
+        )
+        delivery = {
+            row['outbox_id']: row
+            for row in admin_models.EmailLog.objects.filter(
+                outbox__in=[message for message in recent_messages if not message.broadcast_id]
+            )
+            .order_by()
+            .values('outbox_id')
+            .annotate(**delivery_counts)
+        }
+        broadcast_delivery = {
+            row['outbox__broadcast_id']: row
+            for row in admin_models.EmailLog.objects.filter(
+                outbox__broadcast__in=[message.broadcast_id for message in recent_messages if message.broadcast_id]
+            )
+            .order_by()
+            .values('outbox__broadcast_id')
+            .annotate(**delivery_counts)
+        }
         
         email_history = []
-        now = timezone.now()
-        
-        for notification in recent_notifications:
-            # Simulate email activity based on notifications
-            if notification.category == 'Late Fee':
-                email_type = 'Payment Reminder'
-                recipient_type = 'Students'
-                recipients_count = '15-25'
-            elif notification.category == 'General':
-                email_type = 'General Notification'
-                recipient_type = 'Faculty'
-                recipients_count = '8-12'
+        for message in recent_messages:
+            if message.broadcast_id:
+                counts = broadcast_delivery.get(message.broadcast_id)
             else:
-                email_type = 'Welcome Message'
-                recipient_type = 'Students'
-                recipients_count = '10-20'
-            
-            # Use timezone-aware comparison
-            status = 'Delivered' if notification.date < now - timedelta(hours=1) else 'Pending'
-            
+                counts = delivery.get(message.id)
+            counts = counts or {'recipients': len(message.all_recipients), 'sent': 0, 'failed': 0}
+            if counts['sent'] == counts['recipients']:
+                status = 'Delivered'
+            elif counts['failed'] == counts['recipients']:
+                status = 'Failed'
+            else:
+                status = 'Pending'
             email_history.append({
-                'date': notification.date.strftime('%d %b %Y'),
-                'subject': f'{email_type} - {notification.date.strftime("%B %Y")}',
-                'recipients': recipients_count,
-                'recipient_type': recipient_type,
+                'date': timezone.localtime(message.created_at).strftime('%d %b %Y'),
+                'subject': message.subject,
+                'recipients': str(counts['recipients']),
+                'recipient_type': EMAIL_RECIPIENT_TYPES.get(message.kind, 'Recipients'),
                 'status': status,
-                'sent_by': f'{current_user.first_name} {current_user.last_name}'
+                'sent_by': f'{message.created_by.first_name} {message.created_by.last_name}' if message.created_by else '',
             })
         
-        # If no notifications, provide some sample data
-        if not email_history:
-            email_history = [
-                {
-                    'date': now.strftime('%d %b %Y'),
-                    'subject': 'Payment Reminder - Current Month',
-                    'recipients': '23',
-                    'recipient_type': 'Students',
-                    'status': 'Delivered',
-                    'sent_by': f'{current_user.first_name} {current_user.last_name}'
-                },
-                {
-                    'date': (now - timedelta(days=1)).strftime('%d %b %Y'),
-                    'subject': 'Welcome to New Session',
-                    'recipients': '15',
-                    'recipient_type': 'Students',
-                    'status': 'Delivered',
-                    'sent_by': f'{current_user.first_name} {current_user.last_name}'
-                },
-                {
-                    'date': (now - timedelta(days=7)).strftime('%d %b %Y'),
-                    'subject': 'Faculty Meeting Reminder',
-                    'recipients': '8',
-                    'recipient_type': 'Faculty',
-                    'status': 'Delivered',
-                    'sent_by': f'{current_user.first_name} {current_user.last_name}'
-                }
-            ]
-        
         return JsonResponse({
             'status': 'success',
             'data': email_history
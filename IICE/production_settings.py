@@ -37,8 +37,20 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'Admin.middleware.SessionStatusMiddleware',
+    'Admin.middleware.MemoScopeMiddleware',
 ]
 
+# Cache in the database, the one store the web, mail, reports and clock
+# processes share across containers: a finance write or a management command
+# in any of them invalidates the dashboard metrics cached by the others.
+# The table is created by "manage.py createcachetable" in the release step.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': config('CACHE_TABLE', default='django_cache'),
+    }
+}
+
 # Static files storage
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
@@ -57,6 +69,12 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default=EMAIL_HOST_USER)
 EMAIL_TIMEOUT = 30
 
+# send_outbox worker: SMTP connections in parallel and the provider's send quota
+# in recipients per second (a BCC broadcast chunk counts once per address)
+OUTBOX_THREADS = config('OUTBOX_THREADS', default=4, cast=int)
+OUTBOX_MAX_PER_SECOND = config('OUTBOX_MAX_PER_SECOND', default=5, cast=float)
+OUTBOX_BCC_CHUNK_SIZE = config('OUTBOX_BCC_CHUNK_SIZE', default=50, cast=int)
+
 # Security settings for production
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
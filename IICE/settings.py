@@ -85,6 +85,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'Admin.middleware.SessionStatusMiddleware',
+    'Admin.middleware.MemoScopeMiddleware',
 ]
 
 ROOT_URLCONF = 'IICE.urls'
@@ -108,6 +109,14 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'IICE.wsgi.application'
 
+# Cached dashboard metrics (Admin.dashboard.cached_finance)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'iice',
+    }
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
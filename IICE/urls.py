@@ -85,6 +85,7 @@ urlpatterns = [
     path('Admin-EmailService/', adminViews.EmailService, name='EmailService'),
     path('get-email-statistics/', adminViews.get_email_statistics, name='get_email_statistics'),
     path('get-email-history/', adminViews.get_email_history, name='get_email_history'),
+    path('email-broadcasts/<int:broadcast_id>/progress/', adminViews.email_broadcast_progress, name='email_broadcast_progress'),
     path('notify-late-fee-students/', adminViews.notify_late_fee_students, name='notify_late_fee_students'),
     path('send-fee-reminder/', adminViews.send_fee_reminder, name='send_fee_reminder'),
     path('send-bulk-fee-reminders/', adminViews.notify_late_fee_students, name='send_bulk_fee_reminders'),
@@ -92,6 +93,16 @@ urlpatterns = [
     path('Admin-Students/<int:studentid>/mark-installment-paid/', adminViews.mark_installment_paid, name='mark_installment_paid'),
     path('payments/filter/', adminViews.filter_payments, name='filter_payments'),
     path('payments/export-word/', adminViews.export_word_report, name='export_word_report'),
+    path('payments/export-csv/', adminViews.export_payments_csv, name='export_payments_csv'),
+    path('payments/reports/', adminViews.enqueue_report_job, name='enqueue_report_job'),
+    path('payments/reports/<int:job_id>/', adminViews.report_job_status, name='report_job_status'),
+    path('payments/reports/<int:job_id>/download/', adminViews.download_report, name='download_report'),
+    path('payments/revenue-series/', adminViews.revenue_series, name='revenue_series'),
+    path('payments/session-leaderboard/', adminViews.session_leaderboard_view, name='session_leaderboard'),
+    path('payments/collector-analytics/', adminViews.collector_analytics_view, name='collector_analytics'),
+    path('payments/aging/', adminViews.receivables_aging_view, name='receivables_aging'),
+    path('payments/student-fees/', adminViews.student_fees_table, name='student_fees_table'),
+    path('payments/student-fees/export-csv/', adminViews.export_student_fees_csv, name='export_student_fees_csv'),
 ]
 
 if settings.DEBUG: